@@ -125,15 +125,20 @@ import logging
 import os
 import re
 import sys
+import threading
 
 from py.path import local
 from riggerlib import Rigger
 from riggerlib import RiggerBasePlugin
 from riggerlib import RiggerClient
+from six.moves import queue
 
 from cfme.utils.net import random_port
 from cfme.utils.path import log_path
 
+# hook name of a request carrying several hooks, sent by an async ArtifactorClient
+BATCH_HOOK = "_batch"
+
 
 class Artifactor(Rigger):
     """A sub from Rigger"""
@@ -170,6 +175,15 @@ class Artifactor(Rigger):
             "old_artifacts": dict(),
         }
 
+    def _fire_internal_hook(self, json_dict):
+        """Queues the hook, or every hook of a :py:data:`BATCH_HOOK` request, in order"""
+        if json_dict["hook_name"] != BATCH_HOOK:
+            return super(Artifactor, self)._fire_internal_hook(json_dict)
+        tid = None
+        for hook in json_dict["data"]["hooks"]:
+            tid = super(Artifactor, self)._fire_internal_hook(hook)
+        return tid
+
     def handle_failure(self, exc):
         self.logger.error("exception", exc_info=exc)
 
@@ -178,7 +192,106 @@ class Artifactor(Rigger):
 
 
 class ArtifactorClient(RiggerClient):
-    pass
+    """A sub from RiggerClient which can fire hooks without waiting for the server
+
+    With ``async_hooks`` enabled, hooks that neither grab a result nor wait for their task are
+    put on a queue and sent by a background thread; everything queued while a request is
+    in flight goes to the server in one :py:data:`BATCH_HOOK` request of up to ``batch_size``
+    hooks. Hooks that do need an answer flush the queue first, so the server still processes
+    all hooks in the order they were fired.
+
+    The queue holds at most ``queue_size`` hooks. If the server falls that far behind, a hook
+    waits ``queue_timeout`` seconds for a free slot and is dropped after that, so a slow
+    artifactor can't stall the test run.
+
+    Args:
+        address: The address of the Artifactor server.
+        port: The port of the Artifactor server.
+        async_hooks: Whether to fire hooks from the background thread.
+        batch_size: The maximum number of hooks sent in one request.
+        queue_size: The maximum number of hooks waiting to be sent.
+        queue_timeout: How long to wait for a free slot in a full queue.
+    """
+
+    def __init__(
+        self, address, port, async_hooks=False, batch_size=50, queue_size=1000, queue_timeout=5
+    ):
+        super(ArtifactorClient, self).__init__(address, port)
+        self.async_hooks = async_hooks
+        self.batch_size = batch_size
+        self.queue_timeout = queue_timeout
+        self.dropped_hooks = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._sender = None
+        self._sender_lock = threading.Lock()
+
+    def fire_hook(self, hook_name, grab_result=False, wait_for_task=False, **kwargs):
+        if not self.async_hooks or not self.ready:
+            return super(ArtifactorClient, self).fire_hook(
+                hook_name, grab_result=grab_result, wait_for_task=wait_for_task, **kwargs
+            )
+        if grab_result or wait_for_task:
+            self.flush()
+            return super(ArtifactorClient, self).fire_hook(
+                hook_name, grab_result=grab_result, wait_for_task=wait_for_task, **kwargs
+            )
+        self._start_sender()
+        # the same request the synchronous path sends, the server queues it as is
+        hook = {
+            "event_name": "fire_hook",
+            "hook_name": hook_name,
+            "grab_result": False,
+            "wait_for_task": False,
+            "data": kwargs,
+        }
+        try:
+            self._queue.put(hook, timeout=self.queue_timeout)
+        except queue.Full:
+            self.dropped_hooks += 1
+        return None
+
+    def flush(self):
+        """Blocks until all the queued hooks were sent to the server"""
+        if self._sender is not None:
+            self._queue.join()
+
+    def terminate(self):
+        self.flush()
+        return super(ArtifactorClient, self).terminate()
+
+    def _start_sender(self):
+        with self._sender_lock:
+            if self._sender is None:
+                self._sender = threading.Thread(
+                    target=self._send_queued, name="artifactor_client_sender"
+                )
+                self._sender.daemon = True
+                self._sender.start()
+
+    def _send_queued(self):
+        while True:
+            hooks = [self._queue.get()]
+            while len(hooks) < self.batch_size:
+                try:
+                    hooks.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._request(
+                    {
+                        "event_name": "fire_hook",
+                        "hook_name": BATCH_HOOK,
+                        "grab_result": False,
+                        "wait_for_task": False,
+                        "data": {"hooks": hooks},
+                    }
+                )
+            except Exception:
+                # same as RiggerClient.fire_hook, a failed hook must not break the test run
+                pass
+            finally:
+                for _ in hooks:
+                    self._queue.task_done()
 
 
 class ArtifactorBasePlugin(RiggerBasePlugin):
@@ -34,10 +34,13 @@ class Logger(ArtifactorBasePlugin):
         self.register_plugin_hook("start_test", self.start_test)
         self.register_plugin_hook("finish_test", self.finish_test)
         self.register_plugin_hook("log_message", self.log_message)
+        self.register_plugin_hook("log_messages", self.log_messages)
 
     def configure(self):
         self.configured = True
         self.level = self.data.get("level", "DEBUG")
+        # test ident -> (artifact_path, filename), for records arriving after their test finished
+        self.log_files = {}
 
     @ArtifactorBasePlugin.check_configured
     def start_test(self, artifact_path, test_name, test_location, slaveid):
@@ -52,6 +55,7 @@ class Logger(ArtifactorBasePlugin):
         self.store[slaveid] = self.Test(test_ident)
         self.store[slaveid].in_progress = True
         filename = "{ident}-cfme.log".format(ident=self.ident)
+        self.log_files[test_ident] = (artifact_path, filename)
         self.store[slaveid].handler = make_file_handler(
             filename,
             root=artifact_path,
@@ -83,13 +87,35 @@ class Logger(ArtifactorBasePlugin):
 
     @ArtifactorBasePlugin.check_configured
     def log_message(self, log_record, slaveid):
-        # json transport fallout: args must be a dict or a tuple, json makes a tuple into a list
-        args = log_record["args"]
-        log_record["args"] = tuple(args) if isinstance(args, list) else args
-        record = makeLogRecord(log_record)
+        self.log_messages([log_record], slaveid)
+
+    @ArtifactorBasePlugin.check_configured
+    def log_messages(self, log_records, slaveid):
         if not slaveid:
             slaveid = "Master"
-        if slaveid in self.store:
-            handler = self.store[slaveid].handler
-            if handler and record.levelno >= handler.level:
-                handler.handle(record)
+        test = self.store.get(slaveid)
+        late_handlers = {}
+        try:
+            for log_record in log_records:
+                test_ident = log_record.pop("test_ident", None)
+                if test is not None and test.handler and test_ident in (None, test.ident):
+                    handler = test.handler
+                elif test_ident in self.log_files:
+                    # the test already finished, append to its log file
+                    if test_ident not in late_handlers:
+                        artifact_path, filename = self.log_files[test_ident]
+                        late_handlers[test_ident] = make_file_handler(
+                            filename, root=artifact_path, mode="a", level=self.level)
+                    handler = late_handlers[test_ident]
+                else:
+                    continue
+                # json transport fallout: args must be a dict or a tuple,
+                # json makes a tuple into a list
+                args = log_record["args"]
+                log_record["args"] = tuple(args) if isinstance(args, list) else args
+                record = makeLogRecord(log_record)
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+        finally:
+            for handler in late_handlers.values():
+                handler.close()
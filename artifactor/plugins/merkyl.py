@@ -10,12 +10,15 @@ artifactor:
             enabled: False
             plugin: merkyl
             port: 8192
+            max_workers: 4 #How many logs to download at the same time
             log_files:
                 - /var/www/miq/vmdb/log/evm.log
                 - /var/www/miq/vmdb/log/production.log
                 - /var/www/miq/vmdb/log/automation.log
 """
 import os.path
+from concurrent import futures
+from contextlib import closing
 
 import requests
 
@@ -43,9 +46,24 @@ class Merkyl(ArtifactorBasePlugin):
     def configure(self):
         self.files = self.data.get("log_files", [])
         self.port = self.data.get("port", "8192")
+        self.max_workers = self.data.get("max_workers", 4)
         self.tests = {}
+        # keeps the connections to merkyl open between the requests
+        self.session = requests.Session()
         self.configured = True
 
+    def request(self, ip, path, **kwargs):
+        url = "http://{}:{}/{}".format(ip, self.port, path.lstrip("/"))
+        return self.session.get(url, timeout=15, **kwargs)
+
+    def download(self, ip, tail, os_filename):
+        """Streams the log to the file instead of keeping all of it in memory"""
+        with closing(self.request(ip, "get/{}".format(tail), stream=True)) as response:
+            response.raise_for_status()
+            with open(os_filename, "wb") as f:
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(chunk)
+
     @ArtifactorBasePlugin.check_configured
     def start_test(self, test_name, test_location, ip):
         test_ident = "{}/{}".format(test_location, test_name)
@@ -55,8 +73,7 @@ class Merkyl(ArtifactorBasePlugin):
                 return None
         else:
             self.tests[test_ident] = self.Test(test_ident, ip, self.port)
-        url = "http://{}:{}/resetall".format(ip, self.port)
-        requests.get(url, timeout=15)
+        self.request(ip, "resetall")
 
         self.tests[test_ident].in_progress = True
 
@@ -66,9 +83,7 @@ class Merkyl(ArtifactorBasePlugin):
         ip = self.tests[test_ident].ip
 
         base, tail = os.path.split(filename)
-        url = "http://{}:{}/get/{}".format(ip, self.port, tail)
-        doc = requests.get(url, timeout=15)
-        content = doc.content
+        content = self.request(ip, "get/{}".format(tail)).content
         return {"merkyl_content": content}, None
 
     @ArtifactorBasePlugin.check_configured
@@ -77,8 +92,7 @@ class Merkyl(ArtifactorBasePlugin):
         ip = self.tests[test_ident].ip
 
         _, tail = os.path.split(filename)
-        url = "http://{ip}:{port}/reset/{filename}".format(ip=ip, port=self.port, filename=tail)
-        requests.get(url, timeout=15)
+        self.request(ip, "reset/{}".format(tail))
 
     @ArtifactorBasePlugin.check_configured
     def add_log(self, test_name, test_location, filename):
@@ -88,55 +102,53 @@ class Merkyl(ArtifactorBasePlugin):
         if filename not in self.files:
             if filename not in self.tests[test_ident].extra_files:
                 self.tests[test_ident].extra_files.add(filename)
-                url = "http://{}:{}/setup{}".format(ip, self.port, filename)
-                requests.get(url, timeout=15)
+                self.request(ip, "setup{}".format(filename))
 
     @ArtifactorBasePlugin.check_configured
     def finish_test(self, artifact_path, test_name, test_location, ip, slaveid):
         test_ident = "{}/{}".format(test_location, test_name)
-        artifacts = []
-        for filename in self.files:
-            _, tail = os.path.split(filename)
-            url = "http://{}:{}/get/{}".format(ip, self.port, tail)
-            doc = requests.get(url, timeout=15)
-            artifacts.append((tail, doc.content))
+        extra_files = self.tests[test_ident].extra_files
 
-        for filename in self.tests[test_ident].extra_files:
+        def fetch(filename):
             _, tail = os.path.split(filename)
-            url = "http://{}:{}/get/{}".format(ip, self.port, tail)
-            doc = requests.get(url, timeout=15)
-            artifacts.append((tail, doc.content))
-
-            url = "http://{}:{}/delete/{}".format(ip, self.port, tail)
-            requests.get(url, timeout=15)
+            os_filename = os.path.join(artifact_path, "{}-{}".format(self.ident, tail))
+            try:
+                self.download(ip, tail, os_filename)
+            except requests.RequestException as e:
+                print("Failed to get {} from merkyl: {}".format(tail, e))
+                return None
+            finally:
+                if filename in extra_files:
+                    try:
+                        self.request(ip, "delete/{}".format(tail))
+                    except requests.RequestException as e:
+                        print("Failed to delete {} from merkyl: {}".format(tail, e))
+            return {
+                "file_type": "log",
+                "display_type": "danger",
+                "display_glyph": "align-justify",
+                "description": "Merkyl: {}".format(tail),
+                "os_filename": os_filename,
+                "group_id": "merkyl",
+            }
+
+        filenames = list(self.files) + sorted(extra_files)
+        with futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            artifacts = [artifact for artifact in executor.map(fetch, filenames) if artifact]
 
         del self.tests[test_ident]
-        for filename, contents in artifacts:
-            self.fire_hook(
-                "filedump",
-                test_location=test_location,
-                test_name=test_name,
-                description="Merkyl: {}".format(filename),
-                slaveid=slaveid,
-                contents=contents,
-                file_type="log",
-                display_type="danger",
-                display_glyph="align-justify",
-                group_id="merkyl",
-            )
-        return None, None
+        # the logs are already in place, only the report needs to know about them
+        return None, {"artifacts": {test_ident: {"files": artifacts}}}
 
     @ArtifactorBasePlugin.check_configured
     def start_session(self, ip):
         """Session started"""
         for file_name in self.files:
-            url = "http://{}:{}/setup{}".format(ip, self.port, file_name)
-            requests.get(url, timeout=15)
+            self.request(ip, "setup{}".format(file_name))
 
     @ArtifactorBasePlugin.check_configured
     def finish_session(self, ip):
         """Session finished"""
         for filename in self.files:
             base, tail = os.path.split(filename)
-            url = "http://{}:{}/delete/{}".format(ip, self.port, tail)
-            requests.get(url, timeout=15)
+            self.request(ip, "delete/{}".format(tail))
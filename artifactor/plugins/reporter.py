@@ -11,6 +11,8 @@ artifactor:
             enabled: True
             plugin: reporter
             only_failed: False #Only show faled tests in the report
+            report_delay: 5 #Seconds without new results before the report is rebuilt
+            report_max_delay: 60 #Most seconds new results wait for the report to be rebuilt
 """
 import csv
 import datetime
@@ -19,6 +21,7 @@ import math
 import os
 import re
 import shutil
+import threading
 import time
 from copy import deepcopy
 
@@ -58,7 +61,54 @@ def overall_test_status(statuses):
     return "passed"
 
 
+def new_tree():
+    """Returns the empty tree :py:meth:`ReporterBase.build_dict` puts the tests into"""
+    tree = deepcopy(_tests_tpl)
+    tree["_sub"]["tests"] = deepcopy(_tests_tpl)
+    return tree
+
+
+def tree_leaf(test):
+    """Returns what the tree of the report keeps of a test"""
+    return {
+        "name": test["name"],
+        "outcomes": {"overall": test["outcomes"]["overall"]},
+        "duration": test.get("duration", 0),
+    }
+
+
+def _mtime(filename):
+    try:
+        return os.path.getmtime(filename)
+    except OSError:
+        return None
+
+
 class ReporterBase(object):
+    """Builds the html report out of the artifacts
+
+    The report data of each test is kept between builds and only rebuilt when the artifacts of
+    that test changed, and the contents of the files shown in the report are only read once.
+    The tree of the report is kept too, only the branches of the tests whose outcome or duration
+    changed are updated and rendered again.
+
+    :py:meth:`reset_report_state` has to be called before the first build.
+    """
+
+    def reset_report_state(self):
+        """Forgets everything kept from earlier builds"""
+        #: test name: (artifacts signature, report data) of the tests seen by earlier builds
+        self.test_cache = {}
+        #: filename: (mtime, contents) of the qa_contact/short_tb files read so far
+        self.file_cache = {}
+        #: the tree of the report, with the rendered html of its modules
+        self.tree = new_tree()
+        #: test name: its leaf in the tree
+        self.tree_leaves = {}
+        self.template_env = Environment(loader=FileSystemLoader(template_path.strpath))
+        #: the report dirs the dist dir was already copied into
+        self.dist_dirs = set()
+
     def _run_report(self, old_artifacts, artifact_dir, version=None, fw_version=None):
         template_data = self.process_data(old_artifacts, artifact_dir, version, fw_version)
 
@@ -70,15 +120,119 @@ class ReporterBase(object):
         self.render_report(template_data, "report", artifact_dir, "test_report.html")
 
     def render_report(self, report, filename, log_dir, template):
-        template_env = Environment(loader=FileSystemLoader(template_path.strpath))
-        data = template_env.get_template(template).render(**report)
+        data = self.template_env.get_template(template).render(**report)
 
         with open(os.path.join(log_dir, "{}.html".format(filename)), "w") as f:
             f.write(data)
-        try:
-            shutil.copytree(template_path.join("dist").strpath, os.path.join(log_dir, "dist"))
-        except OSError:
-            pass
+        if log_dir not in self.dist_dirs:
+            try:
+                shutil.copytree(template_path.join("dist").strpath, os.path.join(log_dir, "dist"))
+            except OSError:
+                pass
+            self.dist_dirs.add(log_dir)
+
+    def read_file(self, filename):
+        """Returns the contents of a file, reading it again only if it was modified"""
+        mtime = os.path.getmtime(filename)
+        cached = self.file_cache.get(filename)
+        if cached is None or cached[0] != mtime:
+            with open(filename, "r") as f:
+                cached = self.file_cache[filename] = (mtime, f.read())
+        return cached[1]
+
+    @staticmethod
+    def test_signature(test):
+        """Everything in a test's artifacts that :py:meth:`build_test_data` looks at
+
+        That includes the modification times of the files whose contents end up in the report.
+        """
+        files = []
+        for file_dict in test.get("files", []):
+            # build_test_data adds the filename
+            entry = sorted((k, v) for k, v in file_dict.items() if k != "filename")
+            if file_dict.get("file_type") in ("qa_contact", "short_tb"):
+                entry.append(("mtime", _mtime(file_dict["os_filename"])))
+            files.append(entry)
+        return (
+            repr(sorted(test["statuses"].items())),
+            test.get("slaveid"),
+            repr(test.get("composite")),
+            repr(test.get("skipped")),
+            test.get("old", False),
+            test.get("start_time"),
+            test.get("finish_time"),
+            repr(files),
+        )
+
+    def build_test_data(self, test_name, test, log_dir, color):
+        """Builds the report data of a single test, apart from its duration"""
+        test_data = {
+            "name": test_name,
+            "outcomes": test["statuses"],
+            "slaveid": test.get("slaveid", "Unknown"),
+            "color": color,
+        }
+        if "composite" in test:
+            test_data["composite"] = test["composite"]
+
+        if "skipped" in test:
+            if test["skipped"].get("type") == "provider":
+                test_data["skip_provider"] = test["skipped"].get("reason")
+            if test["skipped"].get("type") == "blocker":
+                test_data["skip_blocker"] = test["skipped"].get("reason")
+
+        if "skip_blocker" in test_data:
+            # Fix the inconveniently long list of repeated blockers until we sort out sets
+            # in riggerlib somehow.
+            test_data["skip_blocker"] = sorted(set(test_data["skip_blocker"]))
+
+        if test.get("old", False):
+            test_data["old"] = True
+
+        # Set up destinations for the files
+        test_data["file_groups"] = []
+        test_data["qa_contact"] = []
+        processed_groups = {}
+        order = 0
+        for file_dict in test.get("files", []):
+            group = file_dict["group_id"]
+            if group not in processed_groups:
+                processed_groups[group] = (order, [])
+                order += 1
+            processed_groups[group][-1].append(file_dict)
+        # Current structure:
+        # {groupid: (group_order, [{filedict1}, {filedict2}])}
+        # Sorting by group_order
+        processed_groups = sorted(processed_groups.items(), key=lambda kv: kv[1][0])
+        # And now make it [(groupid, [{filedict1}, {filedict2}, ...])]
+        processed_groups = [(group_name, files) for group_name, (_, files) in processed_groups]
+        for group_name, file_dicts in processed_groups:
+            group_file_list = []
+            for file_dict in file_dicts:
+                if file_dict["file_type"] == "qa_contact":
+                    qareader = csv.reader(
+                        self.read_file(file_dict["os_filename"]).splitlines(),
+                        delimiter=",",
+                        quotechar='"',
+                    )
+                    test_data["qa_contact"].extend(qareader)
+                    continue  # Do not store, handled a different way :)
+                elif file_dict["file_type"] == "short_tb":
+                    test_data["short_tb"] = self.read_file(file_dict["os_filename"])
+                    continue
+                file_dict["filename"] = file_dict["os_filename"].replace(log_dir, "")
+                group_file_list.append(file_dict)
+
+            test_data["file_groups"].append((group_name, group_file_list))
+        # Snd remove groups that are left empty because of eg. traceback or qa contact
+        test_data["file_groups"] = [
+            group for group in test_data["file_groups"] if len(group[1]) > 0
+        ]
+        if "short_tb" in test_data and test_data["short_tb"]:
+            urls = [url for url in URL.findall(test_data["short_tb"])]
+            if urls:
+                test_data["urls"] = urls
+        return test_data
 
     def process_data(self, artifacts, log_dir, version, fw_version, name_filter=None):
         tb_errors = []
@@ -106,41 +260,34 @@ class ReporterBase(object):
             "skipped": "info",
         }
         # Iterate through the tests and process the counts and durations
-        for test_name, test in artifacts.items():
+        for test_name, test in list(artifacts.items()):
             if not test.get("statuses"):
                 continue
             overall_status = overall_test_status(test["statuses"])
             counts[overall_status] += 1
             if not test.get("old", False):
                 current_counts[overall_status] += 1
-            color = colors[overall_status]
             # This was removed previously but is needed as the overall is not generated
             # until the test finishes. So this is here as a shim.
             test["statuses"]["overall"] = overall_status
-            test_data = {
-                "name": test_name,
-                "outcomes": test["statuses"],
-                "slaveid": test.get("slaveid", "Unknown"),
-                "color": color,
-            }
-            if "composite" in test:
-                test_data["composite"] = test["composite"]
 
-            if "skipped" in test:
-                if test["skipped"].get("type") == "provider":
-                    provider_skip_count += 1
-                    test_data["skip_provider"] = test["skipped"].get("reason")
-                if test["skipped"].get("type") == "blocker":
-                    blocker_skip_count += 1
-                    test_data["skip_blocker"] = test["skipped"].get("reason")
+            signature = self.test_signature(test)
+            cached = self.test_cache.get(test_name)
+            if cached is None or cached[0] != signature:
+                cached = self.test_cache[test_name] = (
+                    signature,
+                    self.build_test_data(test_name, test, log_dir, colors[overall_status]),
+                )
+            # copy, the duration is added below and gets formatted for the template later on
+            test_data = dict(cached[1])
 
+            if "skip_provider" in test_data:
+                provider_skip_count += 1
             if "skip_blocker" in test_data:
-                # Fix the inconveniently long list of repeated blockers until we sort out sets
-                # in riggerlib somehow.
-                test_data["skip_blocker"] = sorted(set(test_data["skip_blocker"]))
-
-            if test.get("old", False):
-                test_data["old"] = True
+                blocker_skip_count += 1
+            for qacontact in test_data["qa_contact"]:
+                if qacontact[0] not in template_data["qa"]:
+                    template_data["qa"].append(qacontact[0])
 
             if test.get("start_time"):
                 if test.get("finish_time"):
@@ -150,50 +297,6 @@ class ReporterBase(object):
                     test_data["duration"] = time.time() - test["start_time"]
                     test_data["in_progress"] = True
 
-            # Set up destinations for the files
-            test_data["file_groups"] = []
-            test_data["qa_contact"] = []
-            processed_groups = {}
-            order = 0
-            for file_dict in test.get("files", []):
-                group = file_dict["group_id"]
-                if group not in processed_groups:
-                    processed_groups[group] = (order, [])
-                    order += 1
-                processed_groups[group][-1].append(file_dict)
-            # Current structure:
-            # {groupid: (group_order, [{filedict1}, {filedict2}])}
-            # Sorting by group_order
-            processed_groups = sorted(processed_groups.items(), key=lambda kv: kv[1][0])
-            # And now make it [(groupid, [{filedict1}, {filedict2}, ...])]
-            processed_groups = [(group_name, files) for group_name, (_, files) in processed_groups]
-            for group_name, file_dicts in processed_groups:
-                group_file_list = []
-                for file_dict in file_dicts:
-                    if file_dict["file_type"] == "qa_contact":
-                        with open(file_dict["os_filename"], "rb") as qafile:
-                            qareader = csv.reader(qafile, delimiter=",", quotechar='"')
-                            for qacontact in qareader:
-                                test_data["qa_contact"].append(qacontact)
-                                if qacontact[0] not in template_data["qa"]:
-                                    template_data["qa"].append(qacontact[0])
-                        continue  # Do not store, handled a different way :)
-                    elif file_dict["file_type"] == "short_tb":
-                        with open(file_dict["os_filename"], "r") as short_tb:
-                            test_data["short_tb"] = short_tb.read()
-                        continue
-                    file_dict["filename"] = file_dict["os_filename"].replace(log_dir, "")
-                    group_file_list.append(file_dict)
-
-                test_data["file_groups"].append((group_name, group_file_list))
-            # Snd remove groups that are left empty because of eg. traceback or qa contact
-            test_data["file_groups"] = filter(
-                lambda group: len(group[1]) > 0, test_data["file_groups"]
-            )
-            if "short_tb" in test_data and test_data["short_tb"]:
-                urls = [url for url in URL.findall(test_data["short_tb"])]
-                if urls:
-                    test_data["urls"] = urls
             template_data["tests"].append(test_data)
         template_data["top10"] = self.top10(tb_errors)
         template_data["counts"] = counts
@@ -210,11 +313,12 @@ class ReporterBase(object):
 
         # Create the tree dict that is used for js tree
         # Note template_data['tests'] != tests
-        tests = deepcopy(_tests_tpl)
-        tests["_sub"]["tests"] = deepcopy(_tests_tpl)
-
-        for test in template_data["tests"]:
-            self.build_dict(test["name"].replace("cfme/", ""), tests, test)
+        if name_filter:
+            tests = new_tree()
+            for test in template_data["tests"]:
+                self.build_dict(test["name"].replace("cfme/", ""), tests, tree_leaf(test))
+        else:
+            tests = self.update_tree(template_data["tests"])
 
         template_data["ndata"] = self.build_li(tests)
 
@@ -241,11 +345,48 @@ class ReporterBase(object):
 
         return sorted(sets, key=len, reverse=True)[:10]
 
+    def update_tree(self, tests):
+        """Brings the kept tree up to date, only touching the tests that changed"""
+        names = set()
+        for test in tests:
+            names.add(test["name"])
+            leaf = tree_leaf(test)
+            if self.tree_leaves.get(test["name"]) == leaf:
+                continue
+            self.remove_from_tree(test["name"])
+            self.build_dict(test["name"].replace("cfme/", ""), self.tree, leaf)
+            self.tree_leaves[test["name"]] = leaf
+        for name in set(self.tree_leaves) - names:
+            self.remove_from_tree(name)
+        return self.tree
+
+    def remove_from_tree(self, name):
+        """Takes a test out of the kept tree, with the modules left empty"""
+        leaf = self.tree_leaves.pop(name, None)
+        if leaf is None:
+            return
+        segs = process_pytest_path(name.replace("cfme/", ""))
+        nodes = [self.tree]
+        for seg in segs[:-1]:
+            nodes.append(nodes[-1]["_sub"][seg])
+        for node in nodes:
+            node["_stats"][leaf["outcomes"]["overall"]] -= 1
+            node["_duration"] -= leaf["duration"]
+            node.pop("_html", None)
+        if nodes[-1]["_sub"].get(segs[-1]) is leaf:
+            del nodes[-1]["_sub"][segs[-1]]
+        for parent, seg in reversed(list(zip(nodes, segs[:-1]))):
+            if parent["_sub"][seg]["_sub"]:
+                break
+            del parent["_sub"][seg]
+
     def build_dict(self, path, container, contents):
         """
         Build a hierarchical dictionary including information about the stats at each level
         and the duration.
         """
+        # the rendered html of the modules on the way is outdated now
+        container.pop("_html", None)
 
         if isinstance(path, six.string_types):
             segs = process_pytest_path(path)
@@ -299,6 +440,10 @@ class ReporterBase(object):
                 # For me it seems the name is always the leaf
                 list_string += "<li>{}</li>\n".format(link)
 
+            # Modules that didn't change since the last build keep their html.
+            elif "_sub" in v and "_html" in v:
+                list_string += v["_html"]
+
             # If there is a '_sub' attribute then we know we have other modules to go.
             elif "_sub" in v:
                 percenstring = ""
@@ -324,11 +469,12 @@ class ReporterBase(object):
                     )
                 modstring = '<span name="mod_lev" class="label label-primary">M</span>'
                 pretty_time = str(datetime.timedelta(seconds=math.ceil(v["_duration"])))
-                list_string += (
+                v["_html"] = (
                     "<li>{} {}<span>&nbsp;</span>"
                     '{}{}<span style="color:#888888">&nbsp;<em>[{}]'
                     "</em></span></li>\n"
                 ).format(k, modstring, str(percenstring), self.build_li(v), pretty_time)
+                list_string += v["_html"]
         list_string += "</ul>\n"
         return list_string
 
@@ -337,7 +483,7 @@ class Reporter(ArtifactorBasePlugin, ReporterBase):
     def plugin_initialize(self):
         self.register_plugin_hook("report_test", self.report_test)
         self.register_plugin_hook("finish_session", self.run_report)
-        self.register_plugin_hook("build_report", self.run_report)
+        self.register_plugin_hook("build_report", self.build_report)
         self.register_plugin_hook("start_test", self.start_test)
         self.register_plugin_hook("skip_test", self.skip_test)
         self.register_plugin_hook("finish_test", self.finish_test)
@@ -347,6 +493,12 @@ class Reporter(ArtifactorBasePlugin, ReporterBase):
 
     def configure(self):
         self.only_failed = self.data.get("only_failed", False)
+        self.report_delay = self.data.get("report_delay", 5)
+        self.report_max_delay = self.data.get("report_max_delay", 60)
+        self.reset_report_state()
+        self._report_lock = threading.Lock()
+        self._report_timer = None
+        self._report_requested = None
         self.configured = True
 
     @ArtifactorBasePlugin.check_configured
@@ -454,6 +606,42 @@ class Reporter(ArtifactorBasePlugin, ReporterBase):
             },
         )
 
+    @ArtifactorBasePlugin.check_configured
+    def build_report(
+        self, old_artifacts, report_path, version=None, fw_version=None, debounced=False
+    ):
+        # while the tests run, the report is rebuilt once no results came for report_delay
+        # seconds, or report_max_delay seconds after the first one waiting for it;
+        # finish_session always builds the final one
+        if debounced:
+            self.run_report(old_artifacts, report_path, version, fw_version)
+        else:
+            self.schedule_report()
+
+    def schedule_report(self):
+        """(Re)starts the timer firing the debounced ``build_report``"""
+        now = time.time()
+        with self._report_lock:
+            if self._report_timer is None:
+                self._report_requested = now
+            else:
+                self._report_timer.cancel()
+            delay = min(self.report_delay, self._report_requested + self.report_max_delay - now)
+            self._report_timer = threading.Timer(max(delay, 0), self._fire_debounced_report)
+            self._report_timer.daemon = True
+            self._report_timer.start()
+
+    def _fire_debounced_report(self):
+        with self._report_lock:
+            if self._report_timer is threading.current_thread():
+                self._report_timer = None
+        # fired as a hook, so that the report is built by the thread processing the hooks
+        self.fire_hook("build_report", debounced=True)
+
     @ArtifactorBasePlugin.check_configured
     def run_report(self, old_artifacts, report_path, version=None, fw_version=None):
+        with self._report_lock:
+            if self._report_timer is not None:
+                self._report_timer.cancel()
+                self._report_timer = None
         self._run_report(old_artifacts, report_path, version, fw_version)
@@ -464,6 +464,7 @@ class Tasks(CFMENavigateStep):
 @navigator.register(Server)
 class Dashboard(CFMENavigateStep):
     VIEW = DashboardView
+    URL = 'dashboard/show'
     prerequisite = NavigateToSibling('LoggedIn')
 
     def step(self, *args, **kwargs):
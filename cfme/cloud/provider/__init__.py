@@ -213,6 +213,7 @@ class CloudProviderCollection(BaseCollection):
 @navigator.register(CloudProviderCollection, 'All')
 class All(CFMENavigateStep):
     VIEW = CloudProvidersView
+    URL = 'ems_cloud/show_list'
     prerequisite = NavigateToAttribute('appliance.server', 'LoggedIn')
 
     def step(self, *args, **kwargs):
@@ -405,6 +405,7 @@ class ContainersProviderCollection(BaseCollection):
 @navigator.register(ContainersProvider, 'All')
 class All(CFMENavigateStep):
     VIEW = ContainerProvidersView
+    URL = 'ems_container/show_list'
     prerequisite = NavigateToAttribute('appliance.server', 'LoggedIn')
 
     def step(self, *args, **kwargs):
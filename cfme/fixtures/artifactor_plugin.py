@@ -9,6 +9,9 @@
         server_address: 127.0.0.1
         server_port: 21212
         server_enabled: True
+        async_hooks: False
+        batch_size: 50
+        queue_size: 1000
         plugins:
 
 ``log_dir`` is the destination for all artifacts
@@ -18,6 +21,11 @@
 ``reuse_dir`` if this is False and Artifactor comes across a dir that has
 already been used, it will die
 
+``async_hooks`` if this is True, hooks that don't need an answer are sent to artifactor
+from a background thread, ``batch_size`` of them in one request, instead of making
+the tests wait for the server. At most ``queue_size`` hooks wait to be sent, the rest
+are dropped if artifactor can't keep up
+
 
 """
 import atexit
@@ -37,6 +45,7 @@ from cfme.utils.blockers import Blocker
 from cfme.utils.blockers import BZ
 from cfme.utils.conf import credentials
 from cfme.utils.conf import env
+from cfme.utils.log import artifactor_handler
 from cfme.utils.log import logger
 from cfme.utils.net import net_check
 from cfme.utils.net import random_port
@@ -45,9 +54,22 @@ from cfme.utils.wait import wait_for
 UNDER_TEST = False  # set to true for artifactor using tests
 
 
-# Create a list of all our passwords for use with the sanitize request later in this module
-# Filter out all Nones as it will mess the output up.
-words = [word for word in {v.get('password') for v in credentials.values()} if word is not None]
+_words = None
+
+
+def sanitize_words():
+    """All our passwords, for the sanitize request later in this module
+
+    They are only read from the (possibly encrypted) credentials when the first test is
+    sanitized, not when the plugin is imported.
+    """
+    global _words
+    if _words is None:
+        # Filter out all Nones as it will mess the output up.
+        _words = [
+            word for word in {v.get('password') for v in credentials.values()}
+            if word is not None]
+    return _words
 
 
 def get_test_idents(item):
@@ -74,6 +96,9 @@ class DummyClient(object):
     def task_status(self):
         return
 
+    def flush(self):
+        return
+
     def __nonzero__(self):
         # DummyClient is always False,
         # so it's easy to see if we have an artiactor client
@@ -88,7 +113,10 @@ def get_client(art_config, pytest_config):
         pytest_config.option.artifactor_port = port
         art_config['server_port'] = port
         return ArtifactorClient(
-            art_config['server_address'], art_config['server_port'])
+            art_config['server_address'], art_config['server_port'],
+            async_hooks=art_config.get('async_hooks', False),
+            batch_size=art_config.get('batch_size', 50),
+            queue_size=art_config.get('queue_size', 1000))
     else:
         return DummyClient()
 
@@ -137,7 +165,6 @@ def pytest_configure(config):
         art_client.ready = True
     else:
         config._art_proc = None
-    from cfme.utils.log import artifactor_handler
     artifactor_handler.artifactor = art_client
     if store.slave_manager:
         artifactor_handler.slaveid = store.slaveid
@@ -228,6 +255,9 @@ def pytest_runtest_protocol(item):
         item, 'start_test',
         slaveid=store.slaveid, ip=ip,
         tier=tier, requirement=requirement, param_dict=param_dict, issues=blockers)
+    # tag the records only after start_test is on its way, the logger files them by this ident
+    name, location = get_test_idents(item)
+    artifactor_handler.test_ident = '{}/{}'.format(location, name)
     yield
 
 
@@ -238,7 +268,7 @@ def pytest_runtest_teardown(item, nextitem):
     fire_art_test_hook(
         item, 'finish_test',
         slaveid=store.slaveid, ip=ip, wait_for_task=True)
-    fire_art_test_hook(item, 'sanitize', words=words)
+    fire_art_test_hook(item, 'sanitize', words=sanitize_words())
     jenkins_data = {
         'build_url': os.environ.get('BUILD_URL'),
         'build_number': os.environ.get('BUILD_NUMBER'),
@@ -260,6 +290,8 @@ def pytest_runtest_teardown(item, nextitem):
     fire_art_test_hook(
         item, 'ostriz_send', env_params=param_dict,
         slaveid=store.slaveid, polarion_ids=extract_polarion_ids(item), jenkins=jenkins_data)
+    # whatever gets logged until the next test starts doesn't belong to this one
+    artifactor_handler.test_ident = None
 
 
 def pytest_runtest_logreport(report):
@@ -286,7 +318,10 @@ def pytest_runtest_logreport(report):
         test_xfail=xfail, test_when=report.when,
         test_outcome=report.outcome,
         test_phase_duration=report.duration)
-    fire_art_hook(config, 'build_report')
+    if report.when == 'teardown':
+        # the reporter only rebuilds the report every so often anyway,
+        # no need to ask for it more than once per test
+        fire_art_hook(config, 'build_report')
 
 
 @pytest.mark.hookwrapper
@@ -299,6 +334,7 @@ lock = RLock()
 
 
 def shutdown(config):
+    artifactor_handler.drain(timeout=5)
     app = find_appliance(config, require=False)
     if app is not None:
         with lock:
@@ -312,3 +348,7 @@ def shutdown(config):
                 if not store.slave_manager:
                     config._art_client.terminate()
                     proc.wait()
+    # slaves don't run the server, but must not leave queued hooks behind either
+    client = getattr(config, '_art_client', None)
+    if client is not None:
+        client.flush()
@@ -138,6 +138,17 @@ def pytest_sessionfinish(session, exitstatus):
         failed_tests_report = failed_tests_template.render(**failed_test_tracking)
         outfile.write(failed_tests_report)
 
+    pool = browser_module.manager.pool
+    if pool is not None:
+        from cfme.fixtures.pytest_store import store
+        for kind, stats in sorted(pool.stats().items()):
+            if stats['count']:
+                message = 'Browser pool: {} {} browser acquisitions, {:.1f}s on average'.format(
+                    stats['count'], kind, stats['average'])
+                logger.info(message)
+                store.write_line(message)
+        pool.close()
+
 
 @pytest.fixture(scope='session')
 def browser(appliance):
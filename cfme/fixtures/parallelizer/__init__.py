@@ -12,16 +12,35 @@ The Workflow
   waiting for tests to run
 - Master diffs slave collections against its own; the test ids are verified to match
   across all nodes
+- With ``--parallel-lazy-collection``, the master writes its collection to a file and slaves
+  skip their own collection, only checking the hash of what they read against the master's;
+  each slave collects a module when it is first sent one of its tests, and the master checks
+  that all of its test ids for that module were collected
 - Master enters main runtest loop, uses a generator to build lists of test groups which are then
   sent to slaves, one group at a time
+- With ``--parallel-scheduler duration``, test groups are ordered longest-first using the
+  durations recorded by previous runs, and groups longer than a fair share of the total work
+  are split, so that slaves finish at roughly the same time
 - For each phase of each test, the slave serializes test reports, which are then unserialized on
   the master and handed to the normal pytest reporting hooks, which is able to deal with test
   reports arriving out of order
+- Messages are encoded as JSON, or pickled with ``--parallel-serializer pickle``; with
+  ``--parallel-batch-size`` above 1, slaves send test reports in batches acked all at once.
+  Unpickling runs whatever code the message asks for, and anybody who can open the master's
+  ipc socket can send it messages, so pickle is only meant for trusted local machines; the
+  master makes the socket's directory private to its user then
 - Before running the last test in a group, the slave will request more tests from the master
 
   - If more tests are received, they are run
   - If no tests are received, the slave will shut down after running its final test
 
+- With ``--parallel-steal``, a slave asking for tests when none are left to send is given
+  tests that another slave has queued but not yet started; the master takes them back by
+  answering that slave's next report with the list of revoked test ids
+
+- Appliances can be added to or removed from a running session through the master's control
+  endpoint, see :py:mod:`cfme.fixtures.parallelizer.control`; a removed appliance's slave gets
+  its unstarted tests taken back and shuts down once it has finished its current test
 - After all slaves are shut down, the master will do its end-of-session reporting as usual, and
   shut down
 
@@ -47,11 +66,13 @@ import zmq
 from _pytest import runner
 
 from cfme.fixtures import terminalreporter
+from cfme.fixtures.parallelizer import control
 from cfme.fixtures.parallelizer import remote
 from cfme.fixtures.pytest_store import store
 from cfme.test_framework.appliance import PLUGIN_KEY as APPLIANCE_PLUGIN
 from cfme.utils import at_exit
 from cfme.utils import conf
+from cfme.utils.appliance import IPAppliance
 from cfme.utils.log import create_sublogger
 
 # Initialize slaveid to None, indicating this as the master process
@@ -63,11 +84,44 @@ if not conf.runtime['env'].get('ts'):
     conf.runtime['env']['ts'] = ts
 
 
+#: pytest cache key under which the master keeps per-test durations between runs
+DURATIONS_CACHE_KEY = 'miq-parallelizer/durations'
+
+
 def pytest_addhooks(pluginmanager):
     from . import hooks
     pluginmanager.add_hookspecs(hooks)
 
 
+def pytest_addoption(parser):
+    group = parser.getgroup('cfme')
+    group.addoption('--parallel-scheduler', dest='parallel_scheduler', action='store',
+                    choices=('modscope', 'duration'), default='modscope',
+                    help='How the parallelizer master hands out tests to slaves: "modscope" '
+                         'sends groups in collection order, "duration" sends the longest '
+                         'groups first based on previously recorded test durations')
+    group.addoption('--parallel-durations', dest='parallel_durations', action='store',
+                    default=None,
+                    help='JSON file with historical test durations for the duration scheduler, '
+                         'either {nodeid: seconds} or an artifactor artifacts dump; '
+                         'defaults to the durations recorded in the pytest cache')
+    group.addoption('--parallel-steal', dest='parallel_steal', action='store_true',
+                    default=False,
+                    help='Let idle slaves take over tests other slaves have not started yet')
+    group.addoption('--parallel-serializer', dest='parallel_serializer', action='store',
+                    choices=sorted(remote.SERIALIZERS), default='json',
+                    help='How messages between the parallelizer master and slaves are encoded; '
+                         'pickle is faster, but only safe on a machine where no other user '
+                         'can be trusted with running code as you')
+    group.addoption('--parallel-batch-size', dest='parallel_batch_size', action='store',
+                    type=int, default=1,
+                    help='Maximum number of test reports a slave sends to the master at once')
+    group.addoption('--parallel-lazy-collection', dest='parallel_lazy_collection',
+                    action='store_true', default=False,
+                    help='Let slaves use the master collection instead of collecting all tests, '
+                         'they only collect the modules of the tests they are sent')
+
+
 @pytest.mark.trylast
 def pytest_configure(config):
     """Configures the parallel session, then fires pytest_parallel_configured."""
@@ -99,6 +153,44 @@ def handle_end_session(signal, frame):
 signal.signal(signal.SIGQUIT, handle_end_session)
 
 
+@attr.s
+class TransportStats(object):
+    """Counters for the master side of the master/slave transport"""
+
+    #: how often (in seconds) the counters get logged during the session
+    report_interval = 60
+
+    messages = attr.ib(default=0)
+    events = attr.ib(default=0)
+    bytes = attr.ib(default=0)
+    busy_time = attr.ib(default=0.0)
+    started = attr.ib(default=attr.Factory(time))
+    last_report = attr.ib(default=attr.Factory(time))
+
+    def record_message(self, num_events, num_bytes):
+        self.messages += 1
+        self.events += num_events
+        self.bytes += num_bytes
+
+    def summary(self):
+        elapsed = max(time() - self.started, 1e-6)
+        return (
+            '{s.messages} messages ({msg_rate:.1f}/s), {s.events} events ({event_rate:.1f}/s), '
+            '{kbytes:.0f} KiB received, {latency:.2f} ms average master loop latency'.format(
+                s=self,
+                msg_rate=self.messages / elapsed,
+                event_rate=self.events / elapsed,
+                kbytes=self.bytes / 1024.,
+                latency=self.busy_time * 1000. / max(self.messages, 1)))
+
+    def due(self):
+        """Whether it's time to log the counters again"""
+        if time() - self.last_report < self.report_interval:
+            return False
+        self.last_report = time()
+        return True
+
+
 @attr.s(hash=False)
 class SlaveDetail(object):
 
@@ -109,7 +201,13 @@ class SlaveDetail(object):
     id = attr.ib(default=attr.Factory(
         lambda: next(SlaveDetail.slaveid_generator)))
     forbid_restart = attr.ib(default=False, init=False)
+    # set when the appliance is being removed from the session, no more tests get sent
+    retiring = attr.ib(default=False, init=False)
     tests = attr.ib(default=attr.Factory(set), repr=False)
+    # tests sent to the slave that it has not started yet, in the order it will run them
+    queue = attr.ib(default=attr.Factory(list), repr=False)
+    # tests taken back from the slave, to be sent with the reply to its next report
+    revoked = attr.ib(default=attr.Factory(list), repr=False)
     process = attr.ib(default=None, repr=False)
 
     provider_allocation = attr.ib(default=attr.Factory(list), repr=False)
@@ -141,6 +239,9 @@ class ParallelSession(object):
         self.session_finished = False
         self.countfailures = 0
         self.collection = []
+        # with --parallel-lazy-collection, the hash of the collection and {module: node ids}
+        self.collection_hash = None
+        self.collection_modules = None
         self.sent_tests = 0
         self.log = create_sublogger('master')
         self.maxfail = config.getvalue("maxfail")
@@ -149,6 +250,8 @@ class ParallelSession(object):
         self.trdist = None
         self.slaves = {}
         self.test_groups = self._test_item_generator()
+        # nodeid: seconds, summed over all the phases reported back by the slaves
+        self.durations = defaultdict(float)
 
         self._pool = []
 
@@ -163,13 +266,20 @@ class ParallelSession(object):
         self.slave_spawn_count = 0
         self.appliances = appliances
 
+        self.dumps, self.loads = remote.SERIALIZERS[config.getoption('parallel_serializer', 'json')]
+        self.transport_stats = TransportStats()
+
         # set up the ipc socket
 
-        zmq_endpoint = 'ipc://{}'.format(
-            config.cache.makedir('parallelize').join(str(os.getpid())))
+        socket_dir = config.cache.makedir('parallelize')
+        if config.getoption('parallel_serializer', 'json') == 'pickle':
+            # the master unpickles whatever arrives on its socket (see the module docstring)
+            socket_dir.chmod(0o700)
+        zmq_endpoint = 'ipc://{}'.format(socket_dir.join(str(os.getpid())))
         ctx = zmq.Context.instance()
         self.sock = ctx.socket(zmq.ROUTER)
         self.sock.bind(zmq_endpoint)
+        self.zmq_endpoint = zmq_endpoint
 
         # clean out old slave config if it exists
 
@@ -180,6 +290,8 @@ class ParallelSession(object):
                 use_sprout=False,   # Slaves don't use sprout
             ),
             'zmq_endpoint': zmq_endpoint,
+            'serializer': config.getoption('parallel_serializer', 'json'),
+            'batch_size': config.getoption('parallel_batch_size', 1),
             'appliance_data': getattr(self, "slave_appliances_data", {})
         }
 
@@ -190,12 +302,88 @@ class ParallelSession(object):
         for slave in sorted(self.slaves):
             self.print_message("using appliance {}".format(self.slaves[slave].appliance.url),
                 slave, green=True)
+        self.print_message('appliances can be added or removed through {}'.format(zmq_endpoint))
 
-    def _slave_audit(self):
-        # XXX: There is currently no mechanism to add or remove slave_urls, short of
-        #      firing up the debugger and doing it manually. This is making room for
-        #      planned future abilities to dynamically add and remove slaves via automation
+    def add_appliance(self, appliance):
+        """Add an appliance to the running session, starting a new slave for it
+
+        Returns:
+            The :py:class:`SlaveDetail` of the new slave
+
+        """
+        slave = SlaveDetail(appliance=appliance, worker_config=self.worker_config)
+        self.slaves[slave.id] = slave
+        self.appliances.append(appliance)
+        self.print_message('adding appliance {}'.format(appliance.url), slave, green=True)
+        # before the runtest loop the slaves are all started at once after master collection
+        if self.collection:
+            slave.start()
+        return slave
+
+    def remove_appliance(self, url):
+        """Remove an appliance from the running session
+
+        The slave using the appliance finishes the test it is running and then shuts down,
+        its tests that haven't started yet get sent to other slaves.
+
+        Args:
+            url: The url or hostname of the appliance
+
+        Returns:
+            The :py:class:`SlaveDetail` of the retired slave, None if no slave uses the appliance
+
+        """
+        for slave in self.slaves.values():
+            if url in (slave.appliance.url, slave.appliance.hostname) and not slave.retiring:
+                break
+        else:
+            return None
+        slave.retiring = True
+        if slave.process is None:
+            # never started (or already gone), there is nothing to wait for
+            slave.forbid_restart = True
+        taken_back = self._take_back(slave, slave.queue[self.steal_lookahead:])
+        if taken_back:
+            self.sent_tests -= len(taken_back)
+            self.failed_slave_test_groups.append(taken_back)
+        self.print_message('removing appliance {}, redistributing {} tests'.format(
+            slave.appliance.url, len(taken_back)), slave, purple=True)
+        return slave
+
+    def handle_control(self, identity, command):
+        """Handle a command sent to the control endpoint and answer it
+
+        See :py:mod:`cfme.fixtures.parallelizer.control` for the commands.
 
+        """
+        name = command.get('command')
+        try:
+            if name == 'add_appliance':
+                if command.get('appliance'):
+                    appliance = IPAppliance.from_json(command['appliance'])
+                else:
+                    appliance = IPAppliance.from_url(command['url'])
+                slave = self.add_appliance(appliance)
+                reply = {'slave': slave.id.decode('ascii')}
+            elif name == 'remove_appliance':
+                slave = self.remove_appliance(command['url'])
+                if slave is None:
+                    reply = {'error': 'no slave uses appliance {}'.format(command['url'])}
+                else:
+                    reply = {'slave': slave.id.decode('ascii')}
+            elif name == 'list_appliances':
+                reply = {'slaves': {
+                    slave.id.decode('ascii'): slave.appliance.url
+                    for slave in self.slaves.values() if not slave.retiring}}
+            else:
+                reply = {'error': 'unknown command {!r}'.format(name)}
+        except Exception as e:
+            self.log.exception('control command {!r} failed'.format(command))
+            reply = {'error': str(e)}
+        self.sock.send_multipart(
+            [identity, b'', control.CONTROL_FRAME, json.dumps(reply).encode('utf-8')])
+
+    def _slave_audit(self):
         # check for unexpected slave shutdowns and redistribute tests
         for slave in self.slaves.values():
             returncode = slave.poll()
@@ -206,12 +394,16 @@ class ParallelSession(object):
                 else:
                     msg = '{} terminated unexpectedly with status {}, respawning'.format(
                         slave.id, returncode)
+                slave.queue, slave.revoked = [], []
                 if slave.tests:
                     failed_tests, slave.tests = slave.tests, set()
                     num_failed_tests = len(failed_tests)
                     self.sent_tests -= num_failed_tests
                     msg += ' and redistributing {} tests'.format(num_failed_tests)
                     self.failed_slave_test_groups.append(failed_tests)
+                if slave.retiring:
+                    # its appliance is being removed anyway, don't bring it back
+                    slave.forbid_restart = True
                 self.print_message(msg, purple=True)
 
         # If a slave was terminated for any reason, kill that slave
@@ -235,23 +427,30 @@ class ParallelSession(object):
     def send(self, slave, event_data):
         """Send data to slave.
 
-        ``event_data`` will be serialized as JSON, and so must be JSON serializable
+        ``event_data`` will be serialized with the session's serializer, and so must be
+        JSON serializable
 
         """
-        event_json = json.dumps(event_data)
-        if not isinstance(event_json, bytes):
-            event_json = event_json.encode('utf-8')
-        self.sock.send_multipart([slave.id, b'', event_json])
+        self.sock.send_multipart([slave.id, b'', self.dumps(event_data)])
 
     def recv(self):
-        # poll the zmq socket, populate the recv queue deque with responses
-
-        events = zmq.zmq_poll([(self.sock, zmq.POLLIN)], 50)
-        if not events:
+        # only poll (and wait) when there isn't a message already waiting to be read
+        try:
+            frames = self.sock.recv_multipart(flags=zmq.NOBLOCK)
+        except zmq.Again:
+            events = zmq.zmq_poll([(self.sock, zmq.POLLIN)], 50)
+            if not events:
+                return None, None, None
+            frames = self.sock.recv_multipart(flags=zmq.NOBLOCK)
+        if len(frames) == 4 and frames[2] == control.CONTROL_FRAME:
+            # control commands are always JSON, whatever the slaves use
+            self.handle_control(frames[0], json.loads(frames[3]))
             return None, None, None
-        slaveid, _, event_json = self.sock.recv_multipart(flags=zmq.NOBLOCK)
-        event_data = json.loads(event_json)
+        slaveid, _, payload = frames
+        event_data = self.loads(payload)
         event_name = event_data.pop('_event_name')
+        self.transport_stats.record_message(
+            len(event_data['events']) if event_name == 'batch' else 1, len(payload))
         if slaveid not in self.slaves:
             self.log.error("message from terminated worker %s %s %s",
                            slaveid, event_name, event_data)
@@ -283,6 +482,14 @@ class ParallelSession(object):
         """Acknowledge a slave's message"""
         self.send(slave, 'ack {}'.format(event_name))
 
+    def ack_report(self, slave, event_name):
+        """Acknowledge a slave's test report, passing on any tests taken back from it"""
+        if slave.revoked:
+            revoked, slave.revoked = slave.revoked, []
+            self.send(slave, {'revoked': revoked})
+        else:
+            self.ack(slave, event_name)
+
     def monitor_shutdown(self, slave):
         # non-daemon so slaves get every opportunity to shut down cleanly
         shutdown_thread = Thread(target=self._monitor_shutdown_t,
@@ -349,12 +556,24 @@ class ParallelSession(object):
 
     def send_tests(self, slave):
         """Send a slave a group of tests"""
+        if slave.retiring:
+            # an empty list makes the slave shut down
+            self.send(slave, [])
+            return []
         try:
             tests = list(self.failed_slave_test_groups.popleft())
         except IndexError:
             tests = self.get(slave)
+        if not tests and self.config.getoption('parallel_steal', False):
+            stolen = self.steal(slave)
+            if stolen:
+                self.send(slave, stolen)
+                slave.tests.update(stolen)
+                slave.queue.extend(stolen)
+                return stolen
         self.send(slave, tests)
         slave.tests.update(tests)
+        slave.queue.extend(tests)
         collect_len = len(self.collection)
         tests_len = len(tests)
         self.sent_tests += tests_len
@@ -365,6 +584,57 @@ class ParallelSession(object):
             ))
         return tests
 
+    # the slave's test generator looks one test ahead of the one it is running, so the first
+    # two tests queued on a slave may already be bound to it and can't be taken back
+    steal_lookahead = 2
+
+    def steal(self, thief):
+        """Take back tests another slave hasn't started yet, so ``thief`` can run them
+
+        The victim is the slave with the most unstarted tests, preferring slaves whose tests
+        use a provider ``thief`` already has. The latter half of its stealable tests is removed
+        from its queue, and the victim is told to skip them in the reply to its next report.
+
+        Returns:
+            The list of stolen test ids, empty if there was nothing worth stealing
+
+        """
+        def stealable(slave):
+            return slave.queue[self.steal_lookahead:]
+
+        candidates = [
+            slave for slave in self.slaves.values()
+            if slave is not thief and not (slave.forbid_restart or slave.retiring)
+            and len(stealable(slave)) > 1]
+        if not candidates:
+            return []
+
+        def victim_key(slave):
+            shares_provider = any(
+                prov in thief.provider_allocation
+                for prov in self._provs_of_tests(stealable(slave)))
+            return shares_provider, len(stealable(slave))
+
+        victim = max(candidates, key=victim_key)
+        tail = stealable(victim)
+        stolen = self._take_back(victim, tail[len(tail) // 2:])
+        self.print_message('moving {} unstarted tests from {} to {}'.format(
+            len(stolen), victim.id, thief.id), yellow=True)
+        self.log.info('stolen from {} for {}: {!r}'.format(victim.id, thief.id, stolen))
+        return stolen
+
+    def _take_back(self, slave, tests):
+        """Take the trailing ``tests`` of a slave's queue back from it
+
+        The slave is told to skip them in the reply to its next report.
+        """
+        tests = list(tests)
+        if tests:
+            del slave.queue[len(slave.queue) - len(tests):]
+            slave.tests.difference_update(tests)
+            slave.revoked.extend(tests)
+        return tests
+
     def pytest_sessionstart(self, session):
         """pytest sessionstart hook
 
@@ -395,6 +665,8 @@ class ParallelSession(object):
         """
         # Build master collection for slave diffing and distribution
         self.collection = [item.nodeid for item in self.session.items]
+        if self.config.getoption('parallel_lazy_collection', False):
+            self.share_collection()
 
         # Fire up the workers after master collection is complete
         # master and the first slave share an appliance, this is a workaround to prevent a slave
@@ -422,53 +694,12 @@ class ParallelSession(object):
                     break
 
                 slave, event_data, event_name = self.recv()
-                if event_name == 'message':
-                    message = event_data.pop('message')
-                    markup = event_data.pop('markup')
-                    # messages are special, handle them immediately
-                    self.print_message(message, slave, **markup)
-                    self.ack(slave, event_name)
-                elif event_name == 'collectionfinish':
-                    slave_collection = event_data['node_ids']
-                    # compare slave collection to the master, all test ids must be the same
-                    self.log.debug('diffing {} collection'.format(slave.id))
-                    diff_err = report_collection_diff(
-                        slave.id, self.collection, slave_collection)
-                    if diff_err:
-                        self.print_message(
-                            'collection differs, respawning', slave.id,
-                            purple=True)
-                        self.print_message(diff_err, purple=True)
-                        self.log.error('{}'.format(diff_err))
-                        self.kill(slave)
-                        slave.start()
-                    else:
-                        self.ack(slave, event_name)
-                elif event_name == 'need_tests':
-                    self.send_tests(slave)
-                    self.log.info('starting master test distribution')
-                elif event_name == 'runtest_logstart':
-                    self.ack(slave, event_name)
-                    self.trdist.runtest_logstart(
-                        slave.id,
-                        event_data['nodeid'],
-                        event_data['location'])
-                elif event_name == 'runtest_logreport':
-                    self.ack(slave, event_name)
-                    report = unserialize_report(event_data['report'])
-                    if report.when in ('call', 'teardown'):
-                        slave.tests.discard(report.nodeid)
-                    self.trdist.runtest_logreport(slave.id, report)
-                elif event_name == 'internalerror':
-                    self.ack(slave, event_name)
-                    self.print_message(event_data['message'], slave, purple=True)
-                    self.kill(slave)
-                elif event_name == 'shutdown':
-                    self.config.hook.pytest_miq_node_shutdown(
-                        config=self.config, nodeinfo=slave.appliance.url)
-                    self.ack(slave, event_name)
-                    del self.slaves[slave.id]
-                    self.monitor_shutdown(slave)
+                if event_name is not None:
+                    handling_started = time()
+                    self.handle_message(slave, event_name, event_data)
+                    self.transport_stats.busy_time += time() - handling_started
+                    if self.transport_stats.due():
+                        self.log.info('transport: {}'.format(self.transport_stats.summary()))
 
                 # total slave spawn count * 3, to allow for each slave's initial spawn
                 # and then each slave (on average) can fail two times
@@ -484,12 +715,159 @@ class ParallelSession(object):
             raise
         finally:
             terminalreporter.enable()
+            self.print_message('transport: {}'.format(self.transport_stats.summary()))
 
         # Suppress other runtestloop calls
         return True
 
+    def share_collection(self):
+        """Write the master collection to a file the slaves build their tests from"""
+        collection_file = self.config.cache.makedir('parallelize').join(
+            'collection-{}.json'.format(os.getpid()))
+        collection_file.write(json.dumps({'node_ids': self.collection}))
+        self.collection_hash = remote.collection_hash(self.collection)
+        self.collection_modules = defaultdict(list)
+        for nodeid in self.collection:
+            self.collection_modules[remote.module_of(nodeid)].append(nodeid)
+        # slaves share the worker config, including the ones started later on
+        self.worker_config['collection_file'] = collection_file.strpath
+        at_exit(collection_file.remove)
+
+    def handle_message(self, slave, event_name, event_data):
+        """Handle a message from a slave, a single event or a batch of them"""
+        if event_name == 'batch':
+            # every batched event but the last one is a test report,
+            # the whole batch gets answered by the reply to the last event
+            events = event_data['events']
+            for batched_data in events[:-1]:
+                self.handle_event(
+                    slave, batched_data.pop('_event_name'), batched_data, reply=False)
+            event_data = events[-1]
+            event_name = event_data.pop('_event_name')
+        self.handle_event(slave, event_name, event_data)
+
+    def handle_event(self, slave, event_name, event_data, reply=True):
+        """Handle one event sent by a slave
+
+        Args:
+            reply: Whether to answer the slave; test reports that are not the last event
+                of a batch are not answered on their own
+
+        """
+        if event_name == 'message':
+            message = event_data.pop('message')
+            markup = event_data.pop('markup')
+            # messages are special, handle them immediately
+            self.print_message(message, slave, **markup)
+            self.ack(slave, event_name)
+        elif event_name == 'collectionfinish':
+            if 'collection_hash' in event_data:
+                # the slave read the master collection, it should have read all of it
+                self.log.debug('checking {} collection hash'.format(slave.id))
+                diff_err = None
+                if event_data['collection_hash'] != self.collection_hash:
+                    diff_err = '{} collection hash differs from the master\n'.format(slave.id)
+            else:
+                # a whole collection, or a single module collected by a lazy slave
+                module = event_data.get('module')
+                slave_collection = event_data['node_ids']
+                if module is None:
+                    master_collection = self.collection
+                else:
+                    # lazy slaves don't uncollect or deselect, only the master's tests matter
+                    master_collection = self.collection_modules[module]
+                    wanted = set(master_collection)
+                    slave_collection = [
+                        nodeid for nodeid in slave_collection if nodeid in wanted]
+                # compare slave collection to the master, all test ids must be the same
+                self.log.debug('diffing {} collection'.format(slave.id))
+                diff_err = report_collection_diff(
+                    slave.id, master_collection, slave_collection)
+            if diff_err:
+                self.print_message(
+                    'collection differs, respawning', slave.id,
+                    purple=True)
+                self.print_message(diff_err, purple=True)
+                self.log.error('{}'.format(diff_err))
+                self.kill(slave)
+                slave.start()
+            else:
+                self.ack(slave, event_name)
+        elif event_name == 'need_tests':
+            self.send_tests(slave)
+            self.log.info('starting master test distribution')
+        elif event_name == 'runtest_logstart':
+            nodeid = event_data['nodeid']
+            if nodeid in slave.queue:
+                del slave.queue[:slave.queue.index(nodeid) + 1]
+            # a test sent again after its slave died starts over, drop the partial duration
+            self.durations.pop(nodeid, None)
+            if reply:
+                self.ack_report(slave, event_name)
+            self.trdist.runtest_logstart(
+                slave.id,
+                event_data['nodeid'],
+                event_data['location'])
+        elif event_name == 'runtest_logreport':
+            if reply:
+                self.ack_report(slave, event_name)
+            report = unserialize_report(event_data['report'])
+            self.durations[report.nodeid] += getattr(report, 'duration', 0) or 0
+            if report.when in ('call', 'teardown'):
+                slave.tests.discard(report.nodeid)
+            self.trdist.runtest_logreport(slave.id, report)
+        elif event_name == 'internalerror':
+            self.ack(slave, event_name)
+            self.print_message(event_data['message'], slave, purple=True)
+            self.kill(slave)
+        elif event_name == 'shutdown':
+            self.config.hook.pytest_miq_node_shutdown(
+                config=self.config, nodeinfo=slave.appliance.url)
+            self.ack(slave, event_name)
+            del self.slaves[slave.id]
+            self.monitor_shutdown(slave)
+
+    def pytest_sessionfinish(self):
+        """Merge the durations of this run into the ones stored in the pytest cache"""
+        if not self.durations:
+            return
+        durations = self.config.cache.get(DURATIONS_CACHE_KEY, {})
+        durations.update(self.durations)
+        self.config.cache.set(DURATIONS_CACHE_KEY, durations)
+
     def _test_item_generator(self):
-        for tests in self._modscope_item_generator():
+        if self.config.getoption('parallel_scheduler', 'modscope') == 'duration':
+            generator = self._duration_item_generator()
+        else:
+            generator = self._modscope_item_generator()
+        for tests in generator:
+            yield tests
+
+    def _duration_item_generator(self):
+        # same grouping as modscope, but sent longest-first so the long groups are started
+        # while there is still other work to fill the remaining slaves with
+        durations = load_test_durations(
+            self.config.getoption('parallel_durations', None),
+            self.config.cache.get(DURATIONS_CACHE_KEY, {}))
+        estimate = default_test_duration(durations)
+
+        def test_cost(test):
+            return durations.get(test, estimate)
+
+        def group_cost(tests):
+            return sum(map(test_cost, tests))
+
+        groups = list(self._modscope_item_generator())
+        total_cost = sum(group_cost(tests) for tests in groups)
+        # no single group should take longer than a fair share of the work
+        max_cost = total_cost / max(len(self.slaves), 1)
+        split_groups = []
+        for tests in groups:
+            split_groups.extend(split_by_cost(tests, test_cost, max_cost))
+        split_groups.sort(key=group_cost, reverse=True)
+        self.log.info('scheduling {} test groups by duration, {:.0f}s of estimated work'.format(
+            len(split_groups), total_cost))
+        for tests in split_groups:
             yield tests
 
     def _modscope_item_generator(self):
@@ -526,16 +904,17 @@ class ParallelSession(object):
                 self.log.info('sent tests with param {} {!r}'.format(id, tests))
                 yield tests
 
-    def get(self, slave):
-
+    def _provs_of_tests(self, test_group):
         # we assume that there is only one provider of the same type and version
         # because there is no better way to group tests w/o provider initialization
-        def provs_of_tests(test_group):
-            found = set()
-            for test in test_group:
-                found.update(pv for pv in self.provs
-                             if '[' in test and pv in test)
-            return sorted(found)
+        found = set()
+        for test in test_group:
+            found.update(pv for pv in self.provs
+                         if '[' in test and pv in test)
+        return sorted(found)
+
+    def get(self, slave):
+        provs_of_tests = self._provs_of_tests
 
         if not self._pool:
             for test_group in self.test_groups:
@@ -593,6 +972,71 @@ class ParallelSession(object):
         return []
 
 
+def load_test_durations(durations_file=None, cached_durations=None):
+    """Load historical test durations as a ``{nodeid: seconds}`` dict
+
+    Args:
+        durations_file: Path to a JSON file, either a plain ``{nodeid: seconds}`` mapping or
+            an artifactor artifacts dump, where every test has per-phase ``durations``
+        cached_durations: Durations recorded in the pytest cache by earlier runs; these are
+            used when no ``durations_file`` is given
+
+    """
+    if not durations_file:
+        return dict(cached_durations or {})
+    with open(durations_file) as f:
+        data = json.load(f)
+    durations = {}
+    for nodeid, value in data.items():
+        if isinstance(value, dict):
+            # artifactor keys tests as 'location/name' and records each phase separately
+            if 'test_module' in value and 'test_name' in value:
+                nodeid = location_nodeid(value['test_module'], value['test_name'])
+            value = sum(value.get('durations', {}).values())
+        durations[nodeid] = float(value)
+    return durations
+
+
+def location_nodeid(test_module, test_name):
+    """Rebuild a node id from the module and name of a test's ``item.location``
+
+    Methods are named ``TestFoo.test_bar[x]`` there, their node ids pass through the class
+    instance: ``module.py::TestFoo::()::test_bar[x]``.
+    """
+    # the parameters may contain dots too
+    name, bracket, params = test_name.partition('[')
+    path = name.split('.')
+    parts = [test_module] + ['{}::()'.format(cls) for cls in path[:-1]]
+    parts.append(path[-1] + bracket + params)
+    return '::'.join(parts)
+
+
+def default_test_duration(durations):
+    """Duration to assume for tests that have no recorded history (the median)"""
+    if not durations:
+        return 1.0
+    ordered = sorted(durations.values())
+    return ordered[len(ordered) // 2]
+
+
+def split_by_cost(tests, test_cost, max_cost):
+    """Split a list of tests into consecutive chunks whose cost does not exceed ``max_cost``
+
+    Order is kept, so tests sharing module-scoped fixtures stay next to each other.
+    A single test costing more than ``max_cost`` ends up in a chunk of its own.
+    """
+    chunk, chunk_cost = [], 0
+    for test in tests:
+        cost = test_cost(test)
+        if chunk and chunk_cost + cost > max_cost:
+            yield chunk
+            chunk, chunk_cost = [], 0
+        chunk.append(test)
+        chunk_cost += cost
+    if chunk:
+        yield chunk
+
+
 def report_collection_diff(slaveid, from_collection, to_collection):
     """Report differences, if any exist, between master and a slave collection
 
@@ -0,0 +1,64 @@
+"""Control a running parallel session
+
+The parallelizer master accepts commands on the same zmq endpoint its slaves talk to; the
+endpoint is printed when the session starts. Commands are JSON, sent with a leading
+:py:data:`CONTROL_FRAME` so they can't be mistaken for slave events:
+
+- ``add_appliance`` with either ``appliance`` (the json of an
+  :py:class:`IPAppliance <cfme.utils.appliance.IPAppliance>`) or ``url``, starts a new slave
+- ``remove_appliance`` with the ``url`` or hostname of an appliance, the slave using it
+  finishes its current test and shuts down, its remaining tests are sent to other slaves
+- ``list_appliances``, returns the slaves and the appliances they are using
+
+This can be used from python with :py:func:`send_command`, or from the command line::
+
+    python cfme/fixtures/parallelizer/control.py ipc://.../parallelize/1234 \\
+        add_appliance --url https://10.0.0.1/
+
+"""
+import json
+
+import zmq
+
+CONTROL_FRAME = b'control'
+
+
+def send_command(zmq_endpoint, command, timeout=30, **kwargs):
+    """Send a command to the parallelizer master and return its reply
+
+    Args:
+        zmq_endpoint: The master's zmq endpoint
+        command: One of the commands described in this module's docstring
+        timeout: How many seconds to wait for the master to reply
+        **kwargs: The arguments of the command
+
+    Returns:
+        The reply dict; it contains an ``error`` key if the command failed
+
+    """
+    kwargs['command'] = command
+    ctx = zmq.Context.instance()
+    sock = ctx.socket(zmq.REQ)
+    sock.setsockopt(zmq.LINGER, 0)
+    try:
+        sock.connect(zmq_endpoint)
+        sock.send_multipart([CONTROL_FRAME, json.dumps(kwargs).encode('utf-8')])
+        if not sock.poll(timeout * 1000):
+            raise RuntimeError('No reply from the parallelizer master at {}'.format(zmq_endpoint))
+        _, reply = sock.recv_multipart()
+        return json.loads(reply)
+    finally:
+        sock.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Control a running parallel session')
+    parser.add_argument('endpoint', help='The zmq endpoint of the parallelizer master')
+    parser.add_argument('command', choices=['add_appliance', 'remove_appliance', 'list_appliances'])
+    parser.add_argument('--url', help='The url of the appliance to add or remove')
+    parser.add_argument('--appliance', help='The json data about the appliance to add')
+    args = parser.parse_args()
+
+    command_args = {k: v for k, v in (('url', args.url), ('appliance', args.appliance)) if v}
+    print(json.dumps(send_command(args.endpoint, args.command, **command_args), indent=2))
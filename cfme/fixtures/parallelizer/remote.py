@@ -1,6 +1,9 @@
+import hashlib
 import json
+import pickle
 import signal
 
+import pytest
 import zmq
 from py.path import local
 
@@ -13,12 +16,62 @@ from cfme.utils.appliance import find_appliance
 SLAVEID = None
 
 
+def _json_dumps(data):
+    data = json.dumps(data)
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    return data
+
+
+def _pickle_dumps(data):
+    # protocol 2 is the newest one both python 2 and 3 slaves can read
+    return pickle.dumps(data, protocol=2)
+
+
+#: name: (dumps, loads) pairs used to encode messages between the master and the slaves
+SERIALIZERS = {
+    'json': (_json_dumps, json.loads),
+    'pickle': (_pickle_dumps, pickle.loads),
+}
+
+
+#: Plugins whose ``pytest_collection_modifyitems`` prepares items for running, the only ones
+#: called for the modules a slave collects lazily; the others filter, reorder or report on
+#: the whole collection, which the master has done already
+ITEM_PREPARING_PLUGINS = ('cfme.markers.meta', 'cfme.markers.skipper')
+
+
+def module_of(nodeid):
+    """The node id of the module a test belongs to"""
+    return nodeid.split('::', 1)[0]
+
+
+def collection_hash(node_ids):
+    """A hash of a collection, which doesn't depend on the order of the node ids"""
+    return hashlib.sha1('\n'.join(sorted(node_ids)).encode('utf-8')).hexdigest()
+
+
 class SlaveManager(object):
-    """SlaveManager which coordinates with the master process for parallel testing"""
-    def __init__(self, config, slaveid, zmq_endpoint):
+    """SlaveManager which coordinates with the master process for parallel testing
+
+    Test reports are queued and sent to the master together with the next event that
+    needs to reach it right away (a test starting, a request for tests, a message...),
+    or once ``batch_size`` of them have piled up. The master acks a whole batch at once.
+    A ``batch_size`` of 1 sends every report on its own.
+
+    With a ``collection_file`` written by the master, the slave doesn't collect the whole tree.
+    It only collects the modules of the tests it is sent, the first time it gets one of them.
+    """
+    def __init__(self, config, slaveid, zmq_endpoint, serializer='json', batch_size=1,
+                 collection_file=None):
         self.config = config
         self.session = None
         self.collection = None
+        self.collection_file = collection_file
+        # node ids of the modules of the master collection not collected yet
+        self.lazy_modules = None
+        self.lazy_node_ids = None
+        self._prepare_items = None
         self.slaveid = conf.runtime['env']['slaveid'] = slaveid
         self.log = cfme.utils.log.logger
         conf.clear()
@@ -31,14 +84,40 @@ class SlaveManager(object):
         self.sock.connect(zmq_endpoint)
 
         self.messages = {}
+        # tests the master has taken back to give to another slave
+        self.revoked = set()
+
+        self.dumps, self.loads = SERIALIZERS[serializer]
+        self.batch_size = max(batch_size, 1)
+        self._pending_events = []
 
         self.quit_signaled = False
 
     def send_event(self, name, **kwargs):
+        """Send an event to the master, along with any queued reports, and return its reply"""
         kwargs['_event_name'] = name
         self.log.debug("sending {} {!r}".format(name, kwargs))
-        self.sock.send_json(kwargs)
-        recv = self.sock.recv_json()
+        self._pending_events.append(kwargs)
+        return self._flush_events()
+
+    def queue_event(self, name, **kwargs):
+        """Queue an event for the master, sending the queue once it reaches ``batch_size``"""
+        kwargs['_event_name'] = name
+        self.log.debug("queueing {} {!r}".format(name, kwargs))
+        self._pending_events.append(kwargs)
+        if len(self._pending_events) >= self.batch_size:
+            return self._flush_events()
+
+    def _flush_events(self):
+        events, self._pending_events = self._pending_events, []
+        if not events:
+            return
+        elif len(events) == 1:
+            event_data = events[0]
+        else:
+            event_data = {'_event_name': 'batch', 'events': events}
+        self.sock.send(self.dumps(event_data))
+        recv = self.loads(self.sock.recv())
         if recv == 'die':
             self.log.info('Slave instructed to die by master; shutting down')
             raise SystemExit()
@@ -47,17 +126,63 @@ class SlaveManager(object):
             if recv != 'ack':
                 return recv
 
+    def send_report(self, name, **kwargs):
+        """Send a test report event, noting any tests the master revoked in its reply
+
+        Test starts are sent right away so the master always knows which tests have been
+        started; results may be batched.
+        """
+        if name == 'runtest_logstart':
+            reply = self.send_event(name, **kwargs)
+        else:
+            reply = self.queue_event(name, **kwargs)
+        if isinstance(reply, dict) and reply.get('revoked'):
+            self.log.info('master revoked tests: {!r}'.format(reply['revoked']))
+            self.revoked.update(reply['revoked'])
+
     def message(self, message, **kwargs):
         """Send a message to the master, which should get printed to the console"""
         self.send_event('message', message=message, markup=kwargs)  # message!
 
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_collection(self, session):
+        """pytest collection hook
+
+        - With a collection file from the master, skips the collection; the modules are
+          collected by :py:meth:`_collect_module` when their tests are sent to this slave
+
+        """
+        if not self.collection_file:
+            return None
+        with open(self.collection_file) as f:
+            self.lazy_node_ids = json.load(f)['node_ids']
+        self.session = session
+        self.collection = {}
+        self.lazy_modules = {module_of(nodeid) for nodeid in self.lazy_node_ids}
+        session.testscollected = len(self.lazy_node_ids)
+        self.log.debug('using the master collection of {} modules'.format(len(self.lazy_modules)))
+        pm = self.config.pluginmanager
+        self._prepare_items = pm.subset_hook_caller(
+            'pytest_collection_modifyitems',
+            [plugin for plugin in pm.get_plugins()
+             if pm.get_name(plugin) not in ITEM_PREPARING_PLUGINS])
+        # fired once, like for a normal collection
+        self.config.hook.pytest_collection_finish(session=session)
+        return True
+
     def pytest_collection_finish(self, session):
         """pytest collection hook
 
-        - Sends collected tests to the master for comparison
+        - Sends collected tests to the master for comparison, or with a collection file
+          from the master, the hash of the tests read from it
 
         """
         self.log.debug('collection finished')
+        if self.lazy_modules is not None:
+            terminalreporter.disable()
+            self.send_event(
+                "collectionfinish", collection_hash=collection_hash(self.lazy_node_ids))
+            return
         self.session = session
         self.collection = {item.nodeid: item for item in session.items}
         terminalreporter.disable()
@@ -69,7 +194,7 @@ class SlaveManager(object):
         - sends logstart notice to the master
 
         """
-        self.send_event("runtest_logstart", nodeid=nodeid, location=location)
+        self.send_report("runtest_logstart", nodeid=nodeid, location=location)
 
     def pytest_runtest_logreport(self, report):
         """pytest runtest logreport hook
@@ -77,7 +202,7 @@ class SlaveManager(object):
         - sends serialized log reports to the master
 
         """
-        self.send_event("runtest_logreport", report=serialize_report(report))
+        self.send_report("runtest_logreport", report=serialize_report(report))
         if report.when == 'teardown':
             path, lineno, domaininfo = report.location
             test_status = _test_status(_format_nodeid(report.nodeid, False))
@@ -158,9 +283,41 @@ class SlaveManager(object):
             if not node_ids:
                 break
             for nodeid in node_ids:
+                if nodeid in self.revoked:
+                    # handed over to another slave before we got to it
+                    self.revoked.discard(nodeid)
+                    continue
+                if self.lazy_modules and module_of(nodeid) in self.lazy_modules:
+                    self._collect_module(module_of(nodeid))
+                if nodeid not in self.collection:
+                    # the master kills this slave and gives its tests to the others
+                    self.send_event(
+                        'internalerror', message='{} was not collected'.format(nodeid))
+                    return
                 # TODO: take non-unique node ids into account
                 yield self.collection[nodeid]
 
+    def _collect_module(self, module):
+        """Collects a module of the master's collection and sends its tests for comparison
+
+        Only the collection hooks preparing the items are called, not the ones meant to run
+        once for the whole collection, see :py:data:`ITEM_PREPARING_PLUGINS`. The module's
+        uncollected and deselected tests are collected too, they are never sent to the slave.
+        """
+        self.lazy_modules.discard(module)
+        self.log.debug('collecting {}'.format(module))
+        session = self.session
+        items, testscollected = session.items, session.testscollected
+        try:
+            collected = session._perform_collect(
+                [self.config.rootdir.join(module).strpath], genitems=True)
+            self._prepare_items(session=session, config=self.config, items=collected)
+        finally:
+            session.items, session.testscollected = items, testscollected
+        collected = {item.nodeid: item for item in collected}
+        self.collection.update(collected)
+        self.send_event("collectionfinish", node_ids=list(collected.keys()), module=module)
+
 
 def serialize_report(rep):
     """
@@ -250,7 +407,10 @@ if __name__ == '__main__':
         conf.runtime["cfme_data"]["basic_info"]["appliance_template"] = template_name
         conf.runtime["cfme_data"]["basic_info"]["appliances_provider"] = provider_name
     pytest_config = _init_config(slave_options, slave_args)
-    slave_manager = SlaveManager(pytest_config, args.worker, config['zmq_endpoint'])
+    slave_manager = SlaveManager(pytest_config, args.worker, config['zmq_endpoint'],
+                                 serializer=config.get('serializer', 'json'),
+                                 batch_size=config.get('batch_size', 1),
+                                 collection_file=config.get('collection_file'))
     pytest_config.pluginmanager.register(slave_manager, 'slave_manager')
     pytest_config.hook.pytest_cmdline_main(config=pytest_config)
     signal.signal(signal.SIGQUIT, slave_manager.handle_quit)
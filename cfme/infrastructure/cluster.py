@@ -367,6 +367,7 @@ class ClusterCollection(BaseCollection):
 @navigator.register(ClusterCollection, 'All')
 class All(CFMENavigateStep):
     VIEW = ClusterAllView
+    URL = 'ems_cluster/show_list'
     prerequisite = NavigateToAttribute('appliance.server', 'LoggedIn')
 
     def step(self, *args, **kwargs):
@@ -292,6 +292,7 @@ class InfraProviderCollection(BaseCollection):
 @navigator.register(InfraProvider, 'All')
 class All(CFMENavigateStep):
     VIEW = InfraProvidersView
+    URL = 'ems_infra/show_list'
     prerequisite = NavigateToAttribute('appliance.server', 'LoggedIn')
 
     def step(self, *args, **kwargs):
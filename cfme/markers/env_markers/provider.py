@@ -3,14 +3,15 @@ from distutils.version import LooseVersion
 
 import attr
 import pytest
-import six
 from cached_property import cached_property
 
 from cfme.markers.env import EnvironmentMarker
 from cfme.utils import conf
 from cfme.utils.log import logger
 from cfme.utils.providers import all_types
-from cfme.utils.providers import list_providers
+from cfme.utils.providers import candidate_provider_keys
+from cfme.utils.providers import get_crud
+from cfme.utils.providers import global_filters
 from cfme.utils.providers import ProviderFilter
 from cfme.utils.pytest_shortcuts import fixture_filter
 from cfme.utils.version import Version
@@ -22,6 +23,12 @@ ONE_PER_VERSION = 'one_per_version'
 ONE_PER_CATEGORY = 'one_per_category'
 ONE_PER_TYPE = 'one_per_type'
 
+# Parametrization only reads the providers, so collection shares them between all the tests
+# {provider key: crud object}
+_collection_cruds = {}
+# {(filters, global filters, selector, appliance series): [(DataProvider, crud object), ...]}
+_selected_providers = {}
+
 
 class DPFilter(ProviderFilter):
     def __call__(self, provider):
@@ -183,36 +190,12 @@ def all_required(miq_version, filters=None):
         miq_version: The version of miq to query the supportability
         filters: A list of filters
     """
-    # Load the supportability YAML and extrace the providers portion
+    # The supportability YAML is compiled into (category, type, version) tuples, where versionless
+    # providers like EC2 and GCE have the version 0. There are cases when the data for the stream
+    # isn't available, for instance travis.
     stream = Version(miq_version).series()
-    try:
-        data_for_stream = conf.supportability[stream]['providers']
-    except KeyError:
-        # there are cases when such data isn't available. For instance travis
-        data_for_stream = {}
-
-    # Build up a list of tuples in the form of category, type dictionary,
-    #  [('cloud', {'openstack': [8, 9, 10]}), ('cloud', {'ec2'})]
-    types = [
-        (cat, type)
-        for cat, types in data_for_stream.items()
-        for type in types
-    ]
-
-    # Build up a list of data providers by iterating the types list from above
-    dprovs = []
-    for cat, prov_type_or_dict in types:
-        if isinstance(prov_type_or_dict, six.string_types):
-            # If the provider is versionless, ie, EC2, GCE, set the version number to 0
-            dprovs.append(DataProvider(cat, prov_type_or_dict, 0))
-        else:
-            # If the prov_type_or_dict is not just a string, then we have versions and need
-            # to iterate and extend the list
-            dprovs.extend([
-                DataProvider(cat, prov, ver)
-                for prov, vers in prov_type_or_dict.items()
-                for ver in vers
-            ])
+    supported = conf.snapshot().supported_providers.get(stream, ())
+    dprovs = [DataProvider(cat, prov_type, ver) for cat, prov_type, ver in supported]
 
     nfilters = [DPFilter(classes=pf.classes, inverted=pf.inverted)
                 for pf in filters if isinstance(pf, ProviderFilter)]
@@ -221,40 +204,31 @@ def all_required(miq_version, filters=None):
     return dprovs
 
 
-def providers(metafunc, filters=None, selector=ALL, fixture_name='provider'):
-    """ Gets providers based on given (+ global) filters
-
-    Note:
-        Using the default 'function' scope, each test will be run individually for each provider
-        before moving on to the next test. To group all tests related to single provider together,
-        parametrize tests in the 'module' scope.
+def _available_providers(filters):
+    """Like :py:func:`cfme.utils.providers.list_providers`, but builds every crud object once"""
+    filters = list(filters) + list(global_filters.values())
+    available_providers = []
+    for prov_key in candidate_provider_keys(filters):
+        if prov_key not in _collection_cruds:
+            _collection_cruds[prov_key] = get_crud(prov_key)
+        available_providers.append(_collection_cruds[prov_key])
+    for prov_filter in filters:
+        available_providers = [prov for prov in available_providers if prov_filter(prov)]
+    return available_providers
 
-    Note:
-        testgen for providers now requires the usage of test_flags for collection to work.
-        Please visit http://cfme-tests.readthedocs.org/guides/documenting.html#documenting-tests
-        for more details.
-    """
-    filters = filters or []
-    argnames = []
-    argvalues = []
-    idlist = []
 
-    # Obtains the test's flags in form of a ProviderFilter
-    meta = getattr(metafunc.function, 'meta', None)
-    test_flag_str = getattr(meta, 'kwargs', {}).get('from_docs', {}).get('test_flag')
-    if test_flag_str:
-        test_flags = test_flag_str.split(',')
-        flags_filter = ProviderFilter(required_flags=test_flags)
-        filters = filters + [flags_filter]
+def _select_providers(filters, selector, series):
+    """Matches the supported providers to the available ones and applies the selector
 
+    Returns:
+        A list of ``(DataProvider, crud object)`` tuples
+    """
     # available_providers are the ones "available" from the yamls after all of the global and
     # local filters have been applied. It will be a list of crud objects.
-    available_providers = list_providers(filters)
+    available_providers = _available_providers(filters)
 
     # supported_providers are the ones "supported" in the supportability.yaml file. It will
     # be a list of DataProvider objects and will be filtered based upon what the test has asked for
-    holder = metafunc.config.pluginmanager.get_plugin('appliance-holder')
-    series = holder.held_appliance.version.series()
     supported_providers = all_required(series, filters)
 
     def get_valid_providers(provider):
@@ -275,16 +249,6 @@ def providers(metafunc, filters=None, selector=ALL, fixture_name='provider'):
                     prov_tuples.append((provider, a_prov))
         return prov_tuples
 
-    # A small routine to check if we need to supply the idlist a provider type or
-    # a real type/version
-    need_prov_keys = False
-    for filter in filters:
-        if isinstance(filter, ProviderFilter) and filter.classes:
-            for filt in filter.classes:
-                if hasattr(filt, 'type_name'):
-                    need_prov_keys = True
-                    break
-
     matching_provs = [valid_provider
                       for prov in supported_providers
                       for valid_provider in get_valid_providers(prov)]
@@ -337,9 +301,57 @@ def providers(metafunc, filters=None, selector=ALL, fixture_name='provider'):
     else:
         # If there are no selectors, then the allowed providers are whichever are supported
         allowed_providers = matching_provs
+    return allowed_providers
+
+
+def providers(metafunc, filters=None, selector=ALL, fixture_name='provider'):
+    """ Gets providers based on given (+ global) filters
+
+    Note:
+        Using the default 'function' scope, each test will be run individually for each provider
+        before moving on to the next test. To group all tests related to single provider together,
+        parametrize tests in the 'module' scope.
+
+    Note:
+        testgen for providers now requires the usage of test_flags for collection to work.
+        Please visit http://cfme-tests.readthedocs.org/guides/documenting.html#documenting-tests
+        for more details.
+    """
+    filters = filters or []
+    argnames = []
+    argvalues = []
+    idlist = []
+
+    # Obtains the test's flags in form of a ProviderFilter
+    meta = getattr(metafunc.function, 'meta', None)
+    test_flag_str = getattr(meta, 'kwargs', {}).get('from_docs', {}).get('test_flag')
+    if test_flag_str:
+        test_flags = test_flag_str.split(',')
+        flags_filter = ProviderFilter(required_flags=test_flags)
+        filters = filters + [flags_filter]
+
+    # A small routine to check if we need to supply the idlist a provider type or
+    # a real type/version
+    need_prov_keys = False
+    for filter in filters:
+        if isinstance(filter, ProviderFilter) and filter.classes:
+            for filt in filter.classes:
+                if hasattr(filt, 'type_name'):
+                    need_prov_keys = True
+                    break
+
+    holder = metafunc.config.pluginmanager.get_plugin('appliance-holder')
+    series = holder.held_appliance.version.series()
+    # Most tests share their filters and selector with many others, only select once for those
+    cache_key = (frozenset(filters), frozenset(global_filters.values()), selector, series)
+    if cache_key not in _selected_providers:
+        _selected_providers[cache_key] = _select_providers(filters, selector, series)
+    allowed_providers = _selected_providers[cache_key]
 
     # Now we iterate through the required providers and try to match them to the available ones
     for data_prov, real_prov in allowed_providers:
+        # The selection is shared, every test gets its own DataProvider
+        data_prov = attr.evolve(data_prov)
         data_prov.key = real_prov.key
         argvalues.append(pytest.param(data_prov))
 
@@ -1,12 +1,93 @@
 """
 classes to manage the cfme test framework configuration
 """
+import hashlib
+import json
 import os
 import warnings
+from collections import defaultdict
 
 import attr
+import six
 import yaycl
 
+#: the configuration files a :py:class:`ConfigSnapshot` is compiled from
+SNAPSHOT_SOURCES = ('cfme_data', 'supportability')
+
+
+def _frozen_index(index):
+    return {key: tuple(values) for key, values in index.items()}
+
+
+@attr.s(frozen=True)
+class ConfigSnapshot(object):
+    """
+    a compiled view of the parts of the configuration read for every collected test
+
+    walking the nested AttrDicts of ``cfme_data`` and ``supportability`` again for every test
+    adds up, so the snapshot keeps what the provider helpers look up in plain dicts and tuples,
+    indexed the way they look it up. it is shared by the whole process and must not be modified
+    """
+    #: the ``management_systems`` keys of ``cfme_data``, in the yaml order
+    provider_keys = attr.ib(converter=tuple)
+    #: ``{type: provider keys}``
+    providers_by_type = attr.ib()
+    #: ``{tag: provider keys}``
+    providers_by_tag = attr.ib()
+    #: ``{stream: ((category, type, version), ...)}`` of the supportability yaml, the version
+    #: of versionless providers is 0
+    supported_providers = attr.ib()
+
+    @classmethod
+    def compile(cls, cfme_data, supportability):
+        """
+        builds the snapshot from the loaded ``cfme_data`` and ``supportability`` configuration
+
+        providers without a type can't be turned into crud objects and are left out
+        """
+        provider_keys = []
+        by_type, by_tag = defaultdict(list), defaultdict(list)
+        for key, data in (cfme_data.get('management_systems') or {}).items():
+            if not data.get('type'):
+                continue
+            provider_keys.append(key)
+            by_type[data['type']].append(key)
+            for tag in data.get('tags') or []:
+                by_tag[tag].append(key)
+
+        supported_providers = {}
+        for stream, stream_data in supportability.items():
+            supported = []
+            for category, types in ((stream_data or {}).get('providers') or {}).items():
+                for prov_type_or_dict in types:
+                    if isinstance(prov_type_or_dict, six.string_types):
+                        supported.append((category, prov_type_or_dict, 0))
+                    else:
+                        supported.extend(
+                            (category, prov_type, version)
+                            for prov_type, versions in prov_type_or_dict.items()
+                            for version in versions)
+            supported_providers[str(stream)] = tuple(supported)
+
+        return cls(provider_keys, _frozen_index(by_type), _frozen_index(by_tag),
+                   supported_providers)
+
+    def dump(self, path):
+        data = attr.asdict(self)
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        for index in ('providers_by_type', 'providers_by_tag'):
+            data[index] = _frozen_index(data[index])
+        data['supported_providers'] = {
+            stream: tuple(tuple(supported) for supported in stream_supported)
+            for stream, stream_supported in data['supported_providers'].items()}
+        return cls(**data)
+
 
 class Configuration(object):
     """
@@ -14,14 +95,20 @@ class Configuration(object):
     """
     def __init__(self):
         self.yaycl_config = None
+        self.config_dir = None
+        self.snapshot_cache_dir = None
+        self._snapshot = None
+        self._snapshot_overrides = None
 
-    def configure(self, config_dir, crypt_key_file=None):
+    def configure(self, config_dir, crypt_key_file=None, snapshot_cache_dir=None):
         """
         do the defered initial loading of the configuration
 
         :param config_dir: path to the folder with configuration files
         :param crypt_key_file: optional name of a file holding the key for encrypted
             configuration files
+        :param snapshot_cache_dir: optional folder to keep compiled :py:class:`ConfigSnapshot`
+            files in, so other processes don't have to load the yamls to get one
 
         :raises: AssertionError if called more than once
 
@@ -29,6 +116,8 @@ class Configuration(object):
         """
 
         assert self.yaycl_config is None
+        self.config_dir = config_dir
+        self.snapshot_cache_dir = snapshot_cache_dir
         if crypt_key_file and os.path.exists(crypt_key_file):
             self.yaycl_config = yaycl.Config(
                 config_dir=config_dir,
@@ -46,6 +135,61 @@ class Configuration(object):
             raise RuntimeError('cfme configuration was not initialized')
         return getattr(self.yaycl_config, name)
 
+    def snapshot(self):
+        """returns the :py:class:`ConfigSnapshot` of the current configuration
+
+        it is compiled once per process, unless runtime overrides change its source files.
+        without runtime overrides, it is loaded from the snapshot cache dir if the source yamls
+        didn't change since it was stored there
+        """
+        if self.yaycl_config is None:
+            raise RuntimeError('cfme configuration was not initialized')
+        runtime = self.yaycl_config.runtime
+        # membership first, looking up a missing runtime key creates it and reloads everything
+        overrides = {
+            name: json.dumps(runtime[name], sort_keys=True, default=str)
+            for name in SNAPSHOT_SOURCES if name in runtime}
+        if self._snapshot is None or overrides != self._snapshot_overrides:
+            if not overrides and self.snapshot_cache_dir:
+                self._snapshot = self._cached_snapshot()
+            else:
+                self._snapshot = self._compile_snapshot()
+            self._snapshot_overrides = overrides
+        return self._snapshot
+
+    def _compile_snapshot(self):
+        return ConfigSnapshot.compile(
+            *[self.get_config(name) for name in SNAPSHOT_SOURCES])
+
+    def _snapshot_cache_file(self):
+        # keyed by the modification times of every file the sources can be loaded from
+        sources = []
+        for name in SNAPSHOT_SOURCES:
+            for file_name in ('{}.yaml', '{}.local.yaml', '{}.eyaml', '{}.local.eyaml'):
+                source = os.path.join(self.config_dir, file_name.format(name))
+                if os.path.exists(source):
+                    sources.append((source, os.path.getmtime(source)))
+        key = hashlib.sha1(repr(sources).encode('utf-8')).hexdigest()
+        return os.path.join(self.snapshot_cache_dir, 'snapshot-{}.json'.format(key))
+
+    def _cached_snapshot(self):
+        cache_file = self._snapshot_cache_file()
+        try:
+            return ConfigSnapshot.load(cache_file)
+        except (IOError, OSError, ValueError, TypeError, KeyError):
+            pass
+        snapshot = self._compile_snapshot()
+        try:
+            if not os.path.isdir(self.snapshot_cache_dir):
+                os.makedirs(self.snapshot_cache_dir)
+            # written next to the final file and renamed, so readers never see half of it
+            temp_file = '{}.{}'.format(cache_file, os.getpid())
+            snapshot.dump(temp_file)
+            os.rename(temp_file, cache_file)
+        except (IOError, OSError) as e:
+            warnings.warn('unable to store the configuration snapshot: {}'.format(e))
+        return snapshot
+
 
 @attr.s
 class DeprecatedConfigWrapper(object):
@@ -68,6 +212,9 @@ class DeprecatedConfigWrapper(object):
     def runtime(self):
         return self.configuration.runtime
 
+    def snapshot(self):
+        return self.configuration.snapshot()
+
     def __getitem__(self, key):
         if self._warn:
             warnings.warn(
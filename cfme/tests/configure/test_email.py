@@ -1,7 +1,5 @@
 import pytest
 
-from cfme.utils.wait import wait_for
-
 
 @pytest.mark.tier(3)
 def test_send_test_email(smtp_test, random_string, appliance):
@@ -15,4 +13,4 @@ def test_send_test_email(smtp_test, random_string, appliance):
     """
     e_mail = random_string + "@email.test"
     appliance.server.settings.send_test_email(email=e_mail)
-    wait_for(lambda: len(smtp_test.get_emails(to_address=e_mail)) > 0, num_sec=60)
+    assert smtp_test.wait_for_emails(timeout=60, to_address=e_mail)
@@ -56,9 +56,12 @@ def wait_for_alert(smtp, alert, delay=None, additional_checks=None):
     """
     logger.info("Waiting for informative e-mail of alert %s to come", alert.description)
     additional_checks = additional_checks or {}
+    # Only look at the e-mails that arrived since the previous check
+    last_id = [0]
 
     def _mail_arrived():
-        for mail in smtp.get_emails():
+        for mail in smtp.wait_for_emails(timeout=10, since_id=last_id[0]):
+            last_id[0] = mail["id"]
             if "Alert Triggered: {}".format(alert.description) in mail["subject"]:
                 if not additional_checks:
                     return True
@@ -67,10 +70,11 @@ def wait_for_alert(smtp, alert, delay=None, additional_checks=None):
                         if value in mail.get(key, ""):
                             return True
         return False
+    # No delay needed, the collector holds the request until an e-mail arrives
     wait_for(
         _mail_arrived,
         num_sec=delay,
-        delay=5,
+        delay=0,
         message="wait for e-mail to come!"
     )
 
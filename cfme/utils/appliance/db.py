@@ -32,7 +32,13 @@ class ApplianceDB(AppliancePlugin):
     @cached_property
     def client(self):
         # slightly crappy: anything that changes self.address should also del(self.client)
-        return db.Db(self.address)
+        client = db.Db(self.address)
+        if conf.env.get('db', {}).get('warm_up', False):
+            try:
+                client.warm_up()
+            except Exception as e:
+                self.logger.warning('Unable to warm up the db client: %s', e)
+        return client
 
     @cached_property
     def address(self):
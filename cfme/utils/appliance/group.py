@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Run the same thing on several appliances at once
+
+Setting up multi-appliance environments (regions, replication, HA) means running the same
+commands on every appliance; :py:class:`ApplianceGroup` does that in parallel instead of one
+appliance after another:
+
+.. code-block:: python
+
+    group = ApplianceGroup(appliances)
+    results = group.run_command('systemctl restart evmserverd')
+    assert all(results), [r for r in results if not r]
+    group.run_rails_command("'MiqServer.my_server.tap { |s| s.zone = Zone.first }.save'")
+
+Every call returns a list of :py:class:`ApplianceResult`, in the order of the appliances.
+"""
+import os
+import time
+from concurrent import futures
+
+import attr
+
+from cfme.utils.log import logger
+
+
+@attr.s(frozen=True)
+class ApplianceResult(object):
+    """What one appliance returned for an :py:class:`ApplianceGroup` call
+
+    Evaluates to True when the call didn't raise and, for ssh calls, the command succeeded.
+    """
+    appliance = attr.ib()
+    #: The return value of the call, an :py:class:`cfme.utils.ssh.SSHResult` for ssh commands
+    result = attr.ib()
+    #: How many seconds the call took on this appliance
+    duration = attr.ib()
+    #: The exception the call raised, if it did
+    exception = attr.ib(default=None)
+
+    @property
+    def success(self):
+        if self.exception is not None:
+            return False
+        return getattr(self.result, 'success', True)
+
+    def __nonzero__(self):
+        return self.success
+    __bool__ = __nonzero__
+
+
+@attr.s
+class ApplianceGroup(object):
+    """Runs commands, file transfers and rails snippets on several appliances at once
+
+    Args:
+        appliances: The :py:class:`cfme.utils.appliance.IPAppliance` instances to run things on
+        max_workers: How many appliances to work on at the same time, all of them by default
+    """
+    appliances = attr.ib(converter=list)
+    max_workers = attr.ib(default=None)
+
+    def call(self, func, *args, **kwargs):
+        """Calls ``func(appliance, *args, **kwargs)`` for every appliance in parallel
+
+        Exceptions are not raised, they are stored in the :py:class:`ApplianceResult` of the
+        appliance that raised them.
+        """
+        def _timed_call(appliance):
+            start = time.time()
+            try:
+                result = func(appliance, *args, **kwargs)
+            except Exception as e:
+                logger.exception('%r failed on %s', func, appliance.hostname)
+                return ApplianceResult(appliance, None, time.time() - start, e)
+            return ApplianceResult(appliance, result, time.time() - start)
+
+        if not self.appliances:
+            return []
+        with futures.ThreadPoolExecutor(
+                max_workers=self.max_workers or len(self.appliances)) as executor:
+            return list(executor.map(_timed_call, self.appliances))
+
+    def run_command(self, command, **kwargs):
+        """See :py:meth:`cfme.utils.ssh.SSHClient.run_command`"""
+        return self.call(lambda appliance: appliance.ssh_client.run_command(command, **kwargs))
+
+    def run_rails_command(self, command, **kwargs):
+        """See :py:meth:`cfme.utils.ssh.SSHClient.run_rails_command`"""
+        return self.call(
+            lambda appliance: appliance.ssh_client.run_rails_command(command, **kwargs))
+
+    def put_file(self, local_file, remote_file='.', **kwargs):
+        """See :py:meth:`cfme.utils.ssh.SSHClient.put_file`"""
+        return self.call(
+            lambda appliance: appliance.ssh_client.put_file(local_file, remote_file, **kwargs))
+
+    def get_file(self, remote_file, local_path='', **kwargs):
+        """Gets the file from every appliance into a ``local_path/<hostname>/`` directory
+
+        See :py:meth:`cfme.utils.ssh.SSHClient.get_file`
+        """
+        def _get_file(appliance):
+            host_path = os.path.join(local_path, appliance.hostname)
+            if not os.path.isdir(host_path):
+                os.makedirs(host_path)
+            return appliance.ssh_client.get_file(remote_file, host_path, **kwargs)
+
+        return self.call(_get_file)
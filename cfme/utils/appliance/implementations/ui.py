@@ -28,6 +28,7 @@ from cfme.fixtures.pytest_store import store
 from cfme.utils.browser import manager
 from cfme.utils.log import create_sublogger
 from cfme.utils.log import logger
+from cfme.utils.navigation_timing import navigation_timings
 from cfme.utils.version import Version
 from cfme.utils.wait import wait_for
 
@@ -273,6 +274,55 @@ def can_skip_badness_test(fn):
 
 class CFMENavigateStep(NavigateStep):
     VIEW = None
+    # The path of the destination on the appliance, if it can be loaded directly. It is formatted
+    # with ``obj``, like ``'host/show/{obj.db_id}'``; override :py:attr:`url` for anything else.
+    URL = None
+
+    # Everything pre_badness_check needs to know about the page, gathered in one round trip.
+    # It also turns the sparkle off first.
+    PAGE_HEALTH_PROBE = jsmin('''\
+        function isDisplayed(el) {
+            return el !== null &&
+                !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length) &&
+                window.getComputedStyle(el).visibility !== "hidden";
+        }
+        function byXpath(xpath) {
+            return document.evaluate(
+                xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+            ).singleNodeValue;
+        }
+        function text(xpath) {
+            var el = byXpath(xpath);
+            return el === null ? "" : (el.innerText || el.textContent || "").trim();
+        }
+
+        try {
+            miqSparkleOff();
+        } catch(err) {
+            // miqSparkleOff undefined, so it's definitely off
+        }
+
+        var railsError = null;
+        if (isDisplayed(byXpath("//body[./h1 and ./p and ./hr and ./address]"))) {
+            railsError = text("//body/h1") + ": " + text("//body/p");
+        } else if (isDisplayed(
+                byXpath("//h1[normalize-space(.)='Unexpected error encountered']"))) {
+            railsError = text(
+                "//h1[normalize-space(.)='Unexpected error encountered']" +
+                "/following-sibling::h3[not(fieldset)]");
+        }
+
+        return {
+            blocked: (
+                isDisplayed(byXpath("//div[@id='blocker_div' or @id='notification']")) ||
+                Array.prototype.some.call(
+                    document.querySelectorAll(".modal-backdrop.fade.in"), isDisplayed)),
+            modal: isDisplayed(byXpath(
+                "//div[contains(@class, 'modal-dialog') and contains(@class, 'modal-lg')]")),
+            jquery: typeof jQuery !== "undefined",
+            rails_error: railsError
+        };
+        ''')
 
     @cached_property
     def view(self):
@@ -293,6 +343,49 @@ class CFMENavigateStep(NavigateStep):
         except (AttributeError, NoSuchElementException):
             return False
 
+    @property
+    def url(self):
+        """The full URL of the destination, None if it can't be loaded directly"""
+        if self.URL is None:
+            return None
+        return self.appliance.url_path(self.URL.format(obj=self.obj))
+
+    def navigate_by_url(self, *args, **kwargs):
+        """Loads the destination by its URL instead of walking through the prerequisites
+
+        Returns:
+            True if the view is displayed afterwards. False if the step has no URL or no
+            ``VIEW`` to check, or the view did not show up, then the step has to be navigated to.
+        """
+        url = self.url
+        if url is None or self.VIEW is None:
+            return False
+        self.log_message("Loading {}".format(url))
+        br = self.appliance.browser.widgetastic
+        br.url = url
+        br.plugin.ensure_page_safe()
+        try:
+            displayed = self.view.is_displayed
+        except (AttributeError, NoSuchElementException, NotImplementedError):
+            displayed = False
+        if not displayed:
+            self.log_message("View not displayed after loading {}".format(url), level="warning")
+        return displayed
+
+    def page_health(self):
+        """Turns the sparkle off and reports the state of the page in a single browser call
+
+        Returns:
+            A dict with the ``blocked``, ``modal``, ``jquery`` and ``rails_error`` keys, see
+            :py:attr:`PAGE_HEALTH_PROBE`
+        """
+        br = self.appliance.browser.widgetastic
+        try:
+            return br.execute_script(self.PAGE_HEALTH_PROBE, silent=True)
+        except UnexpectedAlertPresentException:
+            br.dismiss_any_alerts()
+            return br.execute_script(self.PAGE_HEALTH_PROBE, silent=True)
+
     def pre_badness_check(self, _tries, *args, **go_kwargs):
         # check for MiqQE javascript patch on first try and patch the appliance if necessary
         if self.appliance.is_miqqe_patch_candidate and not self.appliance.miqqe_patch_applied:
@@ -301,44 +394,24 @@ class CFMENavigateStep(NavigateStep):
             _tries -= 1
             self.go(_tries, *args, **go_kwargs)
 
-        br = self.appliance.browser
-
-        try:
-            br.widgetastic.execute_script('miqSparkleOff();', silent=True)
-        except:  # noqa
-            # miqSparkleOff undefined, so it's definitely off.
-            # Or maybe it is alerts? Let's only do this when we get an exception.
-            self.appliance.browser.widgetastic.dismiss_any_alerts()
-            # If we went so far, let's put diapers on one more miqSparkleOff just to be sure
-            # It can be spinning in the back
-            try:
-                br.widgetastic.execute_script('miqSparkleOff();', silent=True)
-            except:  # noqa
-                pass
+        health = self.page_health()
 
         # Check if the page is blocked with blocker_div. If yes, let's headshot the browser right
         # here
-        if (
-                br.widgetastic.is_displayed("//div[@id='blocker_div' or @id='notification']") or
-                br.widgetastic.is_displayed(".modal-backdrop.fade.in")):
+        if health['blocked']:
             logger.warning("Page was blocked with blocker div on start of navigation, recycling.")
             self.appliance.browser.quit_browser()
             self.go(_tries, *args, **go_kwargs)
+            return
 
         # Check if modal window is displayed
-        if (br.widgetastic.is_displayed(
-                "//div[contains(@class, 'modal-dialog') and contains(@class, 'modal-lg')]")):
+        if health['modal']:
             logger.warning("Modal window was open; closing the window")
-            br.widgetastic.click(
+            self.appliance.browser.widgetastic.click(
                 "//button[contains(@class, 'close') and contains(@data-dismiss, 'modal')]")
 
         # Check if jQuery present
-        try:
-            br.widgetastic.execute_script("jQuery", silent=True)
-        except Exception as e:
-            if "jQuery" not in str(e):
-                logger.error("Checked for jQuery but got something different.")
-                logger.exception(e)
+        if not health['jquery']:
             # Restart some workers
             logger.warning("Restarting UI and VimBroker workers!")
             with self.appliance.ssh_client as ssh:
@@ -350,10 +423,10 @@ class CFMENavigateStep(NavigateStep):
             self.appliance.browser.quit_browser()
             self.appliance.browser.open_browser(url_key=self.obj.appliance.server.address())
             self.go(_tries, *args, **go_kwargs)
+            return
 
         # Same with rails errors
-        view = br.widgetastic.create_view(ErrorView)
-        rails_e = view.get_rails_error()
+        rails_e = health['rails_error']
 
         if rails_e is not None:
             logger.warning("Page was blocked by rails error, renavigating.")
@@ -515,8 +588,20 @@ class CFMENavigateStep(NavigateStep):
         str_msg = "[UI-NAV/{}/{}]: {}".format(class_name, self._name, msg)
         getattr(logger, level)(str_msg)
 
-    def construct_message(self, here, resetter, view, duration, waited, force):
+    def record_timing(self, duration, prerequisite_duration, here, via_url, force):
+        """Stores the timing in :py:data:`cfme.utils.navigation_timing.navigation_timings`"""
+        class_name = self.obj.__name__ if isclass(self.obj) else self.obj.__class__.__name__
+        try:
+            navigation_timings.record(
+                '{}/{}'.format(class_name, self._name), duration, prerequisite_duration,
+                already_here=bool(here), via_url=bool(via_url), forced=force)
+        except Exception:
+            logger.exception("Could not record the navigation timing")
+
+    def construct_message(self, here, resetter, view, duration, waited, force, via_url=False):
         str_here = "Already Here" if here else "Needed Navigation"
+        if via_url:
+            str_here = "Loaded by URL"
         str_resetter = "Resetter Used" if resetter else "No Resetter"
         str_view = "View Returned" if view else "No View Available"
         str_waited = "Waited on View" if waited else "No Wait on View"
@@ -527,7 +612,7 @@ class CFMENavigateStep(NavigateStep):
         )
 
     def go(self, _tries=0, *args, **kwargs):
-        nav_args = {'use_resetter': True, 'wait_for_view': 10, 'force': False}
+        nav_args = {'use_resetter': True, 'wait_for_view': 10, 'force': False, 'use_url': True}
         self.log_message("Beginning Navigation...", level="info")
         start_time = time.time()
         if _tries > 2:
@@ -545,6 +630,8 @@ class CFMENavigateStep(NavigateStep):
         resetter_used = False
         waited = False
         force_used = False
+        via_url = False
+        prerequisite_duration = 0
         try:
             here = self.check_for_badness(self.am_i_here, _tries, nav_args, *args, **kwargs)
         except NotImplementedError:
@@ -557,17 +644,23 @@ class CFMENavigateStep(NavigateStep):
         if not here or nav_args['force']:
             if nav_args['force']:
                 force_used = True
-            self.log_message("Prerequisite Needed")
-            self.prerequisite_view = self.prerequisite()
-            try:
-                self.check_for_badness(self.step, _tries, nav_args, *args, **kwargs)
-            except (exceptions.CandidateNotFound, exceptions.ItemNotFound) as e:
-                self.log_message(
-                    "Item/Tree Exception raised [{}] whilst running step, trying refresh"
-                    .format(e), level="error"
-                )
-                self.appliance.browser.widgetastic.refresh()
-                self.check_for_badness(self.step, _tries, nav_args, *args, **kwargs)
+            if nav_args['use_url'] and self.url is not None:
+                via_url = self.check_for_badness(
+                    self.navigate_by_url, _tries, nav_args, *args, **kwargs)
+            if not via_url:
+                self.log_message("Prerequisite Needed")
+                prerequisite_start = time.time()
+                self.prerequisite_view = self.prerequisite()
+                prerequisite_duration = int((time.time() - prerequisite_start) * 1000)
+                try:
+                    self.check_for_badness(self.step, _tries, nav_args, *args, **kwargs)
+                except (exceptions.CandidateNotFound, exceptions.ItemNotFound) as e:
+                    self.log_message(
+                        "Item/Tree Exception raised [{}] whilst running step, trying refresh"
+                        .format(e), level="error"
+                    )
+                    self.appliance.browser.widgetastic.refresh()
+                    self.check_for_badness(self.step, _tries, nav_args, *args, **kwargs)
         if nav_args['use_resetter']:
             resetter_used = True
             self.check_for_badness(self.resetter, _tries, nav_args, *args, **kwargs)
@@ -582,9 +675,11 @@ class CFMENavigateStep(NavigateStep):
                 message="Waiting for view [{}] to display".format(view.__class__.__name__)
             )
         self.log_message(
-            self.construct_message(here, resetter_used, view, duration, waited, force_used),
+            self.construct_message(
+                here, resetter_used, view, duration, waited, force_used, via_url),
             level="info"
         )
+        self.record_timing(duration, prerequisite_duration, here, via_url, force_used)
         return view
 
 
@@ -40,6 +40,9 @@ class SystemdService(AppliancePlugin):
             cmd = 'systemctl {} {}'.format(quote(command), quote(unit))
             log_callback('Running {}'.format(cmd))
             result = ssh.run_command(cmd)
+            if unit == 'evmserverd' and command in ('stop', 'start', 'restart'):
+                # the rails daemon would keep the settings and caches from before the restart
+                ssh.stop_rails_daemon()
 
         if expected_exit_code is not None and result.rc != expected_exit_code:
             # TODO: Bring back address
@@ -4,7 +4,9 @@ import json
 import os
 import threading
 import time
+from collections import defaultdict
 from collections import namedtuple
+from copy import deepcopy
 from shutil import rmtree
 from string import Template
 from tempfile import mkdtemp
@@ -174,9 +176,11 @@ class BrowserFactory(object):
 
 
 class WharfFactory(BrowserFactory):
-    def __init__(self, webdriver_class, browser_kwargs, wharf):
+    def __init__(self, webdriver_class, browser_kwargs, wharf, checked_out=None):
         super(WharfFactory, self).__init__(webdriver_class, browser_kwargs)
         self.wharf = wharf
+        # shared set of the wharfs holding a container, so they can be checked in at exit
+        self.checked_out = checked_out if checked_out is not None else set()
 
         if browser_kwargs.get('desired_capabilities', {}).get('browserName') == 'chrome':
             # chrome uses containers to sandbox the browser, and we use containers to
@@ -205,18 +209,18 @@ class WharfFactory(BrowserFactory):
 
         def inner():
             try:
-                self.wharf.checkout()
+                self._checkout()
                 return super(WharfFactory, self).create(url_key)
             except URLError as ex:
                 # connection to selenum was refused for unknown reasons
                 log.error('URLError connecting to selenium; recycling container. URLError:')
                 write_line('URLError caused container recycle, see log for details', red=True)
                 log.exception(ex)
-                self.wharf.checkin()
+                self._checkin()
                 raise
             except Exception:
                 log.exception("failure on webdriver usage, returning container")
-                self.wharf.checkin()
+                self._checkin()
                 raise
 
         return tries(WHARF_OUTER_RETRIES, BROWSER_ERRORS, inner)
@@ -225,12 +229,141 @@ class WharfFactory(BrowserFactory):
         try:
             super(WharfFactory, self).close(browser)
         finally:
-            self.wharf.checkin()
+            self._checkin()
+
+    def _checkout(self):
+        self.wharf.checkout()
+        self.checked_out.add(self.wharf)
+
+    def _checkin(self):
+        self.checked_out.discard(self.wharf)
+        self.wharf.checkin()
+
+
+class BrowserPool(object):
+    """Keeps browsers started in the background, so there is one ready when a browser is needed
+
+    Every browser is started by a new factory from ``make_factory``, so with wharf each one has
+    its own container. The pooled browsers have the appliance page loaded; logging in is left
+    to the navigation. Only browsers for the url key acquired last are kept, the ones for other
+    url keys are closed when a new one is acquired.
+
+    Args:
+        make_factory: Callable returning a new :py:class:`BrowserFactory`
+        size: How many ready browsers to keep
+    """
+    def __init__(self, make_factory, size=1):
+        self.make_factory = make_factory
+        self.size = size
+        self.timings = {'cold': [], 'warm': []}
+        self._ready = defaultdict(list)
+        self._starting = defaultdict(int)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._url_key = None
+
+    def acquire(self, url_key):
+        """Returns a ``(factory, browser)`` pair, ready if possible, otherwise started now
+
+        The browser has to be closed with the factory it came with.
+        """
+        start = time.time()
+        with self._lock:
+            self._url_key = url_key
+            stale = [
+                pair
+                for key in list(self._ready) if key != url_key
+                for pair in self._ready.pop(key)]
+            ready = self._ready[url_key]
+            factory, browser = ready.pop(0) if ready else (None, None)
+        for stale_factory, stale_browser in stale:
+            self._close(stale_factory, stale_browser)
+        self.replenish(url_key)
+        if browser is not None and not self._is_alive(browser):
+            self._close(factory, browser)
+            browser = None
+        if browser is None:
+            kind = 'cold'
+            factory = self.make_factory()
+            browser = factory.create(url_key=url_key)
+        else:
+            kind = 'warm'
+        duration = time.time() - start
+        self.timings[kind].append(duration)
+        log.info('%s browser for %r acquired in %.1fs', kind, url_key, duration)
+        return factory, browser
+
+    def replenish(self, url_key):
+        """Starts browsers in the background until there are ``size`` of them for the url key"""
+        with self._lock:
+            missing = self.size - len(self._ready[url_key]) - self._starting[url_key]
+            if self._closed or missing <= 0:
+                return
+            self._starting[url_key] += missing
+        for _ in range(missing):
+            thread = threading.Thread(target=self._start_browser, args=(url_key,))
+            thread.daemon = True
+            thread.start()
+
+    def _start_browser(self, url_key):
+        try:
+            factory = self.make_factory()
+            browser = factory.create(url_key=url_key)
+        except Exception:
+            log.exception('could not start a pooled browser for %r', url_key)
+            with self._lock:
+                self._starting[url_key] -= 1
+            return
+        with self._lock:
+            self._starting[url_key] -= 1
+            # the url key may have changed while the browser was starting
+            closed = self._closed or url_key != self._url_key
+            if not closed:
+                self._ready[url_key].append((factory, browser))
+        if closed:
+            self._close(factory, browser)
+        else:
+            log.info('pooled browser for %r is ready', url_key)
+
+    @staticmethod
+    def _is_alive(browser):
+        try:
+            browser.current_url
+        except UnexpectedAlertPresentException:
+            return True
+        except Exception:
+            log.exception('pooled browser is dead')
+            return False
+        return True
+
+    @staticmethod
+    def _close(factory, browser):
+        try:
+            factory.close(browser)
+        except Exception:
+            log.exception('An exception happened during pooled browser shutdown:')
+
+    def stats(self):
+        """Returns the number and average duration of the cold and warm acquisitions"""
+        return {
+            kind: {
+                'count': len(durations),
+                'average': sum(durations) / len(durations) if durations else None}
+            for kind, durations in self.timings.items()}
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            pooled = [pair for ready in self._ready.values() for pair in ready]
+            self._ready.clear()
+        for factory, browser in pooled:
+            self._close(factory, browser)
 
 
 class BrowserManager(object):
-    def __init__(self, browser_factory):
+    def __init__(self, browser_factory, pool=None):
         self.factory = browser_factory
+        self.pool = pool
         self.browser = None
         self._browser_renew_thread = None
 
@@ -243,16 +376,36 @@ class BrowserManager(object):
         webdriver_class = getattr(webdriver, webdriver_name)
 
         browser_kwargs = browser_conf.get('webdriver_options', {})
+        pool_size = browser_conf.get('pool_size', 0)
 
         if 'webdriver_wharf' in browser_conf:
-            wharf = Wharf(browser_conf['webdriver_wharf'])
-            atexit.register(wharf.checkin)
             if browser_conf[
                 'webdriver_options'][
                     'desired_capabilities']['browserName'].lower() == 'firefox':
                 browser_kwargs['desired_capabilities']['marionette'] = True
                 browser_kwargs['desired_capabilities']['acceptInsecureCerts'] = True
-            return cls(WharfFactory(webdriver_class, browser_kwargs, wharf))
+
+            # only the wharfs holding a container, they leave the set when checked in
+            checked_out = set()
+
+            def checkin_wharfs():
+                for wharf in list(checked_out):
+                    wharf.checkin()
+            # Registered before the pool closes its browsers, so it runs after that
+            atexit.register(checkin_wharfs)
+
+            def make_wharf_factory(browser_kwargs):
+                wharf = Wharf(browser_conf['webdriver_wharf'])
+                return WharfFactory(webdriver_class, browser_kwargs, wharf, checked_out)
+
+            pool = None
+            if pool_size:
+                # WharfFactory modifies the kwargs, every factory needs a fresh copy
+                pristine_kwargs = deepcopy(browser_kwargs)
+                pool = BrowserPool(
+                    lambda: make_wharf_factory(deepcopy(pristine_kwargs)), pool_size)
+                atexit.register(pool.close)
+            return cls(make_wharf_factory(browser_kwargs), pool)
         else:
             if webdriver_name.lower() == "remote":
                 if browser_conf[
@@ -271,7 +424,12 @@ class BrowserManager(object):
                     browser_kwargs['desired_capabilities']['marionette'] = True
                     browser_kwargs['desired_capabilities']['acceptInsecureCerts'] = True
 
-            return cls(BrowserFactory(webdriver_class, browser_kwargs))
+            pool = None
+            if pool_size:
+                pool = BrowserPool(
+                    lambda: BrowserFactory(webdriver_class, deepcopy(browser_kwargs)), pool_size)
+                atexit.register(pool.close)
+            return cls(BrowserFactory(webdriver_class, browser_kwargs), pool)
 
     def _is_alive(self):
         log.debug("alive check")
@@ -335,7 +493,11 @@ class BrowserManager(object):
         log.info('starting browser for %r', url_key)
         assert self.browser is None
 
-        self.browser = self.factory.create(url_key=url_key)
+        if self.pool is not None:
+            # The browser has to be closed by the factory that started it
+            self.factory, self.browser = self.pool.acquire(url_key)
+        else:
+            self.browser = self.factory.create(url_key=url_key)
         return self.browser
 
 
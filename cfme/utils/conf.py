@@ -7,6 +7,7 @@ from cfme.utils import path
 global_configuration.configure(
     config_dir=path.conf_path.strpath,
     crypt_key_file=path.project_path.join('.yaml_key').strpath,
+    snapshot_cache_dir=path.project_path.join('.config_snapshot_cache').strpath,
 )
 
 sys.modules[__name__] = DeprecatedConfigWrapper(global_configuration)
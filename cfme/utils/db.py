@@ -1,6 +1,11 @@
+import hashlib
+import os
+import pickle
+import sys
 from collections import Mapping
 from contextlib import contextmanager
 
+import sqlalchemy
 from cached_property import cached_property
 from sqlalchemy import create_engine
 from sqlalchemy import event
@@ -14,8 +19,23 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import Pool
 
 from cfme.fixtures.pytest_store import store
+from cfme.utils import at_exit
 from cfme.utils import conf
 from cfme.utils.log import logger
+from cfme.utils.path import project_path
+
+#: Where the reflected schemas are stored, see :py:attr:`Db.metadata`
+_schema_cache_dir = project_path.join('.db_schema_cache')
+
+#: Tables reflected by :py:meth:`Db.warm_up` by default, the ones the model code uses the most;
+#: appliances warm their db up when ``db: warm_up`` is set in env.yaml
+COMMON_TABLES = (
+    'ext_management_systems', 'metrics', 'metric_rollups', 'miq_ae_namespaces',
+    'miq_ae_classes', 'miq_ae_instances', 'miq_ae_methods', 'container_projects',
+    'container_groups', 'hosts', 'vms', 'ems_clusters', 'chargeback_rates',
+    'chargeback_rate_details', 'chargeback_tiers', 'miq_event_definitions', 'event_streams',
+    'miq_servers', 'miq_policies', 'miq_sets', 'git_repositories',
+)
 
 
 @event.listens_for(Pool, "checkout")
@@ -70,11 +90,13 @@ class Db(Mapping):
         Creating a table object requires a call to the database so that SQLAlchemy can do
         reflection to determine the table's structure (columns, keys, indices, etc). On
         a latent connection, this can be extremely slow, which will affect methods that return
-        tables, like the mapping interface or :py:meth:`values`.
+        tables, like the mapping interface or :py:meth:`values`. Reflected tables are therefore
+        stored on disk for the schema version of the database, see :py:attr:`metadata`.
 
     """
     def __init__(self, hostname=None, credentials=None, port=None):
         self._table_cache = {}
+        self._schema_cache_dirty = False
         self.hostname = hostname or store.current_appliance.db.address
         self.port = port or store.current_appliance.db_port
 
@@ -184,13 +206,73 @@ class Db(Mapping):
 
         This can be used for introspection of reflected items.
 
+        The tables reflected by any process for the same :py:attr:`schema_version` are loaded
+        from :py:attr:`schema_cache_file`, so they don't have to be reflected again.
+
         Note:
 
             Tables that haven't been reflected won't show up in metadata. To reflect a table,
             use :py:meth:`reflect_table`.
 
         """
-        return MetaData(bind=self.engine)
+        cache_file = self.schema_cache_file
+        if cache_file is None:
+            return MetaData(bind=self.engine)
+        try:
+            with open(cache_file, 'rb') as f:
+                metadata = pickle.load(f)
+        except Exception as e:
+            if not isinstance(e, IOError):
+                logger.warning('[DB] Ignoring unreadable schema cache %s: %s', cache_file, e)
+            return MetaData(bind=self.engine)
+        metadata.bind = self.engine
+        logger.info('[DB] Loaded %d tables from schema cache %s',
+                    len(metadata.tables), cache_file)
+        return metadata
+
+    @cached_property
+    def schema_version(self):
+        """Identifies the schema of this database by the rails migrations applied to it"""
+        count, version = self.engine.execute(
+            'SELECT count(*), max(version) FROM schema_migrations').fetchone()
+        return '{}-{}'.format(count, version)
+
+    @cached_property
+    def schema_cache_file(self):
+        """The file :py:attr:`metadata` is stored in for this :py:attr:`schema_version`
+
+        None if the schema version can't be read, the schema is not cached then.
+        """
+        try:
+            schema_version = self.schema_version
+        except Exception as e:
+            logger.warning('[DB] Not caching the schema, unable to read its version: %s', e)
+            return None
+        # pickles are only compatible with the same python and sqlalchemy versions
+        key = '{}-py{}-sqlalchemy{}'.format(
+            schema_version, sys.version_info[0], sqlalchemy.__version__)
+        return _schema_cache_dir.join(
+            '{}.pickle'.format(hashlib.sha1(key.encode('utf-8')).hexdigest())).strpath
+
+    def save_schema_cache(self):
+        """Stores the tables reflected since the last save in :py:attr:`schema_cache_file`
+
+        Called after :py:meth:`warm_up` and at exit, so the cache is written once per batch of
+        reflected tables rather than once per table.
+        """
+        cache_file = self.schema_cache_file
+        if not self._schema_cache_dirty or cache_file is None:
+            return
+        self._schema_cache_dirty = False
+        # write and rename so that other processes never read a half written file
+        tmp_file = '{}.{}'.format(cache_file, os.getpid())
+        try:
+            _schema_cache_dir.ensure(dir=True)
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(self.metadata, f, protocol=2)
+            os.rename(tmp_file, cache_file)
+        except Exception as e:
+            logger.warning('[DB] Unable to store the schema cache: %s', e)
 
     @cached_property
     def db_url(self):
@@ -250,7 +332,35 @@ class Db(Mapping):
             table_name: The name of a table to reflect
 
         """
-        self.metadata.reflect(only=[table_name])
+        self.reflect_tables([table_name])
+
+    def reflect_tables(self, table_names):
+        """Populate :py:attr:`metadata` with the tables not reflected yet, in one go
+
+        Args:
+            table_names: The names of the tables to reflect
+
+        """
+        missing = [name for name in table_names if name not in self.metadata.tables]
+        if missing:
+            self.metadata.reflect(only=missing)
+            if not self._schema_cache_dirty:
+                self._schema_cache_dirty = True
+                at_exit(self.save_schema_cache)
+
+    def warm_up(self, table_names=COMMON_TABLES):
+        """Reflects the tables before they're needed, so that using them is instant
+
+        Args:
+            table_names: The names of the tables to reflect, :py:data:`COMMON_TABLES` by default;
+                the ones that don't exist in this database are skipped
+
+        """
+        self.reflect_tables([name for name in table_names if name in self.table_names])
+        self.save_schema_cache()
+        for table_name in table_names:
+            if table_name in self.metadata.tables:
+                self._table(table_name)
 
     def _table(self, table_name):
         """Retrieves, reflects, and caches table objects
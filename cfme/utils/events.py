@@ -2,6 +2,7 @@
 """Library for event testing.
 
 """
+from collections import defaultdict
 from threading import Event as ThreadEvent
 from threading import Thread
 from time import sleep
@@ -118,13 +119,57 @@ class Event(object):
         return self
 
 
+class ExpectedEventIndex(object):
+    """ Finds the expected events which can match a received event.
+
+    Expected events are indexed by the values of their :py:attr:`KEYS` attributes. The ones
+    without a plain value for such attribute (not given, or compared by a ``cmp_func``) are
+    candidates for any value of it. Candidates are returned in the order they were listened to.
+
+    Args:
+        exp_events: The expected event dicts of an event listener
+    """
+    KEYS = ('event_type', 'target_type')
+
+    def __init__(self, exp_events):
+        self._index = defaultdict(list)
+        for position, exp_event in enumerate(exp_events):
+            self._index[self.key(exp_event['event'])].append((position, exp_event))
+
+    @classmethod
+    def key(cls, event):
+        key = []
+        for name in cls.KEYS:
+            attr = event.event_attrs.get(name)
+            if attr is None or not attr.value or attr.cmp_func:
+                key.append(None)
+            else:
+                key.append(attr.value)
+        return tuple(key)
+
+    def candidates(self, event):
+        """ Returns the expected events which can match the received event."""
+        event_type, target_type = self.key(event)
+        keys = {(event_type, target_type), (event_type, None), (None, target_type), (None, None)}
+        candidates = []
+        for key in keys:
+            candidates.extend(self._index.get(key, []))
+        return [exp_event for _, exp_event in sorted(candidates, key=lambda c: c[0])]
+
+
 class RestEventListener(Thread):
     """ EventListener accepts "expected" events, listens to db events and compares matched events
     with expected events. Runs callback function if expected events have it.
 
     :var FILTER_ATTRS: List of filters used in REST API call
+    :var PAGE_SIZE: How many events to get in one REST API call
+    :var MIN_POLL_INTERVAL: Seconds between polls while events keep arriving
+    :var MAX_POLL_INTERVAL: The poll interval doubles up to this while no events arrive
     """
     FILTER_ATTRS = ['event_type', 'target_type', 'target_id', 'source']
+    PAGE_SIZE = 500
+    MIN_POLL_INTERVAL = 1
+    MAX_POLL_INTERVAL = 8
 
     def __init__(self, appliance):
         super(RestEventListener, self).__init__()
@@ -208,41 +253,59 @@ class RestEventListener(Thread):
     def process_events(self):
         """ Processes all new events and compares them with expected events.
 
+        Each poll gets all the events which arrived since the previous one in one ranged query
+        and compares each of them only with the expected events it can match.
         Processed events are ignored next time.
         """
-        while not self._stop_event.is_set():
-            sleep(1)
+        interval = self.MIN_POLL_INTERVAL
+        while not self._stop_event.wait(interval):
             cur_last_record_id = self.get_max_record_id()
-            if not cur_last_record_id:
+            if not cur_last_record_id or cur_last_record_id == self._last_processed_id:
+                interval = min(interval * 2, self.MAX_POLL_INTERVAL)
                 continue
-
-            for exp_event in self._events_to_listen:
-
-                # Skip if event has occurred
-                if exp_event['first_event'] and len(exp_event['matched_events']):
-                    continue
-
-                matched_events = self.get_next_portion(exp_event['event'], cur_last_record_id)
-
-                if not matched_events:
-                    continue
-
-                # Match events
-                try:
-                    for event_entity in matched_events:
-                            got_event = Event(self._appliance).build_from_entity(event_entity)
+            interval = self.MIN_POLL_INTERVAL
+
+            # Skip events which have occurred
+            exp_events = [exp_event for exp_event in self._events_to_listen
+                          if not (exp_event['first_event'] and exp_event['matched_events'])]
+            if exp_events:
+                for exp_event in exp_events:
+                    exp_event['event'].process_id()
+                index = ExpectedEventIndex(exp_events)
+                for event_entity in self.get_events(self._last_processed_id, cur_last_record_id):
+                    # Match events
+                    try:
+                        got_event = Event(self._appliance).build_from_entity(event_entity)
+                        for exp_event in index.candidates(got_event):
                             if exp_event['event'].matches(got_event):
                                 if exp_event['callback']:
                                     exp_event['callback'](exp_event=exp_event['event'],
                                                           got_event=got_event)
                                 exp_event['matched_events'].append(got_event)
-                except Exception:
-                    logger.exception("An exception during matching events occurred.")
+                    except Exception:
+                        logger.exception("An exception during matching events occurred.")
 
-                if self._stop_event.is_set():
-                    break
+                    if self._stop_event.is_set():
+                        break
             self._last_processed_id = cur_last_record_id
 
+    def get_events(self, min_id, max_id):
+        """ Yields the event entities with ``min_id < id <= max_id``, ordered by id.
+
+        Gets them :py:attr:`PAGE_SIZE` at a time, with all their attributes.
+        """
+        q = Q('id', '>', min_id or 0) & Q('id', '<=', max_id)
+        offset = 0
+        while True:
+            result = self.event_streams.query_string(
+                expand='resources', sort_by='id', sort_order='asc', limit=self.PAGE_SIZE,
+                offset=offset, **{'filter[]': q.as_filters})
+            for event_entity in result.resources:
+                yield event_entity
+            if len(result.resources) < self.PAGE_SIZE:
+                break
+            offset += len(result.resources)
+
     def get_next_portion(self, evt, max_id=None):
         """ Returns list with one or more events matched with expected event.
 
@@ -7,11 +7,11 @@ from datetime import datetime
 from numbers import Number
 from threading import Event as ThreadEvent
 from threading import Thread
-from time import sleep
 
 from cached_property import cached_property
 from sqlalchemy.sql.expression import func
 
+from cfme.utils.events import ExpectedEventIndex
 from cfme.utils.log import create_sublogger
 
 logger = create_sublogger('events')
@@ -226,14 +226,11 @@ class Event(object):
     def _is_raw_event(self, evt):
         return evt.__tablename__ == 'event_streams'
 
-    def matches(self, evt):
+    def process_id(self):
         """
-        compares current event with passed event.
+        resolves target_id by target_type and target name.
+        returns False if the target isn't in the db yet.
         """
-        if not isinstance(evt, type(self)):
-            raise ValueError("passed event doesn't belong to {}".format(type(self)))
-
-        # checking only common attributes
         if 'target_name' in self.event_attrs and 'target_id' not in self.event_attrs:
             try:
                 target_id = self._tool.process_id(self.event_attrs['target_type'].value,
@@ -242,6 +239,18 @@ class Event(object):
             except ValueError:
                 # vm or host name isn't added to db yet. need to wait
                 return False
+        return True
+
+    def matches(self, evt):
+        """
+        compares current event with passed event.
+        """
+        if not isinstance(evt, type(self)):
+            raise ValueError("passed event doesn't belong to {}".format(type(self)))
+
+        # checking only common attributes
+        if not self.process_id():
+            return False
 
         common_attrs = set(self.event_attrs).intersection(set(evt.event_attrs))
         for attr in common_attrs:
@@ -285,7 +294,15 @@ class DbEventListener(Thread):
     """
      accepts "expected" events, listens to db events and compares showed up events with expected
      events. Runs callback function if expected events have it.
+
+    :var PAGE_SIZE: How many events to get in one query
+    :var MIN_POLL_INTERVAL: Seconds between polls while events keep arriving
+    :var MAX_POLL_INTERVAL: The poll interval doubles up to this while no events arrive
     """
+    PAGE_SIZE = 500
+    MIN_POLL_INTERVAL = 0.2
+    MAX_POLL_INTERVAL = 3.2
+
     def __init__(self, appliance):
         super(DbEventListener, self).__init__()
         self._appliance = appliance
@@ -304,7 +321,7 @@ class DbEventListener(Thread):
         else:
             try:
                 self._last_processed_id = self._tool.query(
-                    func.max(self._tool.event_streams.id)).one()
+                    func.max(self._tool.event_streams.id)).scalar()
             except IndexError:
                 # No events yet, so do nothing
                 pass
@@ -385,17 +402,25 @@ class DbEventListener(Thread):
     def process_events(self):
         """
         processes all new db events and compares them with expected events.
+        every event is compared only with the expected events it can match.
         processed events are ignored next time
         """
-        while not self._stop_event.is_set():
+        interval = self.MIN_POLL_INTERVAL
+        while not self._stop_event.wait(interval):
             events = self.get_next_portion()
             if len(events) == 0:
-                sleep(0.2)
+                interval = min(interval * 2, self.MAX_POLL_INTERVAL)
                 continue
+            interval = self.MIN_POLL_INTERVAL
+
+            # expected events whose target isn't in the db yet can't match anything
+            index = ExpectedEventIndex(
+                [exp_event for exp_event in self._events_to_listen
+                 if exp_event['event'].process_id()])
             for got_event in events:
                 logger.debug("processing event id {}".format(got_event.id))
                 got_event = Event(event_tool=self._tool).build_from_raw_event(got_event)
-                for exp_event in self._events_to_listen:
+                for exp_event in index.candidates(got_event):
                     if exp_event['first_event'] and len(exp_event['matched_events']) > 0:
                         continue
 
@@ -426,9 +451,10 @@ class DbEventListener(Thread):
 
     def get_next_portion(self):
         logger.debug("obtaining next portion of events")
-        return self._tool.query(self._tool.event_streams)\
-            .filter(self._tool.event_streams.id > self._last_processed_id)\
-            .order_by(self._tool.event_streams.id).yield_per(100).all()
+        query = self._tool.query(self._tool.event_streams)
+        if self._last_processed_id is not None:
+            query = query.filter(self._tool.event_streams.id > self._last_processed_id)
+        return query.order_by(self._tool.event_streams.id).limit(self.PAGE_SIZE).all()
 
     def check_expected_events(self):
         return all([len(event['matched_events']) for event in self.got_events])
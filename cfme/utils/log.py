@@ -134,11 +134,14 @@ import inspect
 import logging
 import os
 import sys
+import threading
 import warnings
 from time import time
 from traceback import extract_tb
 from traceback import format_tb
 
+from six.moves import queue
+
 from cfme.utils import conf
 from cfme.utils import safe_string
 from cfme.utils.path import get_rel_path
@@ -451,21 +454,115 @@ def nth_frame_info(n):
 
 
 class ArtifactorHandler(logging.Handler):
-    """Logger handler that hands messages off to the artifactor"""
+    """Logger handler that hands messages off to the artifactor
+
+    Records are put on a queue and sent by a background thread, ``batch_size`` of them in one
+    ``log_messages`` hook, or whatever was logged in the last ``flush_interval`` seconds. Only the
+    fields the artifactor's log files need are sent, with the message already formatted.
+
+    Emitting a record never waits for the artifactor. If the queue fills up past
+    ``sample_threshold``, records below WARNING are dropped; if it is full, all of them are.
+    The number of dropped records is logged to the artifactor once there's room again.
 
-    slaveid = artifactor = None
+    Every record is tagged with the ``test_ident`` of the test running when it was logged, so
+    the artifactor files it into the right log even if it arrives after the test finished.
+    """
+
+    slaveid = artifactor = test_ident = None
+    batch_size = 200
+    flush_interval = 1.0
+    queue_size = 10000
+    sample_threshold = 0.8
+    record_fields = (
+        'name', 'levelno', 'levelname', 'pathname', 'filename', 'module', 'lineno', 'funcName',
+        'created', 'msecs', 'relativeCreated', 'thread', 'threadName', 'process')
+
+    def __init__(self, *args, **kwargs):
+        super(ArtifactorHandler, self).__init__(*args, **kwargs)
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._sender = None
+        self._sender_lock = threading.Lock()
+        self.dropped = 0
 
     def createLock(self):  # NOQA: false positive, base class override
-        # opt out of locking since artifactor hook calling is threadsave
+        # opt out of locking since the queue is threadsafe
         self.lock = None
 
+    def serialize(self, record):
+        """Returns the fields of the record the artifactor needs, formatting the message"""
+        log_record = {field: getattr(record, field, None) for field in self.record_fields}
+        log_record['msg'] = record.getMessage()
+        log_record['args'] = ()
+        log_record['test_ident'] = self.test_ident
+        if record.exc_info:
+            log_record['exc_text'] = logging.Formatter().formatException(record.exc_info)
+        else:
+            log_record['exc_text'] = record.exc_text
+        return log_record
+
     def emit(self, record):
-        if self.artifactor:
-            self.artifactor.fire_hook(
-                'log_message',
-                log_record=record.__dict__,
-                slaveid=self.slaveid,
-            )
+        if not self.artifactor:
+            return
+        if (record.levelno < logging.WARNING
+                and self._queue.qsize() >= self.queue_size * self.sample_threshold):
+            self.dropped += 1
+            return
+        try:
+            self._queue.put_nowait(self.serialize(record))
+        except queue.Full:
+            self.dropped += 1
+            return
+        except Exception:
+            self.handleError(record)
+            return
+        self._start_sender()
+
+    def drain(self, timeout=5):
+        """Blocks until all the queued records were handed to the artifactor, or timeout
+
+        Only meant for the end of the session, :py:meth:`flush` stays a no-op so neither the
+        tests nor ``logging.shutdown`` wait for the artifactor.
+        """
+        if self._sender is None:
+            return
+        deadline = time() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks and time() < deadline:
+                self._queue.all_tasks_done.wait(deadline - time())
+
+    def _start_sender(self):
+        if self._sender is not None:
+            return
+        with self._sender_lock:
+            if self._sender is None:
+                self._sender = threading.Thread(
+                    target=self._send_queued, name='artifactor_log_sender')
+                self._sender.daemon = True
+                self._sender.start()
+
+    def _send_queued(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time(), 0)))
+                except queue.Empty:
+                    break
+            queued = len(batch)
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                batch.append(self.serialize(logging.makeLogRecord({
+                    'name': 'cfme', 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': '%d log records dropped, artifactor is falling behind',
+                    'args': (dropped,)})))
+            try:
+                self.artifactor.fire_hook('log_messages', log_records=batch, slaveid=self.slaveid)
+            except Exception:
+                pass
+            finally:
+                for _ in range(queued):
+                    self._queue.task_done()
 
 
 logger, cfme_file_handler = setup_logger(logging.getLogger('cfme'))
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Records how long UI navigation steps take
+
+Every :py:class:`cfme.utils.appliance.implementations.ui.CFMENavigateStep` that runs stores its
+timing in a sqlite database, ``log/navigation_timing.sqlite`` by default. The timings are kept in
+memory and written in one go at exit, so the parallel slaves sharing the file don't wait for each
+other on every step. The database is kept across test runs, so it shows which destinations our
+UI tests spend the most time getting to::
+
+    python -m cfme.utils.navigation_timing --limit 20 --order-by total
+
+Each record has the total duration of the step and the part of it spent on its prerequisites,
+so the destinations that are slow on their own can be told apart from those that are just deep.
+"""
+import sqlite3
+import threading
+import time
+
+from cfme.utils import at_exit
+from cfme.utils.path import log_path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS navigations (
+    timestamp REAL,
+    destination TEXT,
+    duration INTEGER,
+    prerequisite_duration INTEGER,
+    already_here INTEGER,
+    via_url INTEGER,
+    forced INTEGER
+)
+"""
+
+#: What :py:meth:`NavigationTimings.slowest` can order the destinations by
+ORDER_BY = ('total', 'average', 'own_average', 'maximum')
+
+#: How many records :py:meth:`NavigationTimings.record` keeps in memory before writing them
+MAX_BUFFERED = 1000
+
+
+class NavigationTimings(object):
+    """A sqlite store of navigation step timings
+
+    Args:
+        path: The database file, ``log/navigation_timing.sqlite`` by default
+    """
+    def __init__(self, path=None):
+        self.path = path or log_path.join('navigation_timing.sqlite').strpath
+        self._connection = None
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._flush_at_exit = False
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            # Parallel slaves share the file, wait for each other's writes instead of failing
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._connection.execute(SCHEMA)
+        return self._connection
+
+    def record(self, destination, duration, prerequisite_duration=0, already_here=False,
+               via_url=False, forced=False):
+        """Stores the timing of one navigation step
+
+        Args:
+            destination: The name of the destination, like ``Host/Details``
+            duration: How many milliseconds the whole step took
+            prerequisite_duration: How many of those milliseconds its prerequisites took
+            already_here: Whether the browser already was on the destination
+            via_url: Whether the destination was loaded by its URL
+            forced: Whether the navigation was forced
+
+        The record is only written to the database by :py:meth:`flush`, which runs at exit or
+        once :py:data:`MAX_BUFFERED` records pile up.
+        """
+        with self._lock:
+            self._buffer.append(
+                (time.time(), destination, duration, prerequisite_duration, already_here,
+                 via_url, forced))
+            if not self._flush_at_exit:
+                self._flush_at_exit = True
+                at_exit(self.flush)
+            full = len(self._buffer) >= MAX_BUFFERED
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered records to the database in a single transaction"""
+        with self._lock:
+            records, self._buffer = self._buffer, []
+            if records:
+                with self.connection:
+                    self.connection.executemany(
+                        'INSERT INTO navigations VALUES (?, ?, ?, ?, ?, ?, ?)', records)
+
+    def slowest(self, limit=20, order_by='total', since=None):
+        """Returns the destinations that took the most time
+
+        Args:
+            limit: How many destinations to return
+            order_by: One of :py:data:`ORDER_BY`, ``own_average`` is the average time without
+                the prerequisites
+            since: Only consider navigations after this unix timestamp
+
+        Returns:
+            A list of dicts with the ``destination``, ``count``, ``total``, ``average``,
+            ``own_average``, ``maximum`` and ``via_url`` (count) keys, times are in milliseconds
+        """
+        if order_by not in ORDER_BY:
+            raise ValueError('order_by must be one of {}'.format(', '.join(ORDER_BY)))
+        query = """
+            SELECT destination, count(*), sum(duration) AS total, avg(duration) AS average,
+                   avg(duration - prerequisite_duration) AS own_average,
+                   max(duration) AS maximum, sum(via_url)
+            FROM navigations WHERE timestamp >= ?
+            GROUP BY destination ORDER BY {} DESC LIMIT ?
+        """.format(order_by)
+        self.flush()
+        with self._lock:
+            rows = self.connection.execute(query, (since or 0, limit)).fetchall()
+        keys = ('destination', 'count', 'total', 'average', 'own_average', 'maximum', 'via_url')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def close(self):
+        self.flush()
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+navigation_timings = NavigationTimings()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Show the slowest UI navigation destinations')
+    parser.add_argument('--limit', type=int, default=20, help='How many destinations to show')
+    parser.add_argument('--order-by', choices=ORDER_BY, default='total',
+                        help='What to sort the destinations by')
+    parser.add_argument('--days', type=float, help='Only consider the last few days')
+    parser.add_argument('--database', help='The database file, log/navigation_timing.sqlite')
+    args = parser.parse_args()
+
+    since = time.time() - args.days * 86400 if args.days else None
+    rows = NavigationTimings(args.database).slowest(args.limit, args.order_by, since)
+    print('{:<60} {:>7} {:>10} {:>9} {:>9} {:>9} {:>7}'.format(
+        'destination', 'count', 'total [s]', 'avg [ms]', 'own [ms]', 'max [ms]', 'via url'))
+    for row in rows:
+        print('{destination:<60} {count:>7} {total_s:>10.1f} {average:>9.0f} {own_average:>9.0f} '
+              '{maximum:>9} {via_url:>7}'.format(total_s=row['total'] / 1000.0, **row))
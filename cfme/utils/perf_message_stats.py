@@ -3,6 +3,7 @@
 appliance.
 """
 import csv
+import multiprocessing
 import os
 import re
 import subprocess
@@ -60,84 +61,139 @@ miq_top = re.compile(r'([0-9]+)\s+[0-9]+\s+[A-Za-z0-9]+\s+[0-9]+\s+[0-9\-]+\s+([
     r'([0-9\.mg]+)\s+([0-9\.mg]+)\s+[SRDZ]\s+([0-9\.]+)\s+([0-9\.]+)')
 
 
+# Cheap substring checks done on every evm.log line before running any of the regexes above
+# MIQ(MiqQueue.put), MIQ(MiqQueue.get_via_drb), MIQ(MiqQueue.delivered)
+queue_marker = b'MIQ(MiqQueue.'
+# Same lines as: grep 'Interrupt\|MIQ([A-Za-z]*) ID\|"evm_worker_uptime_exceeded\|...'
+worker_markers = (b'Interrupt', b'"evm_worker_uptime_exceeded', b'"evm_worker_memory_exceeded',
+    b'"evm_worker_stop', b'Worker exiting.')
+worker_id_marker = b') ID'
+miqwkr_line = re.compile(r'MIQ\([A-Za-z]*\) ID')
+
+# Size of the pieces of evm.log handed to each process of the pool
+evm_chunk_size = 64 * 1024 * 1024
+
+
 def evm_to_messages(evm_file, filters):
+    return evm_to_messages_and_workers(evm_file, filters)[0]
+
+
+def evm_to_workers(evm_file):
+    return evm_to_messages_and_workers(evm_file, {})[1]
+
+
+def evm_to_messages_and_workers(evm_file, filters, processes=None):
+    """Parses the queue messages and the workers out of an evm.log in a single pass
+
+    The log is split into chunks that are scanned by a pool of ``processes`` processes (as many
+    as there are CPUs by default). Each chunk yields the few lines the analysis cares about as
+    small tuples, which are then replayed in log order.
+
+    Returns:
+        A tuple of ``(messages, msg_cmds, test_start, test_end, line_count)`` and
+        ``(workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, worker_line_count)``
+    """
+    chunks = evm_chunks(evm_file, evm_chunk_size)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(chunks))
+
+    runningtime = time()
+    if processes > 1:
+        pool = multiprocessing.Pool(processes)
+        try:
+            parsed_chunks = pool.map(parse_evm_chunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        parsed_chunks = map(parse_evm_chunk, chunks)
+
     test_start = ''
     test_end = ''
     line_count = 0
     messages = {}
     msg_cmds = {}
 
-    runningtime = time()
-    evmlogfile = open(evm_file, 'r')
-    evm_log_line = evmlogfile.readline()
-    while evm_log_line:
-        line_count += 1
-        evm_log_line = evm_log_line.strip()
-
-        miqmsg_result = miqmsg.search(evm_log_line)
-        if miqmsg_result:
-
-            # Obtains the first timestamp in the log file
-            if test_start == '':
-                ts, pid = get_msg_timestamp_pid(evm_log_line)
-                test_start = ts
-
-            # A message was first put on the queue, this starts its queuing time
-            if (miqmsg_result.group(1) == 'MiqQueue.put'):
-
-                msg_cmd = get_msg_cmd(evm_log_line)
-                msg_id = get_msg_id(evm_log_line)
-                if msg_id:
-                    ts, pid = get_msg_timestamp_pid(evm_log_line)
+    workers = {}
+    wkr_upt_exc = 0
+    wkr_mem_exc = 0
+    wkr_stp = 0
+    wkr_int = 0
+    wkr_ext = 0
+    wkr_lc = 0
+
+    for chunk_line_count, first_ts, msg_events, wkr_events in parsed_chunks:
+        if test_start == '' and first_ts:
+            test_start = first_ts
+
+        for event in msg_events:
+            kind, line_no, msg_id = event[:3]
+            line_no += line_count
+            if not msg_id:
+                logger.error('Could not obtain message id, line #: %s', line_no)
+            elif kind == 'put':
+                msg_cmd, msg_args, ts, pid = event[3:]
+                test_end = ts
+                msg = messages[msg_id] = MiqMsgStat()
+                msg.msg_id = '\'' + msg_id + '\''
+                msg.msg_cmd = msg_cmd
+                msg.pid_put = pid
+                msg.puttime = ts
+                if msg_args is False:
+                    logger.debug('Could not obtain message args line #: %s', line_no)
+                else:
+                    msg.msg_args = msg_args
+            elif kind == 'get':
+                ts, pid, deq_time = event[3:]
+                if msg_id in messages:
                     test_end = ts
-                    messages[msg_id] = MiqMsgStat()
-                    messages[msg_id].msg_id = msg_id
-                    messages[msg_id].msg_id = '\'' + msg_id + '\''
-                    messages[msg_id].msg_cmd = msg_cmd
-                    messages[msg_id].pid_put = pid
-                    messages[msg_id].puttime = ts
-                    msg_args = get_msg_args(evm_log_line)
-                    if msg_args is False:
-                        logger.debug('Could not obtain message args line #: %s', line_count)
-                    else:
-                        messages[msg_id].msg_args = msg_args
+                    messages[msg_id].pid_get = pid
+                    messages[msg_id].gettime = ts
+                    messages[msg_id].deq_time = deq_time
                 else:
-                    logger.error('Could not obtain message id, line #: %s', line_count)
-
-            elif (miqmsg_result.group(1) == 'MiqQueue.get_via_drb'):
-                msg_id = get_msg_id(evm_log_line)
-                if msg_id:
-                    if msg_id in messages:
-                        ts, pid = get_msg_timestamp_pid(evm_log_line)
-                        test_end = ts
-                        messages[msg_id].pid_get = pid
-                        messages[msg_id].gettime = ts
-                        messages[msg_id].deq_time = get_msg_deq(evm_log_line)
-                    else:
-                        logger.error('Message ID not in dictionary: %s', msg_id)
+                    logger.error('Message ID not in dictionary: %s', msg_id)
+            elif kind == 'delivered':
+                ts, del_time = event[3:]
+                test_end = ts
+                if msg_id in messages:
+                    messages[msg_id].del_time = del_time
+                    messages[msg_id].total_time = messages[msg_id].deq_time + del_time
                 else:
-                    logger.error('Could not obtain message id, line #: %s', line_count)
-
-            elif (miqmsg_result.group(1) == 'MiqQueue.delivered'):
-                msg_id = get_msg_id(evm_log_line)
-                if msg_id:
-                    ts, pid = get_msg_timestamp_pid(evm_log_line)
-                    test_end = ts
-                    if msg_id in messages:
-                        messages[msg_id].del_time = get_msg_del(evm_log_line)
-                        messages[msg_id].total_time = messages[msg_id].deq_time + \
-                            messages[msg_id].del_time
+                    logger.error('Message ID not in dictionary: %s', msg_id)
+
+        for kind, ts, workerid, detail in wkr_events:
+            wkr_lc += 1
+            if kind == 'started':
+                if workerid not in workers:
+                    worker_type, pid = detail
+                    workers[workerid] = MiqWorker()
+                    workers[workerid].worker_type = worker_type
+                    workers[workerid].pid = pid
+                    workers[workerid].worker_id = workerid
+                    workers[workerid].start_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
+            elif kind == 'Interrupted':
+                for workerid in workers:
+                    if not workers[workerid].end_ts:
+                        wkr_int += 1
+                        workers[workerid].terminated = 'Interrupted'
+                        workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
+            elif workerid is not None and workerid in workers:
+                if not workers[workerid].terminated:
+                    if kind == 'evm_worker_uptime_exceeded':
+                        wkr_upt_exc += 1
+                    elif kind == 'evm_worker_memory_exceeded':
+                        wkr_mem_exc += 1
+                    elif kind == 'evm_worker_stop':
+                        wkr_stp += 1
                     else:
-                        logger.error('Message ID not in dictionary: %s', msg_id)
-                else:
-                    logger.error('Could not obtain message id, line #: %s', line_count)
+                        wkr_ext += 1
+                    workers[workerid].terminated = kind
+                    workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
 
-        if (line_count % 100000) == 0:
-            timediff = time() - runningtime
-            runningtime = time()
-            logger.info('Count {} : Parsed 100000 lines in %s', line_count, timediff)
+        line_count += chunk_line_count
 
-        evm_log_line = evmlogfile.readline()
+    logger.info('Parsed %s lines in %s', line_count, time() - runningtime)
 
     # I tried to avoid two loops but this reduced the complexity of filtering on messages.
     # By filtering over messages, we can better display what is occuring under the covers, as a
@@ -161,81 +217,103 @@ def evm_to_messages(evm_file, filters):
             msg_cmds[msg_cmd]['queue'].append(round(messages[msg].deq_time, 2))
             msg_cmds[msg_cmd]['execute'].append(round(messages[msg].del_time, 2))
 
-    return messages, msg_cmds, test_start, test_end, line_count
+    return ((messages, msg_cmds, test_start, test_end, line_count),
+        (workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, wkr_lc))
 
 
-def evm_to_workers(evm_file):
-    # Use grep to reduce # of lines to sort through
-    p = subprocess.Popen(['grep', 'Interrupt\\|MIQ([A-Za-z]*) ID\\|"evm_worker_uptime_exceeded\\|'
-            '"evm_worker_memory_exceeded\\|"evm_worker_stop\\|Worker exiting.', evm_file],
-            stdout=subprocess.PIPE)
-    greppedevmlog, err = p.communicate()
-    greppedevmlog = greppedevmlog.strip()
+def evm_chunks(evm_file, chunk_size):
+    """Splits a file into ``(evm_file, start, end)`` byte ranges of about ``chunk_size``"""
+    file_size = os.path.getsize(evm_file)
+    return [(evm_file, start, min(start + chunk_size, file_size))
+        for start in range(0, max(file_size, 1), chunk_size)]
 
-    evmlines = greppedevmlog.split('\n')
 
-    workers = {}
-    wkr_upt_exc = 0
-    wkr_mem_exc = 0
-    wkr_stp = 0
-    wkr_int = 0
-    wkr_ext = 0
-    for evm_log_line in evmlines:
-        ts, pid = get_msg_timestamp_pid(evm_log_line)
-
-        miqwkr_result = miqwkr.search(evm_log_line)
-        if miqwkr_result:
-            workerid = int(miqwkr_result.group(2))
-            if workerid not in workers:
-                workers[workerid] = MiqWorker()
-                workers[workerid].worker_type = miqwkr_result.group(1)
-                workers[workerid].pid = miqwkr_result.group(3)
-                workers[workerid].worker_id = int(workerid)
-                workers[workerid].start_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'evm_worker_uptime_exceeded' in evm_log_line:
-            miqwkr_id_result = miqwkr_id.search(evm_log_line)
-            if miqwkr_id_result:
-                workerid = int(miqwkr_id_result.group(1))
-                if workerid in workers:
-                    if not workers[workerid].terminated:
-                        wkr_upt_exc += 1
-                        workers[workerid].terminated = 'evm_worker_uptime_exceeded'
-                        workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'evm_worker_memory_exceeded' in evm_log_line:
-            miqwkr_id_result = miqwkr_id.search(evm_log_line)
-            if miqwkr_id_result:
-                workerid = int(miqwkr_id_result.group(1))
-                if workerid in workers:
-                    if not workers[workerid].terminated:
-                        wkr_mem_exc += 1
-                        workers[workerid].terminated = 'evm_worker_memory_exceeded'
-                        workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'evm_worker_stop' in evm_log_line:
-            miqwkr_id_result = miqwkr_id.search(evm_log_line)
-            if miqwkr_id_result:
-                workerid = int(miqwkr_id_result.group(1))
-                if workerid in workers:
-                    if not workers[workerid].terminated:
-                        wkr_stp += 1
-                        workers[workerid].terminated = 'evm_worker_stop'
-                        workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'Interrupt' in evm_log_line:
-            for workerid in workers:
-                if not workers[workerid].end_ts:
-                    wkr_int += 1
-                    workers[workerid].terminated = 'Interrupted'
-                    workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'Worker exiting.' in evm_log_line:
-            miqwkr_id_2_result = miqwkr_id_2.search(evm_log_line)
-            if miqwkr_id_2_result:
-                workerid = int(miqwkr_id_2_result.group(1))
-                if workerid in workers:
-                    if not workers[workerid].terminated:
-                        wkr_ext += 1
-                        workers[workerid].terminated = 'Worker Exited'
-                        workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
+def parse_evm_chunk(chunk):
+    """Scans the lines starting within the ``(evm_file, start, end)`` byte range of an evm.log
+
+    Only the lines passing a substring check are decoded and run through the regexes.
 
-    return workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, len(evmlines)
+    Returns:
+        A tuple of ``(line_count, first_ts, msg_events, wkr_events)``, where ``first_ts`` is the
+        timestamp of the first MIQ line, ``msg_events`` are ``(kind, line #, msg_id, ...)`` and
+        ``wkr_events`` are ``(kind, timestamp, worker id, detail)`` tuples, in log order
+    """
+    evm_file, start, end = chunk
+    line_count = 0
+    first_ts = ''
+    msg_events = []
+    wkr_events = []
+    with open(evm_file, 'rb') as evmlogfile:
+        if start:
+            # a line starting right at ``start`` is ours, one running across it is the previous
+            # chunk's
+            evmlogfile.seek(start - 1)
+            evmlogfile.readline()
+        position = evmlogfile.tell()
+        while position < end:
+            raw_line = evmlogfile.readline()
+            if not raw_line:
+                break
+            position += len(raw_line)
+            line_count += 1
+
+            is_queue_line = queue_marker in raw_line
+            is_worker_line = any(marker in raw_line for marker in worker_markers)
+            if not is_worker_line and worker_id_marker in raw_line:
+                is_worker_line = bool(miqwkr_line.search(raw_line.decode('utf-8', 'replace')))
+            if not (is_queue_line or is_worker_line or (not first_ts and b'MIQ(' in raw_line)):
+                continue
+            evm_log_line = raw_line.decode('utf-8', 'replace').strip()
+
+            miqmsg_result = miqmsg.search(evm_log_line)
+            if miqmsg_result:
+                # Obtains the first timestamp in the chunk
+                if not first_ts:
+                    first_ts = get_msg_timestamp_pid(evm_log_line)[0]
+
+                msg_kind = miqmsg_result.group(1)
+                if msg_kind == 'MiqQueue.put':
+                    ts, pid = get_msg_timestamp_pid(evm_log_line)
+                    msg_events.append(('put', line_count, get_msg_id(evm_log_line),
+                        get_msg_cmd(evm_log_line), get_msg_args(evm_log_line), ts, pid))
+                elif msg_kind == 'MiqQueue.get_via_drb':
+                    ts, pid = get_msg_timestamp_pid(evm_log_line)
+                    msg_events.append(('get', line_count, get_msg_id(evm_log_line), ts, pid,
+                        get_msg_deq(evm_log_line)))
+                elif msg_kind == 'MiqQueue.delivered':
+                    ts, pid = get_msg_timestamp_pid(evm_log_line)
+                    msg_events.append(('delivered', line_count, get_msg_id(evm_log_line), ts,
+                        get_msg_del(evm_log_line)))
+
+            if is_worker_line:
+                wkr_event = get_worker_event(evm_log_line)
+                if wkr_event:
+                    wkr_events.append(wkr_event)
+
+    return line_count, first_ts, msg_events, wkr_events
+
+
+def get_worker_event(log_line):
+    """Turns a worker related evm.log line into a ``(kind, timestamp, worker id, detail)`` tuple"""
+    ts, pid = get_msg_timestamp_pid(log_line)
+
+    miqwkr_result = miqwkr.search(log_line)
+    if miqwkr_result:
+        return ('started', ts, int(miqwkr_result.group(2)),
+            (miqwkr_result.group(1), miqwkr_result.group(3)))
+    for kind in ('evm_worker_uptime_exceeded', 'evm_worker_memory_exceeded', 'evm_worker_stop'):
+        if kind in log_line:
+            miqwkr_id_result = miqwkr_id.search(log_line)
+            if miqwkr_id_result:
+                return kind, ts, int(miqwkr_id_result.group(1)), None
+            return None
+    if 'Interrupt' in log_line:
+        return 'Interrupted', ts, None, None
+    if 'Worker exiting.' in log_line:
+        miqwkr_id_2_result = miqwkr_id_2.search(log_line)
+        if miqwkr_id_2_result:
+            return 'Worker Exited', ts, int(miqwkr_id_2_result.group(1)), None
+    return None
 
 
 def split_appliance_charts(top_appliance, charts_dir):
@@ -812,22 +890,18 @@ def perf_process_evm(evm_file, top_file):
     starttime = time()
     initialtime = starttime
 
-    logger.info('----------- Parsing evm log file for messages -----------')
-    messages, msg_cmds, test_start, test_end, msg_lc = evm_to_messages(evm_file, msg_filters)
+    logger.info('----------- Parsing evm log file for messages and workers -----------')
+    evm_messages, evm_workers = evm_to_messages_and_workers(evm_file, msg_filters)
+    messages, msg_cmds, test_start, test_end, msg_lc = evm_messages
+    workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, wkr_lc = evm_workers
     timediff = time() - starttime
     logger.info('----------- Completed Parsing evm log file -----------')
-    logger.info('Parsed %s lines of evm log file for messages in %s', msg_lc, timediff)
+    logger.info('Parsed %s lines of evm log file in %s', msg_lc, timediff)
     logger.info('Total # of Messages: %d', len(messages))
     logger.info('Total # of Commands: %d', len(msg_cmds))
     logger.info('Start Time: %s', test_start)
     logger.info('End Time: %s', test_end)
 
-    logger.info('----------- Parsing evm log file for workers -----------')
-    starttime = time()
-    workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, wkr_lc = evm_to_workers(evm_file)
-    timediff = time() - starttime
-    logger.info('----------- Completed Parsing evm log for workers -----------')
-    logger.info('Parsed %s lines of evm log file for workers in %s', wkr_lc, timediff)
     logger.info('Total # of Workers: %d', len(workers))
     logger.info('# Workers Memory Exceeded: %s', wkr_mem_exc)
     logger.info('# Workers Uptime Exceeded: %s', wkr_upt_exc)
@@ -1033,10 +1107,12 @@ def perf_process_evm(evm_file, top_file):
 
 
 class MiqMsgStat(object):
+    # A 24h workload log holds millions of these, keep them small
+    headers = ['msg_id', 'msg_cmd', 'msg_args', 'pid_put', 'pid_get', 'puttime', 'gettime',
+        'deq_time', 'del_time', 'total_time']
+    __slots__ = headers
 
     def __init__(self):
-        self.headers = ['msg_id', 'msg_cmd', 'msg_args', 'pid_put', 'pid_get', 'puttime', 'gettime',
-            'deq_time', 'del_time', 'total_time']
         self.msg_id = ''
         self.msg_cmd = ''
         self.msg_args = ''
@@ -1070,9 +1146,11 @@ class MiqMsgLists(object):
 
 
 class MiqMsgBucket(object):
+    headers = ['date', 'hour', 'total_put', 'total_get', 'sum_deq', 'min_deq', 'max_deq',
+        'avg_deq', 'sum_del', 'min_del', 'max_del', 'avg_del']
+    __slots__ = headers
+
     def __init__(self):
-        self.headers = ['date', 'hour', 'total_put', 'total_get', 'sum_deq', 'min_deq', 'max_deq',
-            'avg_deq', 'sum_del', 'min_del', 'max_del', 'avg_del']
         self.date = ''
         self.hour = ''
         self.total_put = 0
@@ -1098,9 +1176,10 @@ class MiqMsgBucket(object):
 
 
 class MiqWorker(object):
+    headers = ['worker_id', 'worker_type', 'pid', 'start_ts', 'end_ts', 'terminated']
+    __slots__ = headers
 
     def __init__(self):
-        self.headers = ['worker_id', 'worker_type', 'pid', 'start_ts', 'end_ts', 'terminated']
         self.worker_id = 0
         self.worker_type = ''
         self.pid = ''
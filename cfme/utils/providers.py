@@ -20,7 +20,28 @@ from cfme.exceptions import UnknownProviderType
 from cfme.utils import conf
 from cfme.utils.log import logger
 
-providers_data = conf.cfme_data.get("management_systems", {})
+
+class ProvidersData(Mapping):
+    """ The ``management_systems`` of cfme_data, looked up when used rather than at import
+
+    Importing this module doesn't load the yamls; listing providers only reads
+    :py:func:`conf.snapshot() <cfme.test_framework.config.Configuration.snapshot>`.
+    """
+    @property
+    def _data(self):
+        return conf.cfme_data.get("management_systems", {})
+
+    def __getitem__(self, provider_key):
+        return self._data[provider_key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+
+providers_data = ProvidersData()
 # Dict of active provider filters {name: ProviderFilter}
 global_filters = {}
 
@@ -44,6 +65,16 @@ def load_setuptools_entrypoints():
                 "Plugin {} could not be loaded: {}!".format(ep.name, e))
 
 
+def _freeze(value):
+    """Turns the (nested) lists and dicts of filter arguments into hashable tuples"""
+    if isinstance(value, Mapping):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        frozen = tuple(_freeze(item) for item in value)
+        return tuple(sorted(frozen, key=repr)) if isinstance(value, (set, frozenset)) else frozen
+    return value
+
+
 class ProviderFilter(object):
     """ Filter used to obtain only providers matching given requirements
 
@@ -57,6 +88,8 @@ class ProviderFilter(object):
         inverted: Inclusive if `False`, exclusive otherwise
         conjunctive: If true, all subfilters are applied and all must match (default)
                      If false (disjunctive), at least one of the subfilters must match
+
+    Filters with the same arguments are equal and hash the same, so they can be used as cache keys.
     """
     _version_operator_map = OrderedDict([('>=', operator.ge),
                                         ('<=', operator.le),
@@ -187,6 +220,62 @@ class ProviderFilter(object):
                     raise Exception('Operator not found in {}'.format(restriction))
         return None
 
+    def _indexed_keys(self, snapshot):
+        """ Looks the keys, classes and tags up in the snapshot indexes
+
+        Returns:
+            A list of sets of the provider keys passing each of these subfilters that is set
+        """
+        indexed = []
+        if self.keys is not None:
+            indexed.append(set(self.keys))
+        if self.classes is not None:
+            indexed.append({
+                key
+                for prov_type, keys in snapshot.providers_by_type.items()
+                if self._type_is_one_of_classes(prov_type)
+                for key in keys})
+        if self.required_tags is not None:
+            indexed.append({
+                key
+                for tag in self.required_tags
+                for key in snapshot.providers_by_tag.get(tag, ())})
+        return indexed
+
+    def _type_is_one_of_classes(self, prov_type):
+        try:
+            prov_class = get_class_from_type(prov_type)
+        except UnknownProviderType:
+            # keep it, building the crud object reports the unknown type
+            return True
+        return issubclass(prov_class, tuple(self.classes))
+
+    def candidate_keys(self, snapshot):
+        """ Returns the keys of the providers this filter may let through
+
+        Only the snapshot indexes are used, no crud objects are built.
+
+        Args:
+            snapshot: :py:class:`cfme.test_framework.config.ConfigSnapshot` of the configuration
+
+        Returns:
+            A set of provider keys, or `None` if the filter can't be narrowed down this way.
+        """
+        indexed = self._indexed_keys(snapshot)
+        if not indexed:
+            return None
+        if self.conjunctive and not self.inverted:
+            # each of the indexed subfilters has to pass, whatever the rest says
+            return set.intersection(*indexed)
+        unindexed = (self.required_fields, self.required_flags)
+        if self.restrict_version or any(arg is not None for arg in unindexed):
+            return None
+        # only indexed subfilters are set, so the result is exact
+        matching = set.intersection(*indexed) if self.conjunctive else set.union(*indexed)
+        if self.inverted:
+            return set(snapshot.provider_keys) - matching
+        return matching
+
     def __call__(self, provider):
         """ Applies this filter on a given provider
 
@@ -230,6 +319,24 @@ class ProviderFilter(object):
     def copy(self):
         return copy(self)
 
+    @property
+    def _key(self):
+        return (type(self), _freeze(self.keys), _freeze(self.classes),
+                _freeze(self.required_fields), _freeze(self.required_tags),
+                _freeze(self.required_flags), self.restrict_version, self.inverted,
+                self.conjunctive)
+
+    def __eq__(self, other):
+        if not isinstance(other, ProviderFilter):
+            return NotImplemented
+        return self._key == other._key
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._key)
+
 
 # Only providers without the 'disabled' tag
 global_filters['enabled_only'] = ProviderFilter(required_tags=['disabled'], inverted=True)
@@ -255,12 +362,31 @@ def list_providers(filters=None, use_global_filters=True):
     filters = filters or []
     if use_global_filters:
         filters = filters + list(global_filters.values())
-    providers = [get_crud(prov_key) for prov_key in providers_data]
+    providers = [get_crud(prov_key) for prov_key in candidate_provider_keys(filters)]
     for prov_filter in filters:
         providers = list(filter(prov_filter, providers))
     return providers
 
 
+def candidate_provider_keys(filters):
+    """ Lists the keys of the providers the filters don't rule out by their yaml data alone
+
+    Args:
+        filters: List of :py:class:`ProviderFilter`
+
+    Note: Doesn't require the framework to be pointed at an appliance to succeed.
+
+    Returns: List of provider keys (strings), in the yaml order.
+    """
+    snapshot = conf.snapshot()
+    keys = set(snapshot.provider_keys)
+    for prov_filter in filters:
+        filter_keys = prov_filter.candidate_keys(snapshot)
+        if filter_keys is not None:
+            keys &= filter_keys
+    return [prov_key for prov_key in snapshot.provider_keys if prov_key in keys]
+
+
 def list_providers_by_class(prov_class, use_global_filters=True):
     """ Lists provider crud objects of a specific class (or its subclasses), global filter optional
 
@@ -288,19 +414,11 @@ def list_provider_keys(provider_type=None):
 
     Returns: List of provider keys (strings).
     """
-    try:
-        all_keys = conf.cfme_data.management_systems.keys()
-    except:
-        all_keys = []
-
+    snapshot = conf.snapshot()
     if provider_type:
-        filtered_keys = []
-        for key in all_keys:
-            if conf.cfme_data.management_systems[key].type == provider_type:
-                filtered_keys.append(key)
-        return filtered_keys
+        return list(snapshot.providers_by_type.get(provider_type, ()))
     else:
-        return all_keys
+        return list(snapshot.provider_keys)
 
 
 def get_class_from_type(prov_type):
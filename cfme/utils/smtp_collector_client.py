@@ -17,7 +17,17 @@ class SMTPCollectorClient(object):
         self._port = port
 
     def _query(self, method, path, **params):
-        return method("http://{}:{}/{}".format(self._host, self._port, path), params=params)
+        timeout = params.pop('_timeout', None)
+        return method(
+            "http://{}:{}/{}".format(self._host, self._port, path), params=params,
+            timeout=timeout)
+
+    @staticmethod
+    def _convert_times(filter):
+        for key in ("time_from", "time_to"):
+            if isinstance(filter.get(key), parsetime):
+                filter[key] = filter[key].to_request_format()
+        return filter
 
     def clear_database(self):
         """Clear the database in collector
@@ -52,16 +62,31 @@ class SMTPCollectorClient(object):
             time_to: E-mail arrived before this time.
             text: Text matches exactly.
             text_like: Text is LIKE.
+            text_match: Full text search in the text, see SQLite's FTS MATCH syntax.
+            since_id: Only e-mails that arrived after the one with this ``id``.
 
         Returns: List of dicts with e-mails matching the criteria.
         """
-        if filter.get("time_from") is not None:
-            if isinstance(filter["time_from"], parsetime):
-                filter["time_from"] = filter["time_from"].to_request_format()
-        if filter.get("time_to") is not None:
-            if isinstance(filter["time_to"], parsetime):
-                filter["time_to"] = filter["time_to"].to_request_format()
-        return self._query(requests.get, "messages", **filter).json()
+        return self._query(requests.get, "messages", **self._convert_times(filter)).json()
+
+    def wait_for_emails(self, count=1, timeout=60, **filter):
+        """Wait until e-mails matching the criteria arrive.
+
+        The collector blocks the request until they do, so there is no need to poll
+        :py:meth:`get_emails` in a ``wait_for``.
+
+        Args:
+            count: How many matching e-mails to wait for.
+            timeout: How many seconds to wait at most.
+            **filter: Same as for :py:meth:`get_emails`. Use ``since_id`` with the ``id`` of the
+                last e-mail seen to wait only for new ones.
+
+        Returns: List of dicts with e-mails matching the criteria, fewer than ``count`` if the
+            timeout passed.
+        """
+        return self._query(
+            requests.get, "wait", count=count, timeout=timeout, _timeout=timeout + 30,
+            **self._convert_times(filter)).json()
 
     def get_html_report(self):
         return self._query(requests.get, "messages.html").text.strip()
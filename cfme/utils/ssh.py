@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
+import json
 import re
+import shlex
 import socket
 import sys
+import threading
 from os import path as os_path
 from subprocess import check_call
 
@@ -100,6 +103,189 @@ _ssh_pubkey_file = project_path.join('.generated_ssh_key.pub')
 _client_session = []
 
 
+class SSHTransportPool(object):
+    """Keeps one authenticated transport per host, port and credentials
+
+    :py:class:`SSHClient` instances connecting to the same place share the transport and only
+    open their own channels on it, so the ssh handshake happens once instead of once per client.
+    Transports that died are dropped and connected again by the next client needing them.
+    """
+    #: Seconds between keepalive packets sent over the pooled transports
+    keepalive = 30
+
+    def __init__(self):
+        self._transports = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(connect_kwargs):
+        """Returns the pool key for the connect kwargs, None if they can't be pooled"""
+        if connect_kwargs.get('pkey') is not None or connect_kwargs.get('sock') is not None:
+            return None
+        return tuple(
+            connect_kwargs.get(kwarg)
+            for kwarg in ('hostname', 'port', 'username', 'password', 'key_filename'))
+
+    def get(self, key):
+        """Returns the live transport for the key, or None"""
+        with self._lock:
+            transport = self._transports.get(key)
+            if transport is not None and not transport.is_active():
+                del self._transports[key]
+                transport = None
+        return transport
+
+    def add(self, key, transport):
+        """Puts a transport into the pool and returns the one clients should use
+
+        That is the already pooled one if another client connected in the meantime.
+        """
+        with self._lock:
+            pooled = self._transports.get(key)
+            if pooled is not None and pooled.is_active():
+                transport.close()
+                return pooled
+            transport.set_keepalive(self.keepalive)
+            self._transports[key] = transport
+            return transport
+
+    def discard(self, key, transport):
+        """Drops a transport which doesn't work anymore"""
+        with self._lock:
+            if self._transports.get(key) is transport:
+                del self._transports[key]
+        with diaper:
+            transport.close()
+
+    def close(self):
+        """Closes all the pooled transports"""
+        with self._lock:
+            transports = list(self._transports.values())
+            self._transports.clear()
+        for transport in transports:
+            with diaper:
+                transport.close()
+
+
+transport_pool = SSHTransportPool()
+
+
+RAILS_DAEMON_SCRIPT = """\
+require 'json'
+require 'stringio'
+
+real_stdout = $stdout
+real_stdout.sync = true
+real_stdout.puts 'CFME_RAILS_DAEMON_READY'
+$stdin.each_line do |line|
+  code = JSON.parse(line)['code']
+  output = StringIO.new
+  rc = 0
+  $stdout = $stderr = output
+  begin
+    ActiveRecord::Base.connection.reconnect! unless ActiveRecord::Base.connection.active?
+    if File.exist?(code)
+      load(code)
+    else
+      eval(code, Object.new.instance_eval { binding })
+    end
+  rescue SystemExit => e
+    rc = e.status
+  rescue Exception => e
+    output.puts("#{e.class}: #{e.message}", *e.backtrace)
+    rc = 1
+  ensure
+    $stdout = real_stdout
+    $stderr = STDERR
+    ActiveRecord::Base.clear_active_connections!
+  end
+  real_stdout.puts('CFME_RAILS_DAEMON_RESULT ' + {:rc => rc, :output => output.string}.to_json)
+end
+"""
+
+
+class RailsDaemon(object):
+    """A long lived ``rails runner`` on the appliance evaluating the ruby code sent to it
+
+    Rails boots once when the daemon starts, after that every snippet is sent as a line of JSON
+    over the ssh channel and its output comes back as a line of JSON too, so running one takes
+    as long as the ruby code itself. Like ``rails runner``, the snippet can also be the path of
+    a ruby file on the appliance.
+
+    Args:
+        ssh_client: The :py:class:`SSHClient` to run the daemon over.
+        boot_timeout: How many seconds to wait for rails to boot.
+    """
+    script_path = '/tmp/cfme_rails_daemon.rb'
+    ready_line = 'CFME_RAILS_DAEMON_READY'
+    result_prefix = 'CFME_RAILS_DAEMON_RESULT '
+
+    def __init__(self, ssh_client, boot_timeout=600):
+        self.ssh_client = ssh_client
+        self.boot_timeout = boot_timeout
+        self._session = None
+        self._stdin = None
+        self._stdout = None
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self):
+        return self._session is not None and not self._session.exit_status_ready()
+
+    def start(self):
+        logger.info('Starting the rails daemon on %s', self.ssh_client._connect_kwargs['hostname'])
+        sftp = self.ssh_client.open_sftp()
+        try:
+            with sftp.open(self.script_path, 'w') as script:
+                script.write(RAILS_DAEMON_SCRIPT)
+        finally:
+            sftp.close()
+        self._session = self.ssh_client._open_session()
+        self._session.exec_command(
+            'cd /var/www/miq/vmdb; bin/rails runner {} 2>/dev/null'.format(self.script_path))
+        self._stdin = self._session.makefile('wb')
+        self._stdout = self._session.makefile('r')
+        self._session.settimeout(self.boot_timeout)
+        try:
+            self._read_until(lambda line: line == self.ready_line)
+        except Exception:
+            self.stop()
+            raise
+
+    def stop(self):
+        if self._session is not None:
+            with diaper:
+                self._session.close()
+        self._session = self._stdin = self._stdout = None
+
+    def _read_until(self, condition):
+        for line in self._stdout:
+            line = line.rstrip('\n')
+            if condition(line):
+                return line
+        raise EOFError('The rails daemon exited')
+
+    def run(self, code, timeout=RUNCMD_TIMEOUT):
+        """Evaluates the ruby code and returns a :py:class:`SSHResult`"""
+        with self._lock:
+            if not self.alive:
+                self.start()
+            try:
+                self._session.settimeout(float(timeout) if timeout else None)
+                self._stdin.write((json.dumps({'code': code}) + '\n').encode('utf-8'))
+                self._stdin.flush()
+                line = self._read_until(lambda line: line.startswith(self.result_prefix))
+            except Exception:
+                # the daemon is in an unknown state now, the next call starts a new one
+                logger.exception('Rails daemon failed to run %r', code)
+                self.stop()
+                raise
+        result = json.loads(line[len(self.result_prefix):])
+        if result['rc'] != 0:
+            logger.warning('Exit code %d!', result['rc'])
+        return SSHResult(command=code, rc=result['rc'], output=result['output'])
+
+
 class SSHClient(paramiko.SSHClient):
     """paramiko.SSHClient wrapper
 
@@ -114,10 +300,19 @@ class SSHClient(paramiko.SSHClient):
             app and ``container`` then specifies the name of the pod to interact with.
         stdout: If specified, overrides the system stdout file for streaming output.
         stderr: If specified, overrides the system stderr file for streaming output.
+        pooled: Whether to share the transport with other clients connecting to the same host,
+            port and credentials using :py:data:`transport_pool`, defaults to True.
+        rails_daemon: Whether to run rails runner commands in a :py:class:`RailsDaemon` instead of
+            booting rails for each of them, defaults to ``ssh: rails_daemon`` in env.yaml.
     """
     def __init__(self, stream_output=False, **connect_kwargs):
         super(SSHClient, self).__init__()
         self._streaming = stream_output
+        self._pooled = connect_kwargs.pop('pooled', True)
+        self._shared_transport = False
+        self._use_rails_daemon = connect_kwargs.pop(
+            'rails_daemon', conf.env.get('ssh', {}).get('rails_daemon', False))
+        self._rails_daemon = None
         # deprecated/useless karg, included for backward-compat
         self._keystate = connect_kwargs.pop('keystate', None)
         # Container is used to store both docker VM's container name and Openshift pod name.
@@ -175,7 +370,8 @@ class SSHClient(paramiko.SSHClient):
     def __call__(self, **connect_kwargs):
         # Update a copy of this instance's connect kwargs with passed in kwargs,
         # then return a new instance with the updated kwargs
-        new_connect_kwargs = dict(self._connect_kwargs)
+        new_connect_kwargs = dict(
+            self._connect_kwargs, pooled=self._pooled, rails_daemon=self._use_rails_daemon)
         new_connect_kwargs.update(connect_kwargs)
         # pass the key state if the hostname is the same, under the assumption that the same
         # host will still have keys installed if they have already been
@@ -207,8 +403,30 @@ class SSHClient(paramiko.SSHClient):
     def close(self):
         with diaper:
             _client_session.remove(self)
+        if getattr(self, '_rails_daemon', None) is not None:
+            self._rails_daemon.stop()
+        if getattr(self, '_shared_transport', False):
+            if self._transport is not None and not self._transport.is_active():
+                # closed to recover from a dead transport, don't hand it out again
+                self._discard_transport()
+            else:
+                # other clients may still be using it, the pool closes it at the end of the session
+                self._transport = None
+                self._shared_transport = False
         super(SSHClient, self).close()
 
+    def _discard_transport(self):
+        """Drops the pooled transport, the clients sharing it reconnect when they next use it"""
+        transport_pool.discard(self._pool_key, self._transport)
+        self._transport = None
+        self._shared_transport = False
+
+    @property
+    def _pool_key(self):
+        if not self._pooled:
+            return None
+        return transport_pool.key(self._connect_kwargs)
+
     @property
     def connected(self):
         return self._transport and self._transport.active
@@ -221,13 +439,21 @@ class SSHClient(paramiko.SSHClient):
             self._connect_kwargs['hostname'] = hostname
             self.close()
 
+        conn = None
         if not self.connected:
             self._connect_kwargs.update(kwargs)
-            wait_for(self._check_port, timeout='2m', delay=5)
-            # Only install ssh keys if they aren't installed (or currently being installed)
-            conn = super(SSHClient, self).connect(**self._connect_kwargs)
-        else:
-            conn = None
+            pool_key = self._pool_key
+            pooled_transport = transport_pool.get(pool_key) if pool_key else None
+            if pooled_transport is not None:
+                self._transport = pooled_transport
+                self._shared_transport = True
+            else:
+                wait_for(self._check_port, timeout='2m', delay=5)
+                # Only install ssh keys if they aren't installed (or currently being installed)
+                conn = super(SSHClient, self).connect(**self._connect_kwargs)
+                if pool_key:
+                    self._transport = transport_pool.add(pool_key, self._transport)
+                    self._shared_transport = True
 
         self._after_connect()
         return conn
@@ -255,14 +481,38 @@ class SSHClient(paramiko.SSHClient):
         if self.is_container:
             logger.warning(
                 'You are about to use sftp on a containerized appliance. It may not work.')
-        self.connect()
-        return super(SSHClient, self).open_sftp(*args, **kwargs)
+        return self._on_live_transport(lambda transport: transport.open_sftp_client())
 
     def get_transport(self, *args, **kwargs):
         if not self.connected:
             self.connect()
         return super(SSHClient, self).get_transport(*args, **kwargs)
 
+    def _open_session(self):
+        return self._on_live_transport(lambda transport: transport.open_session())
+
+    def _scp(self, method, *args, **kwargs):
+        """Runs an :py:class:`SCPClient` ``put`` or ``get``, on a live transport"""
+        return self._on_live_transport(
+            lambda transport: getattr(
+                SCPClient(transport, progress=self._progress_callback), method)(*args, **kwargs))
+
+    def _on_live_transport(self, func):
+        """Calls ``func`` with the transport, reconnecting once if a pooled transport died"""
+        if not self.connected:
+            self.connect()
+        try:
+            return func(self._transport)
+        except (paramiko.SSHException, EOFError, socket.error):
+            if not self._shared_transport:
+                raise
+            # The pooled transport went away (eg. the appliance rebooted) without noticing yet
+            logger.info(
+                'Pooled ssh transport to %s died, reconnecting', self._connect_kwargs['hostname'])
+            self._discard_transport()
+            self.connect()
+            return func(self._transport)
+
     def run_command(self, command, timeout=RUNCMD_TIMEOUT, reraise=False, ensure_host=False,
                     ensure_user=False, container=None):
         """Run a command over SSH.
@@ -319,7 +569,7 @@ class SSHClient(paramiko.SSHClient):
 
         output = []
         try:
-            session = self.get_transport().open_session()
+            session = self._open_session()
             if uses_sudo:
                 # We need a pseudo-tty for sudo
                 session.get_pty()
@@ -397,6 +647,21 @@ class SSHClient(paramiko.SSHClient):
         # Return whatever we have in the output
         return SSHResult(rc=1, output=''.join(output), command=command)
 
+    def run_commands(self, commands, **kwargs):
+        """Run several commands over SSH at once, each on its own channel.
+
+        Args:
+            commands: The commands to run.
+            **kwargs: Passed to :py:meth:`run_command` for every command.
+        Returns:
+            A list of :py:class:`SSHResult` instances, in the order of the commands.
+        """
+        # connect before spawning so that the commands don't race for the transport
+        self.get_transport()
+        greenlets = [gevent.spawn(self.run_command, command, **kwargs) for command in commands]
+        gevent.joinall(greenlets, raise_error=True)
+        return [greenlet.value for greenlet in greenlets]
+
     def cpu_spike(self, seconds=60, cpus=2, **kwargs):
         """Creates a CPU spike of specific length and processes.
 
@@ -412,8 +677,34 @@ class SSHClient(paramiko.SSHClient):
             "for ((i=0; i<instances; i++)) do while (($(date +%s) < $endtime)); "
             "do :; done & done".format(seconds, cpus), **kwargs)
 
+    @property
+    def rails_daemon(self):
+        """The :py:class:`RailsDaemon` of this client, if it can use one"""
+        if not self._use_rails_daemon or self.username != 'root' or self._container:
+            return None
+        if self._rails_daemon is None:
+            self._rails_daemon = RailsDaemon(self)
+        return self._rails_daemon
+
+    def stop_rails_daemon(self):
+        """Stops the :py:class:`RailsDaemon` of this client, if it runs
+
+        The next rails command starts a new one, which boots with the current state of the
+        appliance instead of the settings and caches the old one loaded.
+        """
+        if self._rails_daemon is not None:
+            self._rails_daemon.stop()
+
     def run_rails_command(self, command, timeout=RUNCMD_TIMEOUT, **kwargs):
         logger.info("Running rails command %r", command)
+        if self.rails_daemon is not None and not kwargs:
+            # the command is a shell word for rails runner, the daemon needs the code itself
+            try:
+                code = shlex.split(command)
+            except ValueError:
+                code = None
+            if code and len(code) == 1:
+                return self.rails_daemon.run(code[0], timeout=timeout)
         return self.run_command('cd /var/www/miq/vmdb; bin/rails runner {command}'.format(
             command=command), timeout=timeout, **kwargs)
 
@@ -441,8 +732,7 @@ class SSHClient(paramiko.SSHClient):
         if self.is_container and not ensure_host:
             tempfilename = '/share/temp_{}'.format(fauxfactory.gen_alpha())
             logger.info('For this purpose, temporary file name is %r', tempfilename)
-            scp = SCPClient(self.get_transport(), progress=self._progress_callback).put(
-                local_file, tempfilename, **kwargs)
+            scp = self._scp('put', local_file, tempfilename, **kwargs)
             self.run_command('mv {} {}'.format(tempfilename, remote_file))
             return scp
         elif self.is_pod and not ensure_host:
@@ -456,8 +746,7 @@ class SSHClient(paramiko.SSHClient):
             # Now upload the file to the openshift host
             tmp_file_name = 'file-{}'.format(fauxfactory.gen_alpha().lower())
             tmp_full_name = '/tmp/{}/{}'.format(tmp_folder_name, tmp_file_name)
-            scp = SCPClient(self.get_transport(), progress=self._progress_callback).put(
-                local_file, tmp_full_name, **kwargs)
+            scp = self._scp('put', local_file, tmp_full_name, **kwargs)
             # use oc rsync to put the file in the container
             rsync_cmd = 'oc rsync --namespace={proj} /tmp/{file} {pod}:/tmp/'
             assert self.run_command(rsync_cmd.format(proj=self._project, file=tmp_folder_name,
@@ -468,14 +757,12 @@ class SSHClient(paramiko.SSHClient):
             return scp
         else:
             if self.username == 'root':
-                return SCPClient(self.get_transport(), progress=self._progress_callback).put(
-                    local_file, remote_file, **kwargs)
+                return self._scp('put', local_file, remote_file, **kwargs)
             # scp client is not sudo, may not work for non sudo
             tempfilename = '/home/{user_name}/temp_{random_alpha}'.format(
                 user_name=self.username, random_alpha=fauxfactory.gen_alpha())
             logger.info('For this purpose, temporary file name is %r', tempfilename)
-            scp = SCPClient(self.get_transport(), progress=self._progress_callback).put(
-                local_file, tempfilename, **kwargs)
+            scp = self._scp('put', local_file, tempfilename, **kwargs)
             self.run_command('mv {temp_file} {remote_file}'.format(temp_file=tempfilename,
                                                                    remote_file=remote_file))
             return scp
@@ -488,8 +775,7 @@ class SSHClient(paramiko.SSHClient):
             tempfilename = '/share/{}'.format(tmp_file_name)
             logger.info('For this purpose, temporary file name is %r', tempfilename)
             self.run_command('cp {} {}'.format(remote_file, tempfilename))
-            scp = SCPClient(self.get_transport(), progress=self._progress_callback).get(
-                tempfilename, local_path, **kwargs)
+            scp = self._scp('get', tempfilename, local_path, **kwargs)
             self.run_command('rm {}'.format(tempfilename))
             check_call([
                 'mv',
@@ -514,16 +800,14 @@ class SSHClient(paramiko.SSHClient):
                                                      file=tmp_folder_name),
                                     ensure_host=True)
             # Now download the file to the openshift host
-            scp = SCPClient(self.get_transport(), progress=self._progress_callback).get(
-                tmp_full_name, local_path, **kwargs)
+            scp = self._scp('get', tmp_full_name, local_path, **kwargs)
             check_call([
                 'mv',
                 os_path.join(local_path, tmp_file_name),
                 os_path.join(local_path, base_name)])
             return scp
         else:
-            return SCPClient(self.get_transport(), progress=self._progress_callback).get(
-                remote_file, local_path, **kwargs)
+            return self._scp('get', remote_file, local_path, **kwargs)
 
     def patch_file(self, local_path, remote_path, md5=None):
         """ Patches a single file on the appliance
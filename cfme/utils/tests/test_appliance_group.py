@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from cfme.utils.appliance.group import ApplianceGroup
+from cfme.utils.ssh import SSHResult
+
+
+class FakeSSHClient(object):
+    def __init__(self, hostname):
+        self.hostname = hostname
+
+    def run_command(self, command, **kwargs):
+        if self.hostname == 'broken':
+            raise IOError('no route to host')
+        return SSHResult(command=command, rc=0, output=self.hostname)
+
+
+class FakeAppliance(object):
+    def __init__(self, hostname):
+        self.hostname = hostname
+        self.ssh_client = FakeSSHClient(hostname)
+
+
+@pytest.fixture
+def appliances():
+    return [FakeAppliance(hostname) for hostname in ('one', 'two', 'three')]
+
+
+def test_group_run_command(appliances):
+    results = ApplianceGroup(appliances).run_command('hostname')
+    assert [result.appliance for result in results] == appliances
+    assert [result.result.output for result in results] == ['one', 'two', 'three']
+    assert all(results)
+    assert all(result.duration >= 0 for result in results)
+
+
+def test_group_keeps_exceptions(appliances):
+    appliances.append(FakeAppliance('broken'))
+    results = ApplianceGroup(appliances, max_workers=2).run_command('hostname')
+    assert [bool(result) for result in results] == [True, True, True, False]
+    assert isinstance(results[-1].exception, IOError)
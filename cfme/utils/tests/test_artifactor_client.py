@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from artifactor import Artifactor
+from artifactor import ArtifactorBasePlugin
+from artifactor import ArtifactorClient
+from artifactor import BATCH_HOOK
+from artifactor import initialize
+from cfme.utils.net import random_port
+
+
+class Recorder(ArtifactorBasePlugin):
+    def plugin_initialize(self):
+        self.register_plugin_hook('record', self.record)
+        self.values = []
+
+    def record(self, value):
+        self.values.append(value)
+
+
+@pytest.yield_fixture
+def artifactor(tmpdir):
+    art = Artifactor(None)
+    art.set_config({
+        'log_dir': tmpdir.join('log').strpath,
+        'artifact_dir': tmpdir.join('artifacts').strpath,
+        'server_address': '127.0.0.1',
+        'server_port': random_port(),
+        'server_enabled': True,
+        'plugins': {'recorder': {'enabled': True, 'plugin': 'recorder'}},
+    })
+    art.register_plugin(Recorder, 'recorder')
+    initialize(art)
+    requests = []
+    fire_internal_hook = art._fire_internal_hook
+
+    def record_request(json_dict):
+        requests.append(json_dict)
+        return fire_internal_hook(json_dict)
+    art._fire_internal_hook = record_request
+    art.requests = requests
+    yield art
+    # in case the client didn't get to shut the server down
+    art._zmq_event_handler_shutdown = art._server_shutdown = True
+
+
+def test_batched_and_synchronous_hooks_arrive_in_order(artifactor):
+    client = ArtifactorClient(
+        '127.0.0.1', artifactor.config['server_port'], async_hooks=True, batch_size=3)
+    client.ready = True
+    try:
+        for value in range(10):
+            # every fourth hook waits for its task, flushing the ones queued before it
+            client.fire_hook('record', value=value, wait_for_task=value % 4 == 3)
+        client.fire_hook('record', value='last', wait_for_task=True)
+    finally:
+        client.terminate()
+
+    assert artifactor.instances['recorder'].obj.values == list(range(10)) + ['last']
+    synchronous = [
+        request for request in artifactor.requests if request['hook_name'] != BATCH_HOOK]
+    batched = [
+        hook for request in artifactor.requests if request['hook_name'] == BATCH_HOOK
+        for hook in request['data']['hooks']]
+    assert len(synchronous) == 3
+    assert len(batched) == 8
+    for hook in batched:
+        assert set(hook) == set(synchronous[0])
+        assert not hook['grab_result'] and not hook['wait_for_task']
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+
+from cfme.utils.log import ArtifactorHandler
+
+
+class FakeArtifactor(object):
+    def __init__(self):
+        self.hooks = []
+
+    def fire_hook(self, hook_name, **kwargs):
+        self.hooks.append((hook_name, kwargs))
+
+
+def make_record(level, msg='message'):
+    return logging.makeLogRecord({
+        'name': 'cfme', 'levelno': level, 'levelname': logging.getLevelName(level), 'msg': msg})
+
+
+def make_handler(**attrs):
+    """A handler with other class settings, the queue is sized when it is created"""
+    handler = type('ArtifactorHandler', (ArtifactorHandler,), attrs)()
+    handler.artifactor = FakeArtifactor()
+    handler.slaveid = 'gw0'
+    return handler
+
+
+def test_emit_samples_records_when_the_artifactor_falls_behind():
+    handler = make_handler(queue_size=10, sample_threshold=0.5)
+    # nothing sends the queued records, as if the artifactor was stuck
+    handler._start_sender = lambda: None
+
+    started = time.time()
+    for _ in range(20):
+        handler.emit(make_record(logging.INFO))
+    assert handler._queue.qsize() == 5
+    assert handler.dropped == 15
+
+    for _ in range(10):
+        handler.emit(make_record(logging.WARNING))
+    assert handler._queue.qsize() == 10
+    assert handler.dropped == 20
+    assert time.time() - started < 1
+
+
+def test_dropped_records_are_reported_with_the_next_batch():
+    handler = make_handler(flush_interval=0.05, test_ident='test_a.py/test_one')
+    handler.dropped = 3
+    handler.emit(make_record(logging.INFO, 'hello'))
+    handler.drain()
+
+    (hook_name, hook_args), = handler.artifactor.hooks
+    assert hook_name == 'log_messages'
+    assert hook_args['slaveid'] == 'gw0'
+    hello, dropped = hook_args['log_records']
+    assert hello['msg'] == 'hello'
+    assert hello['test_ident'] == 'test_a.py/test_one'
+    assert dropped['msg'] == '3 log records dropped, artifactor is falling behind'
+    assert handler.dropped == 0
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+
+from artifactor.plugins.reporter import new_tree
+from artifactor.plugins.reporter import Reporter
+from artifactor.plugins.reporter import tree_leaf
+
+
+class FakeArtifactor(object):
+    def __init__(self):
+        self.hooks = []
+
+    def fire_hook(self, hook_name, **kwargs):
+        self.hooks.append((hook_name, kwargs))
+
+
+def make_reporter(**data):
+    reporter = Reporter('reporter', dict(data, enabled=True), FakeArtifactor())
+    reporter.configure()
+    return reporter
+
+
+def make_test(module, name, outcome='passed', files=()):
+    return {
+        'statuses': {'call': (outcome, False)},
+        'start_time': 100.0,
+        'finish_time': 160.0,
+        'test_module': module,
+        'test_name': name,
+        'files': list(files),
+    }
+
+
+def test_reporter_rebuilds_test_data_when_a_file_is_rewritten(tmpdir):
+    reporter = make_reporter()
+    short_tb = tmpdir.join('short_tb.log')
+    short_tb.write('first traceback')
+    artifacts = {'cfme/tests/test_a.py/test_one': make_test(
+        'cfme/tests/test_a.py', 'test_one', 'failed',
+        [{'file_type': 'short_tb', 'group_id': 'tb', 'os_filename': short_tb.strpath}])}
+    data = reporter.process_data(artifacts, tmpdir.strpath, None, None)
+    assert data['tests'][0]['short_tb'] == 'first traceback'
+
+    short_tb.write('second traceback')
+    mtime = os.path.getmtime(short_tb.strpath) + 10
+    os.utime(short_tb.strpath, (mtime, mtime))
+    data = reporter.process_data(artifacts, tmpdir.strpath, None, None)
+    assert data['tests'][0]['short_tb'] == 'second traceback'
+
+
+def test_reporter_tree_only_renders_changed_modules_again(tmpdir):
+    reporter = make_reporter()
+    artifacts = {
+        'cfme/tests/test_a.py/test_one': make_test('cfme/tests/test_a.py', 'test_one'),
+        'cfme/tests/test_b.py/test_two': make_test('cfme/tests/test_b.py', 'test_two'),
+    }
+    reporter.process_data(artifacts, tmpdir.strpath, None, None)
+    modules = reporter.tree['_sub']['tests']['_sub']
+    html_a, html_b = modules['test_a.py']['_html'], modules['test_b.py']['_html']
+
+    artifacts['cfme/tests/test_b.py/test_two']['statuses'] = {'call': ('failed', False)}
+    artifacts['cfme/tests/test_c.py/test_three'] = make_test('cfme/tests/test_c.py', 'test_three')
+    data = reporter.process_data(artifacts, tmpdir.strpath, None, None)
+    assert modules['test_a.py']['_html'] is html_a
+    assert modules['test_b.py']['_html'] != html_b
+
+    # the kept tree matches one built from scratch
+    fresh = new_tree()
+    for test in data['tests']:
+        test = dict(test, duration=60.0)
+        reporter.build_dict(test['name'].replace('cfme/', ''), fresh, tree_leaf(test))
+    assert reporter.build_li(fresh) == data['ndata']
+    assert reporter.tree['_stats'] == fresh['_stats'] == dict(
+        new_tree()['_stats'], passed=2, failed=1)
+
+    del artifacts['cfme/tests/test_a.py/test_one']
+    reporter.process_data(artifacts, tmpdir.strpath, None, None)
+    assert 'test_a.py' not in modules
+    assert reporter.tree['_stats']['passed'] == 1
+
+
+def test_reporter_debounces_build_report():
+    reporter = make_reporter(report_delay=0.2, report_max_delay=10)
+    for _ in range(3):
+        reporter.build_report({}, '/tmp')
+        time.sleep(0.05)
+    assert reporter._rigger_instance.hooks == []
+    time.sleep(0.4)
+    assert reporter._rigger_instance.hooks == [('build_report', {'debounced': True})]
+
+
+def test_reporter_builds_report_after_max_delay():
+    reporter = make_reporter(report_delay=0.5, report_max_delay=0.6)
+    for _ in range(16):
+        reporter.build_report({}, '/tmp')
+        time.sleep(0.05)
+    assert reporter._rigger_instance.hooks == [('build_report', {'debounced': True})]
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import time
+
+from cfme.utils.browser import BrowserPool
+
+
+class FakeBrowser(object):
+    current_url = 'https://appliance/'
+
+    def __init__(self, url_key):
+        self.url_key = url_key
+        self.closed = False
+
+
+class FakeFactory(object):
+    def create(self, url_key):
+        return FakeBrowser(url_key)
+
+    def close(self, browser):
+        browser.closed = True
+
+
+def wait_for_ready(pool, url_key):
+    for _ in range(100):
+        if pool._ready[url_key]:
+            return
+        time.sleep(0.05)
+
+
+def test_browser_pool_hands_out_warm_browsers():
+    pool = BrowserPool(FakeFactory, size=1)
+    _, first = pool.acquire('https://appliance/')
+    wait_for_ready(pool, 'https://appliance/')
+    factory, second = pool.acquire('https://appliance/')
+    assert second is not first
+    assert second.url_key == 'https://appliance/'
+    stats = pool.stats()
+    assert stats['cold']['count'] == 1
+    assert stats['warm']['count'] == 1
+
+    wait_for_ready(pool, 'https://appliance/')
+    (_, pooled), = pool._ready['https://appliance/']
+    pool.close()
+    assert pooled.closed
+    factory.close(second)
+
+
+def test_browser_pool_drops_browsers_of_other_url_keys():
+    pool = BrowserPool(FakeFactory, size=1)
+    pool.acquire('https://appliance/')
+    wait_for_ready(pool, 'https://appliance/')
+    (_, pooled), = pool._ready['https://appliance/']
+    pool.acquire('https://other-appliance/')
+    assert pooled.closed
+    assert list(pool._ready) == ['https://other-appliance/']
+    pool.close()
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from cfme.test_framework.config import ConfigSnapshot
+
+CFME_DATA = {
+    'management_systems': {
+        'vsphere65': {'type': 'virtualcenter', 'version': 6.5, 'tags': ['default']},
+        'rhv42': {'type': 'rhevm', 'version': '4.2', 'tags': ['default', 'disabled']},
+        'ec2west': {'type': 'ec2'},
+        'typeless': {'tags': ['default']},
+    }
+}
+
+SUPPORTABILITY = {
+    '5.10': {
+        'providers': {
+            'infra': [{'virtualcenter': [6.5, 6.7]}],
+            'cloud': ['ec2'],
+        }
+    },
+    '5.9': {},
+}
+
+
+def test_config_snapshot_indexes():
+    snapshot = ConfigSnapshot.compile(CFME_DATA, SUPPORTABILITY)
+    assert set(snapshot.provider_keys) == {'vsphere65', 'rhv42', 'ec2west'}
+    assert snapshot.providers_by_type['rhevm'] == ('rhv42',)
+    assert None not in snapshot.providers_by_type
+    assert set(snapshot.providers_by_tag['default']) == {'vsphere65', 'rhv42'}
+    assert set(snapshot.supported_providers['5.10']) == {
+        ('infra', 'virtualcenter', 6.5), ('infra', 'virtualcenter', 6.7), ('cloud', 'ec2', 0)}
+    assert snapshot.supported_providers['5.9'] == ()
+
+
+def test_config_snapshot_survives_the_disk(tmpdir):
+    snapshot = ConfigSnapshot.compile(CFME_DATA, SUPPORTABILITY)
+    cache_file = tmpdir.join('snapshot.json').strpath
+    snapshot.dump(cache_file)
+    assert ConfigSnapshot.load(cache_file) == snapshot
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+from sqlalchemy import create_engine
+
+from cfme.utils import db
+
+
+@pytest.fixture
+def schema_cache_dir(tmpdir, monkeypatch):
+    cache_dir = tmpdir.join('schema_cache')
+    monkeypatch.setattr(db, '_schema_cache_dir', cache_dir)
+    return cache_dir
+
+
+@pytest.fixture
+def engine(tmpdir):
+    engine = create_engine('sqlite:///{}'.format(tmpdir.join('vmdb.sqlite').strpath))
+    engine.execute('CREATE TABLE schema_migrations (version VARCHAR)')
+    engine.execute("INSERT INTO schema_migrations VALUES ('20180101000000')")
+    engine.execute('CREATE TABLE vms (id INTEGER PRIMARY KEY, name VARCHAR)')
+    engine.execute('CREATE TABLE hosts (id INTEGER PRIMARY KEY, name VARCHAR)')
+    return engine
+
+
+def sqlite_db(engine):
+    sqlite = db.Db(hostname='localhost', port=5432,
+                   credentials={'username': 'root', 'password': 'smartvm'})
+    sqlite.__dict__['engine'] = engine
+    return sqlite
+
+
+def test_reflected_tables_are_cached(schema_cache_dir, engine):
+    first = sqlite_db(engine)
+    assert [column.name for column in first['vms'].__table__.columns] == ['id', 'name']
+    assert first.schema_cache_file.startswith(schema_cache_dir.strpath)
+    first.save_schema_cache()
+    assert os.path.isfile(first.schema_cache_file)
+
+    second = sqlite_db(engine)
+    assert 'vms' in second.metadata.tables
+    assert second['vms'].__tablename__ == 'vms'
+
+
+def test_schema_cache_follows_migrations(schema_cache_dir, engine):
+    cache_file = sqlite_db(engine).schema_cache_file
+    engine.execute("INSERT INTO schema_migrations VALUES ('20180202000000')")
+    migrated = sqlite_db(engine)
+    assert migrated.schema_cache_file != cache_file
+    assert 'vms' not in migrated.metadata.tables
+
+
+def test_schema_cache_is_skipped_without_migrations(schema_cache_dir, tmpdir):
+    engine = create_engine('sqlite:///{}'.format(tmpdir.join('empty.sqlite').strpath))
+    engine.execute('CREATE TABLE vms (id INTEGER PRIMARY KEY, name VARCHAR)')
+    sqlite = sqlite_db(engine)
+    assert sqlite.schema_cache_file is None
+    assert not sqlite.metadata.tables
+    sqlite['vms']
+    sqlite.save_schema_cache()
+    assert not schema_cache_dir.check()
+
+
+def test_schema_cache_is_written_once_per_batch(schema_cache_dir, engine, monkeypatch):
+    sqlite = sqlite_db(engine)
+    exit_handlers = []
+    monkeypatch.setattr(db, 'at_exit', exit_handlers.append)
+    sqlite['vms']
+    sqlite['hosts']
+    assert not os.path.exists(sqlite.schema_cache_file)
+    assert exit_handlers == [sqlite.save_schema_cache]
+
+    exit_handlers[0]()
+    os.utime(sqlite.schema_cache_file, (1000000000, 1000000000))
+    sqlite.save_schema_cache()
+    assert os.path.getmtime(sqlite.schema_cache_file) == 1000000000
+    assert set(sqlite_db(engine).metadata.tables) == {'vms', 'hosts'}
+    assert not schema_cache_dir.listdir('*.pickle.*')
+
+
+def test_warm_up_writes_the_schema_cache(schema_cache_dir, engine):
+    sqlite = sqlite_db(engine)
+    sqlite.warm_up(['vms', 'hosts', 'not_a_table'])
+    assert set(sqlite._table_cache) == {'vms', 'hosts'}
+    assert set(sqlite_db(engine).metadata.tables) == {'vms', 'hosts'}
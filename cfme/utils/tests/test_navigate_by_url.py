@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from selenium.common.exceptions import NoSuchElementException
+
+from cfme.utils.appliance.implementations.ui import CFMENavigateStep
+from cfme.utils.appliance.implementations.ui import navigator
+
+
+class BrokenView(object):
+    """A view that never shows up, like one loaded from an URL that no longer works"""
+    def __init__(self, *args, **kwargs):
+        pass
+
+    @property
+    def is_displayed(self):
+        raise NoSuchElementException('the view is not there')
+
+
+class FakeWidgetastic(object):
+    url = None
+
+    class plugin(object):  # noqa
+        @staticmethod
+        def ensure_page_safe():
+            pass
+
+
+class FakeBrowser(object):
+    def __init__(self):
+        self.widgetastic = FakeWidgetastic()
+
+    def open_browser(self, url_key=None):
+        pass
+
+    def create_view(self, view_class, additional_context=None):
+        return view_class()
+
+
+class FakeServer(object):
+    def address(self):
+        return 'https://appliance/'
+
+
+class FakeAppliance(object):
+    def __init__(self):
+        self.browser = FakeBrowser()
+        self.server = FakeServer()
+
+    def url_path(self, path):
+        return 'https://appliance/{}'.format(path)
+
+
+class FakeCollection(object):
+    def __init__(self):
+        self.appliance = FakeAppliance()
+
+
+class All(CFMENavigateStep):
+    VIEW = BrokenView
+    URL = 'host/show_list'
+    _name = 'All'
+
+    def __init__(self, *args, **kwargs):
+        super(All, self).__init__(*args, **kwargs)
+        self.calls = []
+
+    def pre_badness_check(self, *args, **kwargs):
+        pass
+
+    def prerequisite(self):
+        self.calls.append('prerequisite')
+        return 'prerequisite view'
+
+    def step(self, *args, **kwargs):
+        self.calls.append(('step', self.prerequisite_view))
+
+
+def test_navigate_by_url_falls_back_to_prerequisites(monkeypatch):
+    collection = FakeCollection()
+    step = All(collection, navigator)
+    timings = []
+    monkeypatch.setattr(step, 'record_timing', lambda *args: timings.append(args))
+
+    assert not step.navigate_by_url()
+    assert collection.appliance.browser.widgetastic.url == 'https://appliance/host/show_list'
+    assert step.calls == []
+
+    step.go(wait_for_view=0)
+    assert step.calls == ['prerequisite', ('step', 'prerequisite view')]
+    duration, prerequisite_duration, here, via_url, forced = timings[0]
+    assert not here
+    assert not via_url
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from cfme.utils import navigation_timing
+from cfme.utils.navigation_timing import NavigationTimings
+
+
+@pytest.fixture
+def timings(tmpdir):
+    timings = NavigationTimings(tmpdir.join('navigation_timing.sqlite').strpath)
+    yield timings
+    timings.close()
+
+
+def test_slowest_destinations(timings):
+    timings.record('Server/LoggedIn', 150)
+    timings.record('Host/Details', 500, prerequisite_duration=400)
+    timings.record('Host/Details', 300, prerequisite_duration=200, via_url=True)
+    timings.record('Host/Edit', 450, prerequisite_duration=50)
+
+    slowest = timings.slowest()
+    assert [row['destination'] for row in slowest] == [
+        'Host/Details', 'Host/Edit', 'Server/LoggedIn']
+    assert slowest[0]['count'] == 2
+    assert slowest[0]['total'] == 800
+    assert slowest[0]['own_average'] == 100
+    assert slowest[0]['via_url'] == 1
+
+    assert [row['destination'] for row in timings.slowest(limit=2, order_by='own_average')] == [
+        'Host/Edit', 'Server/LoggedIn']
+
+
+def test_slowest_rejects_unknown_order(timings):
+    with pytest.raises(ValueError):
+        timings.slowest(order_by='duration; DROP TABLE navigations')
+
+
+def test_records_are_written_in_one_go(tmpdir, monkeypatch):
+    exit_handlers = []
+    monkeypatch.setattr(navigation_timing, 'at_exit', exit_handlers.append)
+    monkeypatch.setattr(navigation_timing, 'MAX_BUFFERED', 3)
+    path = tmpdir.join('navigation_timing.sqlite').strpath
+    timings = NavigationTimings(path)
+    timings.record('Host/All', 100)
+    timings.record('Host/Details', 200)
+    assert not tmpdir.join('navigation_timing.sqlite').check()
+    assert exit_handlers == [timings.flush]
+
+    timings.record('Host/Edit', 300)
+    other = NavigationTimings(path)
+    assert len(other.slowest()) == 3
+
+    timings.record('Host/Edit', 300)
+    exit_handlers[0]()
+    assert [row['count'] for row in other.slowest()] == [2, 1, 1]
+    other.close()
+    timings.close()
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+import json
+from collections import defaultdict
+from collections import deque
+from contextlib import contextmanager
+from threading import Event
+from threading import Thread
+
+import pytest
+import zmq
+from _pytest import runner
+
+from cfme.fixtures.parallelizer import control
+from cfme.fixtures.parallelizer import default_test_duration
+from cfme.fixtures.parallelizer import load_test_durations
+from cfme.fixtures.parallelizer import location_nodeid
+from cfme.fixtures.parallelizer import ParallelSession
+from cfme.fixtures.parallelizer import remote
+from cfme.fixtures.parallelizer import SlaveDetail
+from cfme.fixtures.parallelizer import split_by_cost
+from cfme.fixtures.parallelizer import TransportStats
+from cfme.utils.log import logger
+
+
+def test_load_test_durations_from_the_cache():
+    cached = {'cfme/tests/test_a.py::test_one': 2.0}
+    durations = load_test_durations(None, cached)
+    assert durations == cached
+    durations['cfme/tests/test_a.py::test_two'] = 1.0
+    assert len(cached) == 1
+    assert load_test_durations() == {}
+
+
+def test_load_test_durations_from_a_mapping(tmpdir):
+    durations_file = tmpdir.join('durations.json')
+    durations_file.write(json.dumps({'cfme/tests/test_a.py::test_one': 3}))
+    assert load_test_durations(durations_file.strpath, {'ignored': 1.0}) == {
+        'cfme/tests/test_a.py::test_one': 3.0}
+
+
+def test_load_test_durations_from_artifacts(tmpdir):
+    durations_file = tmpdir.join('artifacts.json')
+    durations_file.write(json.dumps({
+        'cfme/tests/test_a.py/test_one': {
+            'test_module': 'cfme/tests/test_a.py', 'test_name': 'test_one',
+            'durations': {'setup': 1.5, 'call': 2.0, 'teardown': 0.5}},
+        'cfme/tests/test_b.py/TestB.test_two[a.b]': {
+            'test_module': 'cfme/tests/test_b.py', 'test_name': 'TestB.test_two[a.b]',
+            'durations': {'call': 1.0}},
+        'cfme/tests/test_c.py::test_three': {'durations': {}},
+    }))
+    assert load_test_durations(durations_file.strpath) == {
+        'cfme/tests/test_a.py::test_one': 4.0,
+        'cfme/tests/test_b.py::TestB::()::test_two[a.b]': 1.0,
+        'cfme/tests/test_c.py::test_three': 0.0,
+    }
+
+
+@pytest.mark.parametrize(('test_name', 'nodeid'), [
+    ('test_one', 'test_a.py::test_one'),
+    ('test_one[1.2]', 'test_a.py::test_one[1.2]'),
+    ('TestA.test_one', 'test_a.py::TestA::()::test_one'),
+    ('TestA.TestB.test_one[x.y]', 'test_a.py::TestA::()::TestB::()::test_one[x.y]'),
+])
+def test_location_nodeid(test_name, nodeid):
+    assert location_nodeid('test_a.py', test_name) == nodeid
+
+
+def test_default_test_duration():
+    assert default_test_duration({}) == 1.0
+    assert default_test_duration({'a': 5.0}) == 5.0
+    assert default_test_duration({'a': 1.0, 'b': 100.0, 'c': 3.0}) == 3.0
+
+
+def test_split_by_cost():
+    costs = {'a': 2, 'b': 2, 'c': 1, 'd': 10, 'e': 1}
+    assert list(split_by_cost('abcde', costs.get, 4)) == [['a', 'b'], ['c'], ['d'], ['e']]
+    assert list(split_by_cost('abcde', costs.get, 100)) == [list('abcde')]
+    assert list(split_by_cost([], costs.get, 4)) == []
+
+
+class FakeDist(object):
+    """Stands in for the master's terminal distribution reporter"""
+    def __init__(self):
+        self.events = []
+
+    def runtest_logstart(self, slaveid, nodeid, location):
+        self.events.append(('logstart', nodeid))
+
+    def runtest_logreport(self, slaveid, report):
+        self.events.append((report.when, report.nodeid))
+
+
+@pytest.fixture
+def zmq_endpoint(tmpdir):
+    return 'ipc://{}'.format(tmpdir.join('parallelize'))
+
+
+@pytest.fixture
+def master(zmq_endpoint):
+    """A master with only what handling slave messages needs"""
+    master = ParallelSession.__new__(ParallelSession)
+    master.sock = zmq.Context.instance().socket(zmq.ROUTER)
+    master.sock.bind(zmq_endpoint)
+    master.log = logger
+    master.slaves = {}
+    master.durations = defaultdict(float)
+    master.transport_stats = TransportStats()
+    master.trdist = FakeDist()
+    master.dumps, master.loads = remote.SERIALIZERS['json']
+    master.print_message = lambda *args, **kwargs: None
+    yield master
+    master.sock.close(linger=0)
+
+
+def make_slave(master, zmq_endpoint, serializer='json', batch_size=1, collection=(),
+               appliance=None):
+    """A slave manager talking to ``master``, without a pytest session
+
+    Its ``collection`` maps the node ids to themselves instead of to test items.
+    """
+    detail = SlaveDetail(appliance=appliance, worker_config={})
+    master.slaves[detail.id] = detail
+    slave = remote.SlaveManager.__new__(remote.SlaveManager)
+    slave.slaveid = detail.id
+    slave.log = logger
+    slave.collection = {nodeid: nodeid for nodeid in collection}
+    slave.lazy_modules = None
+    slave.revoked = set()
+    slave.dumps, slave.loads = remote.SERIALIZERS[serializer]
+    slave.batch_size = batch_size
+    slave._pending_events = []
+    slave.sock = zmq.Context.instance().socket(zmq.REQ)
+    slave.sock.setsockopt(zmq.IDENTITY, detail.id)
+    slave.sock.connect(zmq_endpoint)
+    return slave
+
+
+@contextmanager
+def serving(master):
+    """Handles slave messages in a thread, like the master's runtest loop"""
+    stop = Event()
+
+    def handle():
+        while not stop.is_set():
+            slave, event_data, event_name = master.recv()
+            if event_name is not None:
+                master.handle_message(slave, event_name, event_data)
+    thread = Thread(target=handle)
+    thread.daemon = True
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join(10)
+    assert not thread.is_alive()
+
+
+def report(nodeid, when, duration=0):
+    return remote.serialize_report(runner.TestReport(
+        nodeid, (nodeid, 1, nodeid), {}, 'passed', None, when, duration=duration))
+
+
+@pytest.mark.parametrize('serializer', sorted(remote.SERIALIZERS))
+def test_batched_reports_round_trip(master, zmq_endpoint, serializer):
+    master.dumps, master.loads = remote.SERIALIZERS[serializer]
+    sent = []
+    send = master.send
+    master.send = lambda slave, event_data: sent.append(event_data) or send(slave, event_data)
+    slave = make_slave(master, zmq_endpoint, serializer, batch_size=3)
+    nodeid = 'cfme/tests/test_a.py::test_one'
+
+    with serving(master):
+        slave.send_report('runtest_logstart', nodeid=nodeid, location=(nodeid, 1, nodeid))
+        for when, duration in [('setup', 1.0), ('call', 2.5), ('teardown', 0.5)]:
+            slave.send_report('runtest_logreport', report=report(nodeid, when, duration))
+    slave.sock.close(linger=0)
+
+    # one ack for the test start, one for the whole batch of reports
+    assert sent == ['ack runtest_logstart', 'ack runtest_logreport']
+    assert master.transport_stats.messages == 2
+    assert master.transport_stats.events == 4
+    assert master.trdist.events == [
+        ('logstart', nodeid), ('setup', nodeid), ('call', nodeid), ('teardown', nodeid)]
+    assert master.durations == {nodeid: 4.0}
+
+
+class FakeConfig(object):
+    def __init__(self, **options):
+        self.options = options
+
+    def getoption(self, name, default=None):
+        return self.options.get(name, default)
+
+
+def distributing_master(master, *test_groups):
+    """Make ``master`` hand out ``test_groups`` to the slaves asking for tests"""
+    groups = list(test_groups)
+    master.config = FakeConfig(parallel_steal=True)
+    master.collection = [test for group in groups for test in group]
+    master.failed_slave_test_groups = deque()
+    master.sent_tests = 0
+    master.provs = []
+    master.get = lambda slave: groups.pop(0) if groups else []
+    return master
+
+
+def run_test(slave, nodeid, ran):
+    """Report a test as run by a slave, the way its runtest hooks do"""
+    slave.send_report('runtest_logstart', nodeid=nodeid, location=(nodeid, 1, nodeid))
+    for when in ('setup', 'call', 'teardown'):
+        slave.send_report('runtest_logreport', report=report(nodeid, when))
+    ran.append(nodeid)
+
+
+def test_stolen_tests_run_once(master, zmq_endpoint):
+    tests = ['cfme/tests/test_a.py::test_{}'.format(i) for i in range(6)]
+    distributing_master(master, tests)
+    victim = make_slave(master, zmq_endpoint, collection=tests)
+    thief = make_slave(master, zmq_endpoint, collection=tests)
+    ran_by_victim, ran_by_thief = [], []
+
+    with serving(master):
+        victim_tests = victim._iter_nodes()
+        run_test(victim, next(victim_tests), ran_by_victim)
+        # nothing is left to send, the thief takes half of what the victim can give up
+        thief_tests = thief._iter_nodes()
+        run_test(thief, next(thief_tests), ran_by_thief)
+        for nodeid in victim_tests:
+            run_test(victim, nodeid, ran_by_victim)
+        for nodeid in thief_tests:
+            run_test(thief, nodeid, ran_by_thief)
+
+    assert ran_by_victim == tests[:4]
+    assert ran_by_thief == tests[4:]
+    assert not victim.revoked
+    for slave in master.slaves.values():
+        assert not slave.tests
+        assert not slave.queue
+        assert not slave.revoked
+
+
+class FakeAppliance(object):
+    def __init__(self, hostname):
+        self.hostname = hostname
+        self.url = 'https://{}/'.format(hostname)
+
+
+def test_removed_appliance_tests_go_to_other_slaves(master, zmq_endpoint):
+    tests = ['cfme/tests/test_a.py::test_{}'.format(i) for i in range(6)]
+    distributing_master(master, tests)
+    retired = make_slave(
+        master, zmq_endpoint, collection=tests, appliance=FakeAppliance('10.0.0.1'))
+    other = make_slave(
+        master, zmq_endpoint, collection=tests, appliance=FakeAppliance('10.0.0.2'))
+    ran_by_retired, ran_by_other = [], []
+
+    with serving(master):
+        retired_tests = retired._iter_nodes()
+        run_test(retired, next(retired_tests), ran_by_retired)
+        reply = control.send_command(zmq_endpoint, 'remove_appliance', url='10.0.0.1')
+        assert reply == {'slave': retired.slaveid.decode('ascii')}
+        assert control.send_command(zmq_endpoint, 'list_appliances') == {
+            'slaves': {other.slaveid.decode('ascii'): 'https://10.0.0.2/'}}
+        # the retired slave finishes what it can't give back, then gets no more tests
+        for nodeid in retired_tests:
+            run_test(retired, nodeid, ran_by_retired)
+        for nodeid in other._iter_nodes():
+            run_test(other, nodeid, ran_by_other)
+
+    assert ran_by_retired == tests[:3]
+    assert ran_by_other == tests[3:]
+    assert master.slaves[retired.slaveid].retiring
+    assert not master.failed_slave_test_groups
+    for slave in master.slaves.values():
+        assert not slave.tests
+        assert not slave.queue
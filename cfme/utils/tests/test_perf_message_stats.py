@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import re
+
+import pytest
+
+from cfme.utils import perf_message_stats
+
+EVM_LOG = """\
+[----] I, [2014-03-04T08:11:14.320377 #3450:b15814]  INFO -- : MIQ(MiqServer.start) starting
+[----] I, [2014-03-04T08:11:15.320377 #3450:b15814]  INFO -- : MIQ(PriorityWorker) ID [15], \
+PID [6461], GUID [abc] started
+[----] I, [2014-03-04T08:11:16.320377 #3450:b15814]  INFO -- : MIQ(MiqQueue.put) \
+Message id: [1000], Command: [Vm.refresh], Args: [[["EmsVmware", 1]]]
+[----] I, [2014-03-04T08:11:17.320377 #3451:b15814]  INFO -- : MIQ(MiqQueue.get_via_drb) \
+Message id: [1000], MiqWorker id: [15], Dequeued in: [1.5] seconds
+[----] I, [2014-03-04T08:11:19.320377 #3451:b15814]  INFO -- : MIQ(MiqQueue.delivered) \
+Message id: [1000], State: [ok], Delivered in [2.25] seconds
+[----] W, [2014-03-04T08:12:19.320377 #3450:b15814]  WARN -- : MIQ(MiqServer.x) Worker \
+[PriorityWorker] with ID: [15], PID: [6461] has reached "evm_worker_memory_exceeded"
+"""
+
+
+@pytest.fixture
+def evm_log(tmpdir):
+    log = tmpdir.join('evm.log')
+    log.write(EVM_LOG)
+    return log.strpath
+
+
+def _parse(evm_log):
+    messages, workers = perf_message_stats.evm_to_messages_and_workers(
+        evm_log, {'-EmsVmware': re.compile(r'EmsVmware')}, processes=1)
+    return (
+        {msg_id: dict(msg) for msg_id, msg in messages[0].items()},
+        messages[1:],
+        {worker_id: dict(worker) for worker_id, worker in workers[0].items()},
+        workers[1:])
+
+
+def test_evm_to_messages_and_workers(evm_log):
+    messages, (msg_cmds, test_start, test_end, line_count), workers, worker_counts = _parse(
+        evm_log)
+    assert messages['1000']['msg_cmd'] == 'Vm.refresh-EmsVmware'
+    assert messages['1000']['total_time'] == 3.75
+    assert msg_cmds == {'Vm.refresh-EmsVmware': {'total': [3.75], 'queue': [1.5],
+                                                 'execute': [2.25]}}
+    assert test_start == '2014-03-04 08:11:14.320377'
+    assert test_end == '2014-03-04 08:11:19.320377'
+    assert line_count == 6
+    assert workers[15]['terminated'] == 'evm_worker_memory_exceeded'
+    # memory exceeded count, and the two worker lines seen
+    assert worker_counts[0] == 1
+    assert worker_counts[-1] == 2
+
+
+@pytest.mark.parametrize('chunk_size', [1, 50, 300])
+def test_evm_chunks_give_same_result(evm_log, monkeypatch, chunk_size):
+    expected = _parse(evm_log)
+    monkeypatch.setattr(perf_message_stats, 'evm_chunk_size', chunk_size)
+    assert _parse(evm_log) == expected
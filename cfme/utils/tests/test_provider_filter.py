@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from cfme.infrastructure.provider import InfraProvider
+from cfme.markers.env_markers.provider import DPFilter
+from cfme.test_framework.config import ConfigSnapshot
+from cfme.utils import providers
+from cfme.utils.providers import ProviderFilter
+
+
+def test_provider_filters_with_same_arguments_are_equal():
+    first = ProviderFilter(classes=[InfraProvider], required_fields=[(['a', 'b'], True)])
+    second = ProviderFilter(classes=[InfraProvider], required_fields=[(['a', 'b'], True)])
+    assert first == second
+    assert hash(first) == hash(second)
+    assert len({first, second, first.copy()}) == 1
+
+
+def test_provider_filters_with_different_arguments_differ():
+    base = ProviderFilter(required_tags=['disabled'])
+    assert base != ProviderFilter(required_tags=['disabled'], inverted=True)
+    assert base != ProviderFilter(required_flags=['disabled'])
+    assert base != DPFilter(required_tags=['disabled'])
+
+
+def test_provider_filter_candidate_keys():
+    snapshot = ConfigSnapshot.compile({'management_systems': {
+        'rhv42': {'type': 'rhevm', 'tags': ['default', 'disabled']},
+        'vsphere65': {'type': 'virtualcenter', 'tags': ['default']},
+        'ec2west': {'type': 'ec2'},
+    }}, {})
+    assert ProviderFilter(required_tags=['default']).candidate_keys(snapshot) == {
+        'rhv42', 'vsphere65'}
+    assert ProviderFilter(
+        required_tags=['disabled'], inverted=True).candidate_keys(snapshot) == {
+        'vsphere65', 'ec2west'}
+    assert ProviderFilter(
+        keys=['ec2west'], required_tags=['disabled'], conjunctive=False).candidate_keys(
+        snapshot) == {'rhv42', 'ec2west'}
+    # the flags can't be looked up, so only a conjunctive filter narrows the keys down
+    assert ProviderFilter(
+        required_tags=['disabled'], required_flags=['x']).candidate_keys(snapshot) == {'rhv42'}
+    assert ProviderFilter(
+        required_tags=['disabled'], required_flags=['x'],
+        inverted=True).candidate_keys(snapshot) is None
+    assert ProviderFilter(required_flags=['x']).candidate_keys(snapshot) is None
+
+
+class SnapshotOnlyConf(object):
+    """A conf which only has a snapshot, loading the yamls is an error"""
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+
+    def snapshot(self):
+        return self._snapshot
+
+    @property
+    def cfme_data(self):
+        raise AssertionError('cfme_data was loaded')
+
+
+def test_candidate_provider_keys_only_read_the_snapshot(monkeypatch):
+    snapshot = ConfigSnapshot.compile({'management_systems': {
+        'vsphere65': {'type': 'virtualcenter', 'tags': ['default']},
+        'rhv42': {'type': 'rhevm', 'tags': ['default', 'disabled']},
+        'ec2west': {'type': 'ec2', 'tags': ['default']},
+    }}, {})
+    monkeypatch.setattr(providers, 'conf', SnapshotOnlyConf(snapshot))
+    assert providers.candidate_provider_keys([
+        ProviderFilter(required_tags=['default']),
+        ProviderFilter(required_tags=['disabled'], inverted=True)]) == ['vsphere65', 'ec2west']
+    assert providers.candidate_provider_keys([]) == list(snapshot.provider_keys)
@@ -1,4 +1,7 @@
 # -*- coding: utf-8 -*-
+import socket
+
+import gevent
 import pytest
 
 from cfme.utils.appliance import DummyAppliance
@@ -33,3 +36,53 @@ def test_scp_client_can_put_a_file(appliance, tmpdir):
     assert "content" in tmpfile.read()
     # Clean up the server
     appliance.ssh_client.run_command("rm -f /tmp/{}".format(tmpfile.basename))
+
+
+def test_ssh_clients_share_transport(appliance):
+    # Clients for the same host and credentials reuse the authenticated transport
+    client = appliance.ssh_client(stream_output=True)
+    assert client.get_transport() is appliance.ssh_client.get_transport()
+    client.close()
+    assert appliance.ssh_client.run_command('true').success
+
+
+def test_ssh_client_closed_with_dead_transport_drops_it(appliance):
+    # A client closing a pooled transport that died must not get it back
+    client = appliance.ssh_client()
+    transport = client.get_transport()
+    transport.close()
+    client.close()
+    assert client.get_transport() is not transport
+    assert appliance.ssh_client.run_command('true').success
+
+
+def test_ssh_client_timeout_keeps_shared_transport(appliance):
+    # A command timing out must not tear down the transport other clients have channels on
+    client = appliance.ssh_client()
+    other = appliance.ssh_client()
+    channel = other.get_transport().open_session()
+    with pytest.raises((socket.timeout, gevent.Timeout)):
+        client.run_command('sleep 30', timeout=1)
+    client.close()
+    del client
+    channel.exec_command('true')
+    assert channel.recv_exit_status() == 0
+    assert other.run_command('true').success
+
+
+def test_ssh_client_run_commands(appliance):
+    results = appliance.ssh_client.run_commands(['echo first', 'echo second'])
+    assert [result.output.strip() for result in results] == ['first', 'second']
+
+
+def test_ssh_client_rails_daemon(appliance):
+    client = appliance.ssh_client(rails_daemon=True)
+    try:
+        result = client.run_rails_command("'puts MiqServer.my_server.id'")
+        assert result.success
+        assert result.output.strip().isdigit()
+        assert client.run_rails_command("'raise \"boom\"'").failed
+        # the daemon survives failing snippets
+        assert client.run_rails_command("'puts 1 + 1'").output.strip() == '2'
+    finally:
+        client.close()
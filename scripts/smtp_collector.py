@@ -8,9 +8,12 @@ import re
 import sqlite3
 import sys
 import threading
+import time
 from collections import namedtuple
 from datetime import datetime
 from smtpd import SMTPServer
+from SocketServer import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer
 
 from bottle import request
 from bottle import response
@@ -25,15 +28,19 @@ from cfme.utils.timeutil import parsetime
 
 
 TIME_FORMAT = "%Y-%m-%d-%H-%M-%S"
-ROWS = ("from_address", "to_address", "subject", "time", "text")
+ROWS = ("id", "from_address", "to_address", "subject", "time", "text")
+MAX_WAIT = 600  # Longest time a /wait request can block, in seconds
 
 # Shared variable with all messages
 db_lock = threading.RLock()
+# Notified whenever an e-mail arrives
+new_email = threading.Condition(db_lock)
 connection = sqlite3.connect(":memory:", check_same_thread=False)
 cur = connection.cursor()
 cur.execute(
     """
     CREATE TABLE emails (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
         from_address TEXT,
         to_address TEXT,
         subject TEXT,
@@ -42,6 +49,16 @@ cur.execute(
     )
     """
 )
+for column in ("subject", "to_address", "time"):
+    cur.execute("CREATE INDEX emails_{0} ON emails ({0})".format(column))
+try:
+    # Full text search in the bodies, the rows share the id with the emails table.
+    # AUTOINCREMENT keeps the ids growing across /clear, so since_id cursors stay valid
+    cur.execute("CREATE VIRTUAL TABLE emails_text USING fts4 (text)")
+    fts_available = True
+except sqlite3.OperationalError:
+    # sqlite built without FTS, text_match falls back to LIKE
+    fts_available = False
 connection.commit()
 
 # To write the e-mails into the files
@@ -81,14 +98,19 @@ class EmailServer(SMTPServer):
             global connection
             cursor = connection.cursor()
             cursor.execute(
-                "INSERT INTO emails VALUES (?, ?, ?, CURRENT_TIMESTAMP, ?)",
+                "INSERT INTO emails VALUES (NULL, ?, ?, ?, CURRENT_TIMESTAMP, ?)",
                 (
                     d["From"],
                     ",".join([address.strip() for address in d["To"].strip().split(",")]),
                     d["Subject"],
                     payload)
             )
+            if fts_available:
+                cursor.execute(
+                    "INSERT INTO emails_text (docid, text) VALUES (?, ?)",
+                    (cursor.lastrowid, payload))
             connection.commit()
+            new_email.notify_all()
         if email_folder is not None:
             with files_lock:
                 # Create directories if they don't exist
@@ -121,49 +143,56 @@ def set_test_name():
         return json.dumps(False)
 
 
-@route("/messages")
-def all_messages():
-    """Return a JSON with all e-mails (eventually filtered)"""
-    response.content_type = "application/json"
-
+def query_messages(query):
+    """Return the e-mails matching the filters in the query, ordered by arrival"""
     # Build SQL
-    sql = 'SELECT * FROM emails'
+    sql = 'SELECT {} FROM emails'.format(", ".join(ROWS))
 
     # Build WHERE clause(s)
     bindings = ()
     where_clause = list()
-    if request.query.from_address:
+    if query.since_id:
+        where_clause.append("id > ?")
+        bindings += (int(query.since_id),)
+    if query.from_address:
         where_clause.append("from_address = ?")
-        bindings += (request.query.from_address,)
-    if request.query.to_address:
+        bindings += (query.from_address,)
+    if query.to_address:
         where_clause.append("to_address = ?")
-        bindings += (request.query.to_address,)
-    if request.query.subject:
+        bindings += (query.to_address,)
+    if query.subject:
         where_clause.append("subject = ?")
-        bindings += (request.query.subject,)
-    if request.query.subject_like:
+        bindings += (query.subject,)
+    if query.subject_like:
         where_clause.append("subject LIKE ?")
-        bindings += (request.query.subject_like,)
-    if request.query.text_like:
+        bindings += (query.subject_like,)
+    if query.text_like:
         where_clause.append("text LIKE ?")
-        bindings += (request.query.text_like,)
-    if request.query.text:
+        bindings += (query.text_like,)
+    if query.text_match:
+        if fts_available:
+            where_clause.append("id IN (SELECT docid FROM emails_text WHERE text MATCH ?)")
+            bindings += (query.text_match,)
+        else:
+            where_clause.append("text LIKE ?")
+            bindings += ("%{}%".format(query.text_match),)
+    if query.text:
         where_clause.append("text = ?")
-        bindings += (request.query.text,)
-    if request.query.time_from:
-        time = parsetime.from_request_format(request.query.time_from)
+        bindings += (query.text,)
+    if query.time_from:
+        time_from = parsetime.from_request_format(query.time_from)
         where_clause.append("time >= ?")
-        bindings += (time,)
-    if request.query.time_to:
-        time = parsetime.from_request_format(request.query.time_to)
+        bindings += (time_from,)
+    if query.time_to:
+        time_to = parsetime.from_request_format(query.time_to)
         where_clause.append("time <= ?")
-        bindings += (time,)
+        bindings += (time_to,)
 
     if where_clause:
         sql += ' WHERE {}'.format(" AND ".join(where_clause))
 
     # Order by time arrived
-    sql += " ORDER BY time ASC"
+    sql += " ORDER BY id ASC"
 
     with db_lock:
         global connection
@@ -172,7 +201,32 @@ def all_messages():
         c = db.execute(sql, bindings)
 
         rows = c.fetchall()
-        return json.dumps([dict(zip(ROWS, row)) for row in rows])
+        return [dict(zip(ROWS, row)) for row in rows]
+
+
+@route("/messages")
+def all_messages():
+    """Return a JSON with all e-mails (eventually filtered)"""
+    response.content_type = "application/json"
+    return json.dumps(query_messages(request.query))
+
+
+@route("/wait")
+def wait_for_messages():
+    """Like /messages, but blocks until at least ``count`` (default 1) e-mails match the filters
+    or ``timeout`` (default 60) seconds pass. Returns what matches at that point."""
+    response.content_type = "application/json"
+    count = int(request.query.count or 1)
+    deadline = time.time() + min(float(request.query.timeout or 60), MAX_WAIT)
+    with new_email:
+        messages = query_messages(request.query)
+        while len(messages) < count:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            new_email.wait(remaining)
+            messages = query_messages(request.query)
+    return json.dumps(messages)
 
 
 @route("/messages.html")
@@ -181,7 +235,8 @@ def all_messages_in_html():
     emails = []
     Email = namedtuple("Email", ["source", "destination", "subject", "received", "body"])
     with db_lock:
-        emails = map(Email._make, connection.cursor().execute("SELECT * FROM emails").fetchall())
+        emails = map(Email._make, connection.cursor().execute(
+            "SELECT {} FROM emails ORDER BY id ASC".format(", ".join(ROWS[1:]))).fetchall())
 
     return template_env.get_template("smtp_result.html").render(emails=emails)
 
@@ -194,6 +249,8 @@ def clear_database():
         global connection
         cursor = connection.cursor()
         cursor.execute("DELETE FROM emails")
+        if fts_available:
+            cursor.execute("DELETE FROM emails_text")
         connection.commit()
     return json.dumps(True)
 
@@ -206,9 +263,14 @@ def run_email_server(port=1025):
         pass
 
 
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    """A request blocked in /wait must not hold the other requests up"""
+    daemon_threads = True
+
+
 def run_email_query(port=1026):
     try:
-        run(host="0.0.0.0", port=port, quiet=True)
+        run(host="0.0.0.0", port=port, quiet=True, server_class=ThreadingWSGIServer)
     except KeyboardInterrupt:
         pass
 
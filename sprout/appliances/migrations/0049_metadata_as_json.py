@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+
+import yaml
+from django.db import migrations, models
+
+METADATA_MODELS = [
+    'appliance', 'appliancepool', 'delayedprovisiontask', 'group', 'groupshepherd', 'provider',
+    'template']
+
+
+def convert_metadata(apps, schema_editor, load, dump):
+    for model_name in METADATA_MODELS:
+        model = apps.get_model('appliances', model_name)
+        objects = model.objects.using(schema_editor.connection.alias)
+        for pk, raw in objects.values_list('pk', 'object_meta_data').iterator():
+            objects.filter(pk=pk).update(object_meta_data=dump(load(raw) or {}))
+
+
+def yaml_to_json(apps, schema_editor):
+    convert_metadata(apps, schema_editor, yaml.safe_load, json.dumps)
+
+
+def json_to_yaml(apps, schema_editor):
+    # yaml reads json as well, in case some rows were edited by hand
+    convert_metadata(apps, schema_editor, yaml.safe_load, yaml.safe_dump)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appliances', '0048_openshift_project_made_bigger'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name=model_name,
+            name='object_meta_data',
+            field=models.TextField(default='{}'),
+        )
+        for model_name in METADATA_MODELS
+    ] + [
+        migrations.RunPython(yaml_to_json, json_to_yaml),
+    ]
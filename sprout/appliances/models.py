@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 import base64
+import json
 import re
+import threading
+import time
 import yaml
 import six
 
@@ -21,7 +24,7 @@ from django.contrib.auth.models import User, Group as DjangoGroup
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models, transaction
 from django.db.models import Q
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from json_field import JSONField
@@ -66,7 +69,9 @@ def apply_if_not_none(o, meth, *args, **kwargs):
 class MetadataMixin(models.Model):
     class Meta:
         abstract = True
-    object_meta_data = models.TextField(default=yaml.safe_dump({}))
+    # JSON kept as text: Django < 1.10 only has a JSON field for postgres and Sprout runs on
+    # sqlite, and update_metadata compares the stored text, which JSONField would re-serialize
+    object_meta_data = models.TextField(default='{}')
     created_on = models.DateTimeField(default=timezone.now, editable=False)
     modified_on = models.DateTimeField(default=timezone.now)
 
@@ -85,33 +90,67 @@ class MetadataMixin(models.Model):
         new_self = type(self).objects.get(pk=self.pk)
         self.__dict__.update(new_self.__dict__)
 
-    @property
-    @contextmanager
-    def metadata_lock(self):
-        with critical_section("metadata-({})[{}]".format(type(self).__name__, str(self.pk))):
-            yield
+    @staticmethod
+    def load_metadata(raw):
+        try:
+            return json.loads(raw)
+        except ValueError:
+            # Written before the metadata was stored as JSON, or edited by hand in the admin
+            return yaml.safe_load(raw) or {}
 
     @property
     def metadata(self):
-        return yaml.safe_load(self.object_meta_data)
+        return self.load_metadata(self.object_meta_data)
 
     @metadata.setter
     def metadata(self, value):
         if not isinstance(value, dict):
             raise TypeError("You can store only dict in metadata!")
-        self.object_meta_data = yaml.safe_dump(value)
+        self.object_meta_data = json.dumps(value)
+
+    def _stored_metadata(self):
+        return type(self).objects.filter(pk=self.pk).values_list(
+            'object_meta_data', flat=True).get()
+
+    def update_metadata(self, changes, removed=()):
+        """Sets and removes metadata keys in the database, leaving the other keys alone
+
+        There is no lock, the row is only updated if nobody changed the metadata since it was
+        read, otherwise it is read again and the changes are applied on top of the new metadata.
+
+        Args:
+            changes: A dict of keys to set
+            removed: Keys to remove
+        """
+        if not changes and not removed:
+            return
+        objects = type(self).objects.filter(pk=self.pk)
+        while True:
+            raw = self._stored_metadata()
+            metadata = self.load_metadata(raw)
+            metadata.update(changes)
+            for key in removed:
+                metadata.pop(key, None)
+            new_raw = json.dumps(metadata)
+            modified_on = timezone.now()
+            if objects.filter(object_meta_data=raw).update(
+                    object_meta_data=new_raw, modified_on=modified_on):
+                break
+        self.object_meta_data = new_raw
+        self.modified_on = modified_on
 
     @property
     @contextmanager
     def edit_metadata(self):
-        with transaction.atomic():
-            with self.metadata_lock:
-                o = type(self).objects.get(pk=self.pk)
-                metadata = o.metadata
-                yield metadata
-                o.metadata = metadata
-                o.save()
-        self.reload()
+        """Edit the metadata stored in the database, only the keys changed are written back"""
+        raw = self._stored_metadata()
+        metadata = self.load_metadata(raw)
+        yield metadata
+        original = self.load_metadata(raw)
+        self.update_metadata(
+            {key: value for key, value in metadata.items()
+             if key not in original or original[key] != value},
+            [key for key in original if key not in metadata])
 
     @property
     def logger(self):
@@ -134,6 +173,38 @@ class DelayedProvisionTask(MetadataMixin):
             self.provider_to_avoid.id if self.provider_to_avoid is not None else "---")
 
 
+_provider_load = threading.local()
+
+
+class ProviderLoad(object):
+    """Appliance and template counts of all providers, taken with three aggregate queries
+
+    While a snapshot is active (see :py:meth:`Provider.load_snapshot`), the load properties of
+    every :py:class:`Provider` are computed from it instead of querying the database each time.
+    """
+    def __init__(self):
+        self.taken = time.time()
+        self.provisioning = self._count_by(
+            Appliance.objects.filter(ready=False, marked_for_deletion=False, ip_address=None),
+            'template__provider')
+        self.managing = self._count_by(Appliance.objects.all(), 'template__provider')
+        self.templates_preparing = self._count_by(Template.objects.filter(ready=False), 'provider')
+
+    @staticmethod
+    def _count_by(queryset, field):
+        # The default ordering would end up in the GROUP BY, so it has to be cleared
+        return dict(queryset.order_by().values_list(field).annotate(models.Count('id')))
+
+    @staticmethod
+    def active():
+        return getattr(_provider_load, 'active', None)
+
+    def appliance_added(self, provider):
+        """Counts an appliance that has just started provisioning on the provider"""
+        for counts in (self.provisioning, self.managing):
+            counts[provider.id] = counts.get(provider.id, 0) + 1
+
+
 class Provider(MetadataMixin):
     id = models.CharField(max_length=32, primary_key=True, help_text="Provider's key in YAML.")
     working = models.BooleanField(default=False, help_text="Whether provider is available.")
@@ -202,15 +273,43 @@ class Provider(MetadataMixin):
         else:
             return get_mgmt(self.id)
 
+    @classmethod
+    @contextmanager
+    def load_snapshot(cls, max_age=0):
+        """Makes the load properties of all providers use one :py:class:`ProviderLoad`
+
+        Args:
+            max_age: Seconds for which the last snapshot taken in this thread can be reused
+        """
+        load = ProviderLoad.active()
+        if load is not None:
+            # Nested, keep using the outer snapshot
+            yield load
+            return
+        load = getattr(_provider_load, 'last', None)
+        if load is None or time.time() - load.taken > max_age:
+            load = _provider_load.last = ProviderLoad()
+        _provider_load.active = load
+        try:
+            yield load
+        finally:
+            _provider_load.active = None
+
     @property
     def num_currently_provisioning(self):
-        return len(
-            Appliance.objects.filter(
-                ready=False, marked_for_deletion=False, template__provider=self, ip_address=None))
+        load = ProviderLoad.active()
+        if load is not None:
+            return load.provisioning.get(self.id, 0)
+        return Appliance.objects.filter(
+            ready=False, marked_for_deletion=False, template__provider=self,
+            ip_address=None).count()
 
     @property
     def num_templates_preparing(self):
-        return len(Template.objects.filter(provider=self, ready=False))
+        load = ProviderLoad.active()
+        if load is not None:
+            return load.templates_preparing.get(self.id, 0)
+        return Template.objects.filter(provider=self, ready=False).count()
 
     @property
     def remaining_configuring_slots(self):
@@ -230,7 +329,10 @@ class Provider(MetadataMixin):
 
     @property
     def num_currently_managing(self):
-        return len(Appliance.objects.filter(template__provider=self))
+        load = ProviderLoad.active()
+        if load is not None:
+            return load.managing.get(self.id, 0)
+        return Appliance.objects.filter(template__provider=self).count()
 
     @property
     def currently_managed_appliances(self):
@@ -509,18 +611,34 @@ class GroupShepherd(MetadataMixin):
             template__template_group=self.template_group,
             template__provider__user_groups=self.user_group)
 
-    def get_fulfillment_percentage(self, preconfigured):
+    @classmethod
+    def shepherd_counts(cls, preconfigured):
+        """Counts the appliances in the shepherd of every group shepherd at once.
+
+        Returns:
+            A dict of ``(template_group_id, user_group_id)``: number of appliances
+        """
+        counts = Appliance.objects.filter(
+            template__preconfigured=preconfigured, appliance_pool=None,
+            marked_for_deletion=False).order_by().values_list(
+                'template__template_group', 'template__provider__user_groups').annotate(
+                    models.Count('id', distinct=True))
+        return {(group, user_group): count for group, user_group, count in counts}
+
+    def get_fulfillment_percentage(self, preconfigured, appliances_in_shepherd=None):
         """Return percentage of fulfillment of the group shepherd.
 
         Values between 0-100, can be over 100 if there are more than required.
 
         Args:
             preconfigured: Whether to check the pure ones or configured ones.
+            appliances_in_shepherd: The number of appliances in the shepherd if already known,
+                see :py:meth:`shepherd_counts`
         """
-        appliances_in_shepherd = len(
-            self.appliances.filter(
+        if appliances_in_shepherd is None:
+            appliances_in_shepherd = self.appliances.filter(
                 template__preconfigured=preconfigured, appliance_pool=None,
-                marked_for_deletion=False))
+                marked_for_deletion=False).count()
         wanted_pool_size = (
             self.template_pool_size if preconfigured else self.unconfigured_template_pool_size)
         if wanted_pool_size == 0:
@@ -800,6 +918,10 @@ class Appliance(MetadataMixin):
 
     RESET_SWAP_STATES = {Power.OFF, Power.REBOOTING, Power.ORPHANED}
 
+    # Fields that refresh_appliances_provider can change
+    REFRESHED_FIELDS = (
+        'name', 'uuid', 'ip_address', 'power_state', 'power_state_changed', 'swap', 'ssh_failed')
+
     template = models.ForeignKey(
         Template, on_delete=models.CASCADE, help_text="Appliance's source template.")
     appliance_pool = models.ForeignKey("AppliancePool", null=True, on_delete=models.CASCADE,
@@ -1560,7 +1682,7 @@ class AppliancePool(MetadataMixin):
         if len(tasks) == 0:
             return 0
         latest_id = tasks[0].id
-        return len(DelayedProvisionTask.objects.filter(id__lt=latest_id))
+        return DelayedProvisionTask.objects.filter(id__lt=latest_id).count()
 
     @property
     def num_possible_provisioning_slots(self):
@@ -1584,9 +1706,8 @@ class AppliancePool(MetadataMixin):
 
     @property
     def num_shepherd_appliances(self):
-        return len(
-            Appliance.objects.filter(appliance_pool=None,
-                                     **self.appliance_filter_params).distinct())
+        return Appliance.objects.filter(
+            appliance_pool=None, **self.appliance_filter_params).distinct().count()
 
     def __repr__(self):
         return "<AppliancePool id: {}, group: {}, total_count: {}>".format(
@@ -1597,6 +1718,21 @@ class AppliancePool(MetadataMixin):
             self.id, self.group.id, self.total_count)
 
 
+@receiver(post_save, sender=Appliance)
+def kick_shepherd_on_appliance_save(sender, instance, update_fields=None, **kwargs):
+    # The appliance left the shepherd, it can be refilled without waiting for the periodic run
+    if (update_fields and 'appliance_pool' in update_fields) or instance.marked_for_deletion:
+        from appliances.tasks import kick_shepherd
+        kick_shepherd()
+
+
+@receiver(post_delete, sender=Appliance)
+@receiver(post_save, sender=GroupShepherd)
+def kick_shepherd_on_change(sender, **kwargs):
+    from appliances.tasks import kick_shepherd
+    kick_shepherd()
+
+
 class MismatchVersionMailer(models.Model):
     provider = models.ForeignKey(Provider, on_delete=models.CASCADE)
     template_name = models.CharField(max_length=64)
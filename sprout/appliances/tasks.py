@@ -11,6 +11,7 @@ import command
 import yaml
 
 from collections import namedtuple
+from concurrent import futures
 from contextlib import closing
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
@@ -31,7 +32,7 @@ import socket
 
 from appliances.models import (
     Provider, Group, Template, Appliance, AppliancePool, DelayedProvisionTask,
-    MismatchVersionMailer, User, GroupShepherd)
+    MismatchVersionMailer, User, GroupShepherd, ProviderLoad)
 from sprout import settings, redis
 from sprout.irc_bot import send_message
 from sprout.log import create_logger
@@ -83,6 +84,26 @@ def none_dict(l):
         return l
 
 
+def resolve_hostnames(hostnames, max_workers=16):
+    """Resolves the hostnames in parallel, returns a dict of hostname: IP, or None if it doesn't
+    resolve. The results are cached for ``settings.DNS_CACHE_TIME`` seconds."""
+    cache_keys = {'dns-{}'.format(hostname): hostname for hostname in set(hostnames) if hostname}
+    # Hostnames that do not resolve are cached as an empty string, None means not cached
+    result = {
+        cache_keys[key]: ip or None for key, ip in cache.get_many(cache_keys.keys()).items()
+        if ip is not None}
+    missing = [hostname for hostname in cache_keys.values() if hostname not in result]
+    if missing:
+        with futures.ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+            resolved = dict(
+                zip(missing, executor.map(lambda h: resolve_hostname(h, force=True), missing)))
+        cache.set_many(
+            {'dns-{}'.format(hostname): ip or '' for hostname, ip in resolved.items()},
+            settings.DNS_CACHE_TIME)
+        result.update(resolved)
+    return result
+
+
 def provider_error_logger():
     return create_logger("provider_errors")
 
@@ -1447,30 +1468,53 @@ def refresh_appliances_provider(self, provider_id):
             self.logger.error("Couldn't refresh vm {} because of {}".format(vm.name, e.message))
             continue
 
-    for appliance in Appliance.objects.filter(template__provider=provider):
+    # Match the appliances with the VMs first, so the hostnames can be resolved all at once
+    matched = []
+    for appliance in Appliance.objects.filter(
+            template__provider=provider).select_related('template__provider'):
         if appliance.uuid is not None and appliance.uuid in uuid_vms:
             vm = uuid_vms[appliance.uuid]
-            # Using the UUID and change the name if it changed
-            appliance.name = vm.name
-
-            appliance.ip_address = vm.ip if vm.ip and resolve_hostname(vm.ip) else None
-            appliance.set_power_state(Appliance.POWER_STATES_MAPPING.get(
-                vm.state, Appliance.Power.UNKNOWN))
-            appliance.save()
         elif appliance.name in dict_vms:
             vm = dict_vms[appliance.name]
-            # Using the name, and then retrieve uuid
-            appliance.uuid = vm.uuid
-            appliance.ip_address = vm.ip if vm.ip and resolve_hostname(vm.ip) else None
-            appliance.set_power_state(Appliance.POWER_STATES_MAPPING.get(
-                vm.state, Appliance.Power.UNKNOWN))
-            appliance.save()
-            self.logger.info("Retrieved UUID for appliance {}/{}: {}".format(
-                appliance.id, appliance.name, appliance.uuid))
         else:
+            vm = None
+        matched.append((appliance, vm, vm.ip if vm is not None else None))
+    resolved = resolve_hostnames(ip for _, _, ip in matched)
+
+    # Only write the fields that changed
+    fields = Appliance.REFRESHED_FIELDS
+    changes = []
+    for appliance, vm, ip in matched:
+        original = {field: getattr(appliance, field) for field in fields}
+        if vm is None:
             # Orphaned :(
             appliance.set_power_state(Appliance.Power.ORPHANED)
-            appliance.save()
+        else:
+            if appliance.uuid is not None and appliance.uuid in uuid_vms:
+                # Using the UUID and change the name if it changed
+                appliance.name = vm.name
+            else:
+                # Using the name, and then retrieve uuid
+                appliance.uuid = vm.uuid
+                self.logger.info("Retrieved UUID for appliance {}/{}: {}".format(
+                    appliance.id, appliance.name, appliance.uuid))
+            appliance.ip_address = ip if ip and resolved.get(ip) else None
+            appliance.set_power_state(Appliance.POWER_STATES_MAPPING.get(
+                vm.state, Appliance.Power.UNKNOWN))
+        changed = {
+            field: getattr(appliance, field) for field in fields
+            if getattr(appliance, field) != original[field]}
+        if changed:
+            changes.append((appliance.id, changed))
+
+    if changes:
+        modified_on = timezone.now()
+        with transaction.atomic():
+            for appliance_id, changed in changes:
+                Appliance.objects.filter(id=appliance_id).update(
+                    modified_on=modified_on, **changed)
+    self.logger.info("Refreshed appliances in {}, {} of {} changed".format(
+        provider_id, len(changes), len(matched)))
 
 
 @singleton_task()
@@ -1526,8 +1570,12 @@ def generic_shepherd(self, preconfigured):
     appliances. For each template group, it keeps the last template's appliances spinned up in
     required quantity. If new template comes out of the door, it automatically kills the older
     running template's appliances and spins up new ones. Sorts the groups by the fulfillment."""
+    shepherd_counts = GroupShepherd.shepherd_counts(preconfigured)
     for gs in sorted(
-            GroupShepherd.objects.all(), key=lambda g: g.get_fulfillment_percentage(preconfigured)):
+            GroupShepherd.objects.all(),
+            key=lambda g: g.get_fulfillment_percentage(
+                preconfigured,
+                shepherd_counts.get((g.template_group_id, g.user_group_id), 0))):
         prov_filter = {'provider__user_groups': gs.user_group}
         group_versions = Template.get_versions(
             template_group=gs.template_group, ready=True, usable=True, preconfigured=preconfigured,
@@ -1568,7 +1616,7 @@ def generic_shepherd(self, preconfigured):
         possible_templates = list(
             Template.objects.filter(
                 usable=True, ready=True, template_group=gs.template_group,
-                preconfigured=preconfigured, **filter_keep).all())
+                preconfigured=preconfigured, **filter_keep).select_related('provider'))
         # If it can be deployed, it must exist
         possible_templates_for_provision = filter(lambda tpl: tpl.exists, possible_templates)
         appliances = []
@@ -1582,20 +1630,27 @@ def generic_shepherd(self, preconfigured):
         pool_size = gs.template_pool_size if preconfigured else gs.unconfigured_template_pool_size
         if len(appliances) < pool_size and possible_templates_for_provision:
             # There must be some templates in order to run the provisioning
-            # Provision ONE appliance at time for each group, that way it is possible to maintain
-            # reasonable balancing
+            # Provision the whole deficit at once, each appliance on the least loaded provider
+            # that has a free slot, so the balancing is kept
             with transaction.atomic():
-                # Now look for templates that are on non-busy providers
-                tpl_free = filter(
-                    lambda t: t.provider.free,
-                    possible_templates_for_provision)
-                if tpl_free:
-                    chosen_template = sorted(tpl_free, key=lambda t: t.provider.appliance_load)[0]
+                for _ in range(pool_size - len(appliances)):
+                    # Now look for templates that are on non-busy providers
+                    tpl_free = filter(
+                        lambda t: t.provider.free,
+                        possible_templates_for_provision)
+                    if not tpl_free:
+                        break
+                    chosen_template = sorted(
+                        tpl_free,
+                        key=lambda t: (t.provider.appliance_load, t.provider.provisioning_load))[0]
                     new_appliance_name = gen_appliance_name(chosen_template.id)
                     appliance = Appliance(
                         template=chosen_template,
                         name=new_appliance_name)
                     appliance.save()
+                    provider_load = ProviderLoad.active()
+                    if provider_load is not None:
+                        provider_load.appliance_added(chosen_template.provider)
                     self.logger.info(
                         "Adding an appliance to shepherd: {}/{}".format(appliance.id,
                                                                         appliance.name))
@@ -1624,10 +1679,24 @@ def generic_shepherd(self, preconfigured):
                     Appliance.kill(a)
 
 
+def kick_shepherd():
+    """Runs the shepherd soon instead of waiting for its periodic run.
+
+    Called when appliances leave the shepherd. The run is delayed by
+    ``settings.SHEPHERD_KICK_DELAY`` seconds so a burst of changes (eg. a pool taking several
+    appliances) is handled by a single run.
+    """
+    if cache.add('shepherd-kick', 'true', settings.SHEPHERD_KICK_DELAY):
+        transaction.on_commit(
+            lambda: free_appliance_shepherd.apply_async(countdown=settings.SHEPHERD_KICK_DELAY))
+
+
 @singleton_task()
 def free_appliance_shepherd(self):
-    generic_shepherd(self, True)
-    generic_shepherd(self, False)
+    # All provider load checks of the tick use counts taken at once instead of a query each
+    with Provider.load_snapshot(max_age=settings.PROVIDER_LOAD_MAX_AGE):
+        generic_shepherd(self, True)
+        generic_shepherd(self, False)
 
 
 @singleton_task()
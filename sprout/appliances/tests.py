@@ -1,4 +1,249 @@
 # -*- coding: utf-8 -*-
-# from django.test import TestCase
+import json
+from collections import namedtuple
+from datetime import date
 
-# Create your tests here.
+import yaml
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from appliances import models, tasks
+from appliances.models import Appliance, Group, Provider, Template
+from appliances.tasks import kick_shepherd, refresh_appliances_provider
+from sprout import settings
+
+
+def create_template(provider, name, **kwargs):
+    group, _ = Group.objects.get_or_create(id="downstream-59z")
+    return Template.objects.create(
+        provider=provider, template_group=group, date=date(2018, 6, 1), original_name=name,
+        name=name, **kwargs)
+
+
+class MetadataTest(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(id="downstream-59z")
+        self.group.metadata = {"kept": 1, "changed": 1, "removed": 1}
+        self.group.save()
+
+    def stored(self):
+        return json.loads(Group.objects.get(pk=self.group.pk).object_meta_data)
+
+    def test_update_metadata(self):
+        self.group.update_metadata({"changed": 2, "added": 1}, ["removed"])
+        self.assertEqual(self.stored(), {"kept": 1, "changed": 2, "added": 1})
+        self.assertEqual(self.group.metadata, self.stored())
+
+    def test_update_metadata_retries_on_concurrent_update(self):
+        stored_metadata = self.group._stored_metadata
+        reads = []
+
+        def read_then_update_elsewhere():
+            # Another worker writes its key between our read and our update
+            raw = stored_metadata()
+            if not reads:
+                other = Group.objects.get(pk=self.group.pk)
+                other.update_metadata({"other": 1})
+            reads.append(raw)
+            return raw
+        self.group._stored_metadata = read_then_update_elsewhere
+
+        self.group.update_metadata({"changed": 2})
+        self.assertEqual(len(reads), 2)
+        self.assertEqual(self.stored(), {"kept": 1, "changed": 2, "removed": 1, "other": 1})
+
+    def test_edit_metadata_writes_only_changed_keys(self):
+        with self.group.edit_metadata as metadata:
+            metadata["changed"] = 2
+            del metadata["removed"]
+            # Written by someone else while we were editing
+            Group.objects.get(pk=self.group.pk).update_metadata({"other": 1, "kept": 2})
+        self.assertEqual(self.stored(), {"kept": 2, "changed": 2, "other": 1})
+
+    def test_yaml_metadata_is_still_read(self):
+        Group.objects.filter(pk=self.group.pk).update(object_meta_data="kept: 1\n")
+        self.group.update_metadata({"added": 1})
+        self.assertEqual(self.stored(), {"kept": 1, "added": 1})
+
+
+class MetadataMigrationTest(TransactionTestCase):
+    before = ("appliances", "0048_openshift_project_made_bigger")
+    after = ("appliances", "0049_metadata_as_json")
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate([target])
+        executor.loader.build_graph()
+        return executor.loader.project_state([target]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_yaml_rows_are_converted_to_json_and_back(self):
+        metadata = {"templates": ["cfme-59z", "cfme-58z"], "template_name_length": 9}
+        apps = self.migrate(self.before)
+        groups = apps.get_model("appliances", "Group").objects
+        groups.create(id="yaml", object_meta_data=yaml.safe_dump(metadata))
+        groups.create(id="empty", object_meta_data="")
+
+        apps = self.migrate(self.after)
+        rows = dict(apps.get_model("appliances", "Group").objects.values_list(
+            "id", "object_meta_data"))
+        self.assertEqual(json.loads(rows["yaml"]), metadata)
+        self.assertEqual(json.loads(rows["empty"]), {})
+
+        apps = self.migrate(self.before)
+        rows = dict(apps.get_model("appliances", "Group").objects.values_list(
+            "id", "object_meta_data"))
+        self.assertEqual(yaml.safe_load(rows["yaml"]), metadata)
+        self.assertEqual(rows["yaml"], yaml.safe_dump(metadata))
+
+
+class ProviderLoadTest(TestCase):
+    def setUp(self):
+        # Don't reuse a snapshot taken by another test
+        models._provider_load.last = None
+        rhv, vsphere, _ = [Provider.objects.create(id=id) for id in ("rhv", "vsphere", "empty")]
+        ready = create_template(rhv, "rhv-ready", ready=True)
+        create_template(rhv, "rhv-preparing")
+        vsphere_ready = create_template(vsphere, "vsphere-ready", ready=True)
+        Appliance.objects.create(template=ready, name="provisioning")
+        Appliance.objects.create(template=ready, name="running", ready=True, ip_address="1.2.3.4")
+        Appliance.objects.create(template=ready, name="deleted", marked_for_deletion=True)
+        Appliance.objects.create(template=vsphere_ready, name="provisioning")
+
+    def load(self):
+        return [
+            (provider.num_currently_provisioning, provider.num_currently_managing,
+             provider.num_templates_preparing)
+            for provider in Provider.objects.all()]
+
+    def test_snapshot_counts_match_the_queries(self):
+        expected = self.load()
+        # empty, rhv and vsphere
+        self.assertEqual(expected, [(0, 0, 0), (1, 3, 1), (1, 1, 0)])
+        with Provider.load_snapshot():
+            providers = list(Provider.objects.all())
+            with self.assertNumQueries(0):
+                load = [
+                    (provider.num_currently_provisioning, provider.num_currently_managing,
+                     provider.num_templates_preparing)
+                    for provider in providers]
+        self.assertEqual(load, expected)
+
+    def test_snapshot_is_reused_and_counts_added_appliances(self):
+        rhv = Provider.objects.get(id="rhv")
+        with Provider.load_snapshot(max_age=60) as load:
+            load.appliance_added(rhv)
+            with Provider.load_snapshot() as nested:
+                self.assertIs(nested, load)
+            self.assertEqual(rhv.num_currently_provisioning, 2)
+            self.assertEqual(rhv.num_currently_managing, 4)
+        with self.assertNumQueries(0):
+            with Provider.load_snapshot(max_age=60) as reused:
+                self.assertIs(reused, load)
+        self.assertIsNone(models.ProviderLoad.active())
+
+
+Vm = namedtuple("Vm", ["ip", "name", "uuid", "state"])
+
+
+class FakeProviderApi(object):
+    def __init__(self, vms):
+        self.vms = vms
+
+    def list_vms(self):
+        return self.vms
+
+
+class RefreshAppliancesTest(TestCase):
+    def setUp(self):
+        self.provider = Provider.objects.create(id="rhv", working=True)
+        template = create_template(self.provider, "rhv-ready", ready=True)
+        self.appliances = {
+            name: Appliance.objects.create(template=template, name=name, **fields)
+            for name, fields in [
+                ("renamed", dict(uuid="1")),
+                ("found-by-name", dict(ip_address="10.0.0.2", power_state=Appliance.Power.ON)),
+                ("unchanged", dict(uuid="3", ip_address="10.0.0.3", power_state="on")),
+                ("orphaned", dict(uuid="4")),
+            ]}
+        vms = [
+            Vm("10.0.0.1", "new-name", "1", "up"),
+            Vm("unresolvable", "found-by-name", "2", "down"),
+            Vm("10.0.0.3", "unchanged", "3", "up"),
+        ]
+        # Hostnames resolved earlier, so nothing is looked up
+        cache.set_many({"dns-10.0.0.1": "10.0.0.1", "dns-10.0.0.3": "10.0.0.3",
+                        "dns-unresolvable": ""})
+        self.addCleanup(cache.clear)
+        api = FakeProviderApi(vms)
+        original_api = Provider.api
+        Provider.api = property(lambda provider: api)
+        self.addCleanup(setattr, Provider, "api", original_api)
+
+    def refreshed(self, name):
+        return Appliance.objects.get(id=self.appliances[name].id)
+
+    def test_only_changed_appliances_are_written(self):
+        with CaptureQueriesContext(connection) as queries:
+            refresh_appliances_provider(self.provider.id)
+        updates = [query for query in queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 3)
+
+        renamed = self.refreshed("renamed")
+        self.assertEqual(
+            (renamed.name, renamed.ip_address, renamed.power_state),
+            ("new-name", "10.0.0.1", Appliance.Power.ON))
+        found = self.refreshed("found-by-name")
+        self.assertEqual(
+            (found.uuid, found.ip_address, found.power_state), ("2", None, Appliance.Power.OFF))
+        self.assertEqual(self.refreshed("orphaned").power_state, Appliance.Power.ORPHANED)
+        unchanged = self.refreshed("unchanged")
+        self.assertEqual(unchanged.modified_on, self.appliances["unchanged"].modified_on)
+        self.assertGreater(renamed.modified_on, self.appliances["renamed"].modified_on)
+
+
+class FakeShepherdTask(object):
+    def __init__(self):
+        self.runs = []
+
+    def apply_async(self, **kwargs):
+        self.runs.append(kwargs)
+
+
+class KickShepherdTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.shepherd = FakeShepherdTask()
+        original_shepherd = tasks.free_appliance_shepherd
+        tasks.free_appliance_shepherd = self.shepherd
+        self.addCleanup(setattr, tasks, "free_appliance_shepherd", original_shepherd)
+
+    def test_kicks_are_debounced_until_commit(self):
+        with transaction.atomic():
+            for _ in range(3):
+                kick_shepherd()
+            self.assertEqual(self.shepherd.runs, [])
+        self.assertEqual(self.shepherd.runs, [{"countdown": settings.SHEPHERD_KICK_DELAY}])
+
+        kick_shepherd()
+        self.assertEqual(len(self.shepherd.runs), 1)
+        # The delay passed
+        cache.delete("shepherd-kick")
+        kick_shepherd()
+        self.assertEqual(len(self.shepherd.runs), 2)
+
+    def test_appliances_leaving_the_shepherd_kick_it(self):
+        template = create_template(Provider.objects.create(id="rhv"), "rhv-ready")
+        appliance = Appliance.objects.create(template=template, name="appliance")
+        appliance.save(update_fields=["name"])
+        self.assertEqual(self.shepherd.runs, [])
+
+        appliance.save(update_fields=["appliance_pool"])
+        self.assertEqual(len(self.shepherd.runs), 1)
@@ -101,7 +101,8 @@ def providers(request, provider_id=None):
             messages.warning(request, "Provider '{}' does not exist.".format(provider_id))
             return redirect("providers")
     providers = Provider.objects.filter(hidden=False, **user_filter).order_by("id").distinct()
-    return render(request, 'appliances/providers.html', locals())
+    with Provider.load_snapshot():
+        return render(request, 'appliances/providers.html', locals())
 
 
 def provider_usage(request):
@@ -177,6 +177,15 @@ ORPHANED_APPLIANCE_GRACE_TIME = dict(
     minutes=45,
 )
 
+# How many seconds a snapshot of the providers' load can be reused by the shepherd
+PROVIDER_LOAD_MAX_AGE = 5
+
+# How many seconds to wait before running the shepherd after appliances left it
+SHEPHERD_KICK_DELAY = 5
+
+# How many seconds the resolved hostnames of appliances are cached
+DNS_CACHE_TIME = 300
+
 # Celery beat
 CELERYBEAT_SCHEDULE = {
     'check-templates': {